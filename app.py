@@ -1,27 +1,168 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
+from flask import (Flask, Blueprint, current_app, render_template, request, jsonify, redirect, url_for, session,
+                   flash, abort, make_response, stream_with_context)
+from markupsafe import Markup
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.middleware.proxy_fix import ProxyFix
+from datetime import date, datetime, timedelta
+import base64
+import csv
+import io
+import json
+import smtplib
+import math
+from email.message import EmailMessage
+import click
 import os
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-app = Flask(__name__, static_folder='static', static_url_path='/static')
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-this-2026')
-
-# Database configuration
-database_url = os.environ.get('DATABASE_URL', 'sqlite:///shop.db')
-# Fix PostgreSQL URL format for SQLAlchemy
-if database_url and database_url.startswith('postgres://'):
-    database_url = database_url.replace('postgres://', 'postgresql://', 1)
+from cache import create_cache
+import search as fulltext
+import http_cache
+import assets
+import migrations
+import database
+import passwords
+import templating
+import images
+import jobs
+from metrics import Metrics
+import logging_setup
+
+try:
+    import orjson
+except ImportError:  # tùy chọn: không có thì dùng json của thư viện chuẩn
+    orjson = None
 
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+logger = logging.getLogger(__name__)
 
-db = SQLAlchemy(app)
+# RoutingSession gửi truy vấn của các view @replica_reads sang DATABASE_REPLICA_URL (nếu có)
+db = SQLAlchemy(session_options={'class_': database.RoutingSession})
+replica_router = database.ReplicaRouter(
+    sticky_seconds=float(os.environ.get('REPLICA_STICKY_SECONDS', 5)),
+    check_interval=float(os.environ.get('REPLICA_CHECK_INTERVAL', 5)),
+    max_lag=float(os.environ.get('REPLICA_MAX_LAG', 30))
+)
+replica_reads = database.replica_reads
+
+# Cache configuration (memory | file | none)
+# Nhiều worker (WEB_CONCURRENCY > 1) thì mặc định dùng cache file chung: cache trong bộ nhớ
+# của từng process không được xóa khi worker khác sửa sản phẩm
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 300))
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or (
+    'file' if int(os.environ.get('WEB_CONCURRENCY', 1)) > 1 else 'memory'
+)
+cache = create_cache(
+    CACHE_BACKEND,
+    maxsize=int(os.environ.get('CACHE_MAXSIZE', 1024)),
+    default_ttl=CACHE_TTL,
+    directory=os.environ.get('CACHE_DIR')
+)
+
+# Static asset có hash (flask build-assets), phục vụ với Cache-Control: immutable
+static_assets = assets.Assets()
+
+# Ảnh sản phẩm tải lên: bản gốc + thumbnail WebP/JPEG, phục vụ tại /media với Cache-Control: immutable
+image_store = images.ImageStore(
+    directory=os.environ.get('UPLOAD_DIR'),
+    widths=[int(width) for width in os.environ.get('IMAGE_WIDTHS', '160,320,640,960').split(',')],
+    max_bytes=int(float(os.environ.get('IMAGE_MAX_UPLOAD_MB', 5)) * 1024 * 1024),
+    workers=int(os.environ.get('IMAGE_WORKERS', 1))
+)
+
+# Metrics configuration: METRICS_DIR gộp số liệu của nhiều worker gunicorn
+metrics = Metrics(
+    query_budget=int(os.environ.get('QUERY_BUDGET', 30)),
+    directory=os.environ.get('METRICS_DIR')
+)
+# cache_hits_total, cache_misses_total... trên /metrics, cộng dồn giữa các worker
+metrics.register_counters('cache', cache.counters)
+
+# Băm mật khẩu trong pool giới hạn, đăng nhập bị giới hạn theo IP và username (xem passwords.py)
+hasher = passwords.Hasher(
+    method=os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2'),
+    salt_length=int(os.environ.get('PASSWORD_SALT_LENGTH', 16)),
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', 1)),
+    queue=int(os.environ.get('PASSWORD_HASH_QUEUE', 2)),
+    timeout=float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+)
+login_ip_limiter = passwords.RateLimiter.from_config(os.environ.get('LOGIN_RATE_IP', '20/60'))
+login_user_limiter = passwords.RateLimiter.from_config(os.environ.get('LOGIN_RATE_USER', '5/60'))
+
+
+def get_database_url(name='DATABASE_URL', default='sqlite:///shop.db'):
+    database_url = os.environ.get(name, default)
+    # Fix PostgreSQL URL format for SQLAlchemy
+    if database_url and database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    return database_url
+
+
+# Mọi view, lệnh CLI và error handler; được gắn vào ứng dụng trong create_app()
+bp = Blueprint('shop', __name__, cli_group=None)
+
+
+def create_app(config=None):
+    """Tạo và cấu hình ứng dụng Flask.
+
+    Import module này không có tác dụng phụ: logging, thư mục (ảnh, metrics,
+    bytecode template) và luồng nền chỉ được khởi tạo ở đây. ``flask`` tự gọi
+    hàm này, gunicorn dùng ``wsgi:app``. Không mở kết nối database nào: schema
+    được tạo bằng ``flask init-db`` (hoặc ``flask migrate``), kết nối và template
+    được làm nóng bằng ``warmup()``.
+    """
+    # Configure logging (queue-based, JSON lines; LOG_FORMAT=text for local development)
+    logging_setup.setup_logging(
+        level=os.environ.get('LOG_LEVEL', 'INFO'),
+        fmt=os.environ.get('LOG_FORMAT', 'json'),
+        sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', 1.0)),
+        slow_ms=float(os.environ.get('LOG_SLOW_MS', 1000))
+    )
+
+    app = Flask(__name__, static_folder='static', static_url_path='/static')
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-this-2026')
+
+    # Database configuration
+    database_url = get_database_url()
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database.engine_options(database_url)
+    # Read replica tùy chọn: bind 'replica', chỉ dùng cho đọc (xem database.ReplicaRouter)
+    replica_url = get_database_url('DATABASE_REPLICA_URL', default=None)
+    if replica_url:
+        app.config['SQLALCHEMY_BINDS'] = {
+            database.REPLICA: {'url': replica_url, **database.replica_engine_options(replica_url)}
+        }
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    static_assets.init_app(app)
+    image_store.init_app(app)
+    # Bytecode Jinja dùng chung giữa các worker; {% cache %} giữ HTML từng thẻ sản phẩm trong cache ứng dụng
+    bytecode_dir = os.environ.get('TEMPLATE_CACHE_DIR', '')
+    templating.init_app(
+        app,
+        fragment_cache=cache if os.environ.get('TEMPLATE_FRAGMENT_CACHE', '1') != '0' else None,
+        fragment_ttl=CACHE_TTL,
+        bytecode_dir=None if bytecode_dir == '0' else bytecode_dir
+    )
+    # Tạo engine không mở kết nối; PRAGMA của SQLite được đặt khi kết nối đầu tiên mở ra
+    with app.app_context():
+        database.configure_engine(db.engine)
+        metrics.init_app(app, db.engine)
+        if database.REPLICA in app.config.get('SQLALCHEMY_BINDS', {}):
+            replica_router.init_app(app, db)
+            metrics.watch_engine(db.engines[database.REPLICA])
+    logging_setup.init_app(app)
+    app.register_blueprint(bp)
+    # Sau reverse proxy (Render, nginx): lấy IP client từ X-Forwarded-For, chỉ tin đúng số proxy khai báo
+    proxy_hops = int(os.environ.get('PROXY_FIX_HOPS', 0))
+    if proxy_hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+    return app
 
 # ==================== MODELS ====================
 
@@ -36,17 +177,37 @@ class User(db.Model):
 
 
 class Product(db.Model):
+    __table_args__ = (
+        db.Index('ix_product_created_at_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     description = db.Column(db.Text)
     price = db.Column(db.Float, nullable=False)
     quantity = db.Column(db.Integer, default=0)
     image_url = db.Column(db.String(200))
+    # Ảnh tải lên: khóa bản gốc trong UPLOAD_DIR và các chiều rộng thumbnail đã sinh ("160,320,640")
+    image_key = db.Column(db.String(40))
+    image_widths = db.Column(db.String(64))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Đổi ở mọi lần UPDATE (kể cả UPDATE Core khi thanh toán); dùng cho ETag / Last-Modified
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # Tổng nhập / xuất kho, cập nhật cùng lúc với quantity; khớp với sổ kho (InventoryMovement)
+    units_in = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    units_out = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     order_items = db.relationship('OrderItem', backref='product', lazy=True, cascade='all, delete-orphan')
+    # Không cascade xóa: xóa sản phẩm chỉ gỡ product_id khỏi các dòng sổ kho, sổ vẫn giữ nguyên
+    movements = db.relationship('InventoryMovement', backref='product', lazy=True)
 
 
 class Order(db.Model):
+    # Lịch sử đơn hàng duyệt theo keyset (mới nhất trước) trong phạm vi người dùng / trạng thái
+    __table_args__ = (
+        db.Index('ix_order_user_id_id', 'user_id', 'id'),
+        db.Index('ix_order_status_id', 'status', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     total_price = db.Column(db.Float, nullable=False)
@@ -57,39 +218,1339 @@ class Order(db.Model):
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
 
 
+class InventoryMovement(db.Model):
+    """Sổ kho chỉ ghi thêm: mỗi lần tồn kho thay đổi là một dòng, không bao giờ sửa hay xóa"""
+    __table_args__ = (
+        db.Index('ix_inventory_movement_product_id_id', 'product_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # NULL khi sản phẩm đã bị xóa (dòng cuối cùng của nó là 'delete')
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
+    delta = db.Column(db.Integer, nullable=False)  # dương: nhập, âm: xuất
+    reason = db.Column(db.String(20), nullable=False)  # opening, restock, adjust_out, sale, correction, reconcile, delete
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class SalesRollup(db.Model):
+    """Doanh số cộng dồn theo ngày (UTC) x sản phẩm x trạng thái đơn hàng"""
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    order_lines = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
 class CartItem(db.Model):
+    # Mỗi sản phẩm một dòng trong giỏ của mỗi người dùng; thêm vào giỏ dùng upsert trên chỉ mục này
+    __table_args__ = (
+        db.Index('uq_cart_item_user_id_product_id', 'user_id', 'product_id', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, default=1)
     product = db.relationship('Product', backref='cart_items')
 
-# Đảm bảo tạo database khi chạy Docker
-with app.app_context():
-    db.create_all()
+
+class Job(db.Model):
+    """Việc nền chờ ``flask worker`` xử lý (xem jobs.py)"""
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON, truyền vào handler dưới dạng keyword argument
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    idempotency_key = db.Column(db.String(200), unique=True)
+    last_error = db.Column(db.Text)
+    locked_by = db.Column(db.String(60))
+    locked_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+# ==================== STATS ====================
+
+ORDER_STATUSES = ['pending', 'paid', 'shipped', 'delivered']
+ORDER_STATUS_LABELS = {
+    'pending': 'Chờ Xác Nhận',
+    'paid': 'Đã Thanh Toán',
+    'shipped': 'Đang Gửi',
+    'delivered': 'Đã Giao'
+}
+LOW_STOCK_THRESHOLD = 5
+
+
+def get_admin_stats(top_n=5, low_stock_threshold=LOW_STOCK_THRESHOLD):
+    """Tính số liệu thống kê cho trang quản trị bằng các truy vấn tổng hợp (GROUP BY).
+
+    Số truy vấn không phụ thuộc vào số lượng đơn hàng/sản phẩm trong hệ thống.
+    """
+    order_count, total_revenue = db.session.query(
+        db.func.count(Order.id),
+        db.func.coalesce(db.func.sum(Order.total_price), 0)
+    ).one()
+
+    status_counts = {status: 0 for status in ORDER_STATUSES}
+    for status, count in db.session.query(Order.status, db.func.count(Order.id)).group_by(Order.status):
+        status_counts[status] = count
+
+    status_percentages = {
+        status: (count / order_count * 100 if order_count > 0 else 0)
+        for status, count in status_counts.items()
+    }
+
+    product_count, total_stock, low_stock_count = db.session.query(
+        db.func.count(Product.id),
+        db.func.coalesce(db.func.sum(Product.quantity), 0),
+        db.func.coalesce(db.func.sum(db.case((Product.quantity < low_stock_threshold, 1), else_=0)), 0)
+    ).one()
+
+    user_count = db.session.query(db.func.count(User.id)).scalar()
+
+    low_stock = [
+        {'id': id_, 'name': name, 'quantity': quantity}
+        for id_, name, quantity in db.session.query(Product.id, Product.name, Product.quantity)
+        .filter(Product.quantity < low_stock_threshold)
+        .order_by(Product.quantity, Product.id)
+    ]
+
+    # Số bán và doanh thu đọc từ SalesRollup (mỗi sản phẩm một dòng mỗi ngày x trạng thái), không từ
+    # Product.units_out (gồm cả xuất kho điều chỉnh) hay giá hiện tại; chỉ tính trạng thái đơn hợp lệ
+    sold = SalesRollup.status.in_(ORDER_STATUSES)
+    units_shipped = db.session.query(db.func.coalesce(db.func.sum(SalesRollup.units), 0)).filter(sold).scalar()
+
+    units_sold = db.func.sum(SalesRollup.units).label('units_sold')
+    best_sellers = [
+        {'id': id_, 'name': name, 'price': revenue / quantity if quantity else 0.0, 'quantity': int(quantity),
+         'revenue': float(revenue)}
+        for id_, name, quantity, revenue in db.session.query(Product.id, Product.name, units_sold,
+                                                             db.func.sum(SalesRollup.revenue))
+        .join(SalesRollup, SalesRollup.product_id == Product.id)
+        .filter(sold)
+        .group_by(Product.id, Product.name)
+        .order_by(units_sold.desc(), Product.id)
+        .limit(top_n)
+    ]
+
+    return {
+        'order_count': order_count,
+        'total_revenue': float(total_revenue),
+        'status_counts': status_counts,
+        'status_percentages': status_percentages,
+        'product_count': product_count,
+        'total_stock': int(total_stock),
+        'low_stock_count': int(low_stock_count),
+        'low_stock': low_stock,
+        'units_shipped': int(units_shipped),
+        'user_count': user_count,
+        'best_sellers': best_sellers,
+    }
+
+# ==================== INVENTORY ====================
+
+class InsufficientStockError(Exception):
+    """Không đủ tồn kho để xuất"""
+
+
+def change_stock(product_id, delta):
+    """Cộng ``delta`` vào tồn kho bằng một câu UPDATE nguyên tử, trả về tồn kho mới.
+
+    Đồng thời tăng ``units_in`` hoặc ``units_out``. Khi xuất kho (delta âm) điều
+    kiện ``quantity >= -delta`` nằm trong câu UPDATE nên tồn kho không thể âm;
+    trả về None nếu không đủ hàng (hoặc sản phẩm không tồn tại). Không commit.
+    """
+    update = db.update(Product).where(Product.id == product_id)
+    if delta < 0:
+        update = (update.where(Product.quantity >= -delta)
+                  .values(quantity=Product.quantity + delta, units_out=Product.units_out - delta))
+    else:
+        update = update.values(quantity=Product.quantity + delta, units_in=Product.units_in + delta)
+    return db.session.execute(
+        update.returning(Product.quantity).execution_options(synchronize_session=False)
+    ).scalar()
+
+
+def record_movements(movements):
+    """Ghi các dòng sổ kho (dict: product_id, delta, reason, order_id, user_id) trong transaction hiện tại"""
+    movements = [movement for movement in movements if movement['delta']]
+    if movements:
+        db.session.execute(db.insert(InventoryMovement), [
+            {'order_id': None, 'user_id': None, **movement} for movement in movements
+        ])
+
+
+def adjust_stock(product_id, delta, reason, user_id=None):
+    """Đổi tồn kho và ghi sổ kho trong cùng transaction. Ném InsufficientStockError nếu không đủ hàng."""
+    quantity = change_stock(product_id, delta)
+    if quantity is None:
+        raise InsufficientStockError(product_id)
+    record_movements([{'product_id': product_id, 'delta': delta, 'reason': reason, 'user_id': user_id}])
+    return quantity
+
+
+def reconcile_inventory(fix=False):
+    """So sánh bộ đếm units_in / units_out và quantity của mọi sản phẩm với sổ kho.
+
+    Trả về danh sách sản phẩm lệch. Với ``fix=True``, phần tồn kho lệch so với
+    sổ được ghi thêm thành một dòng ``reconcile`` (sổ không bao giờ bị sửa) rồi
+    bộ đếm được tính lại từ sổ.
+    """
+    ledger = (db.select(
+        InventoryMovement.product_id,
+        db.func.sum(db.case((InventoryMovement.delta > 0, InventoryMovement.delta), else_=0)).label('units_in'),
+        db.func.sum(db.case((InventoryMovement.delta < 0, -InventoryMovement.delta), else_=0)).label('units_out'))
+        .group_by(InventoryMovement.product_id)
+        .subquery())
+    ledger_in = db.func.coalesce(ledger.c.units_in, 0)
+    ledger_out = db.func.coalesce(ledger.c.units_out, 0)
+    quantity = db.func.coalesce(Product.quantity, 0)
+    rows = (db.session.query(Product.id, Product.name, quantity, Product.units_in, Product.units_out,
+                             ledger_in, ledger_out)
+            .outerjoin(ledger, ledger.c.product_id == Product.id)
+            .filter(db.or_(Product.units_in != ledger_in,
+                           Product.units_out != ledger_out,
+                           quantity != ledger_in - ledger_out))
+            .order_by(Product.id)
+            .all())
+
+    mismatches = []
+    for product_id, name, stock, units_in, units_out, expected_in, expected_out in rows:
+        drift = stock - (expected_in - expected_out)
+        mismatches.append({
+            'id': product_id, 'name': name, 'quantity': stock,
+            'units_in': units_in, 'units_out': units_out,
+            'ledger_in': int(expected_in), 'ledger_out': int(expected_out), 'drift': drift,
+        })
+        if fix:
+            record_movements([{'product_id': product_id, 'delta': drift, 'reason': 'reconcile'}])
+            db.session.execute(
+                db.update(Product).where(Product.id == product_id)
+                .values(units_in=expected_in + max(drift, 0), units_out=expected_out + max(-drift, 0))
+                .execution_options(synchronize_session=False)
+            )
+    if fix and mismatches:
+        db.session.commit()
+        invalidate_products(*(row['id'] for row in mismatches))
+    return mismatches
+
+# ==================== CART ====================
+
+CART_OPS = ['set', 'add', 'remove']
+CART_MAX_OPS = 100
+
+
+class CartError(Exception):
+    """Một hoặc nhiều thao tác giỏ hàng không hợp lệ; không thao tác nào được áp dụng"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(error['message'] for error in errors))
+
+
+def load_cart(user_id):
+    """Lấy các dòng giỏ hàng kèm sản phẩm trong một truy vấn"""
+    return (CartItem.query
+            .options(db.joinedload(CartItem.product))
+            .filter_by(user_id=user_id)
+            .order_by(CartItem.product_id)
+            .all())
+
+
+def cart_to_dict(cart_items):
+    items = [{
+        'id': item.id,
+        'product_id': item.product_id,
+        'name': item.product.name,
+        'price': item.product.price,
+        'quantity': item.quantity,
+        'available': item.product.quantity,
+        'subtotal': item.product.price * item.quantity
+    } for item in cart_items]
+    return {
+        'items': items,
+        'count': sum(item['quantity'] for item in items),
+        'total': sum(item['subtotal'] for item in items)
+    }
+
+
+def _parse_cart_op(raw):
+    """{'op': 'set'|'add'|'remove', 'product_id': int, 'quantity': int} -> (op, product_id, quantity)"""
+    if not isinstance(raw, dict):
+        raise ValueError('Thao tác phải là object')
+    op = raw.get('op')
+    if op not in CART_OPS:
+        raise ValueError(f'op phải là một trong: {", ".join(CART_OPS)}')
+    try:
+        product_id = int(raw.get('product_id'))
+        quantity = int(raw.get('quantity', 1 if op == 'add' else 0))
+    except (TypeError, ValueError):
+        raise ValueError('product_id và quantity phải là số nguyên') from None
+    if op == 'add' and quantity < 1:
+        raise ValueError('Số lượng thêm phải lớn hơn 0')
+    if op == 'set' and (quantity < 0 or 'quantity' not in raw):
+        raise ValueError('Cần số lượng không âm (0 = xóa khỏi giỏ)')
+    return op, product_id, quantity
+
+
+def apply_cart_ops(user_id, ops):
+    """Áp dụng một loạt thao tác set / add / remove vào giỏ trong một transaction.
+
+    Sản phẩm, tồn kho và dòng giỏ hiện tại được đọc bằng một truy vấn. Sản
+    phẩm chỉ có thao tác ``add`` được ghi bằng upsert cộng dồn (hai lần bấm
+    cùng lúc cộng đủ cả hai, không tạo dòng trùng); có ``set`` / ``remove`` thì
+    ghi số lượng cuối cùng. Lỗi ở bất kỳ thao tác nào ném CartError và không
+    thay đổi gì. Trả về giỏ hàng sau khi cập nhật.
+    """
+    errors = []
+    parsed = []
+    for index, raw in enumerate(ops):
+        try:
+            parsed.append((index,) + _parse_cart_op(raw))
+        except ValueError as e:
+            errors.append({'index': index, 'message': str(e)})
+    if errors:
+        raise CartError(errors)
+
+    rows = (db.session.query(Product.id, Product.name, Product.quantity, CartItem.quantity)
+            .outerjoin(CartItem, (CartItem.product_id == Product.id) & (CartItem.user_id == user_id))
+            .filter(Product.id.in_({product_id for _, _, product_id, _ in parsed}))
+            .all())
+    products = {product_id: (name, stock or 0) for product_id, name, stock, _ in rows}
+    final = {product_id: in_cart or 0 for product_id, _, _, in_cart in rows}
+    increments = {}
+    absolute = set()
+    for index, op, product_id, quantity in parsed:
+        if product_id not in products:
+            errors.append({'index': index, 'product_id': product_id, 'message': 'Không tìm thấy sản phẩm'})
+            continue
+        if op == 'add':
+            final[product_id] += quantity
+            increments[product_id] = increments.get(product_id, 0) + quantity
+        else:
+            final[product_id] = quantity if op == 'set' else 0
+            absolute.add(product_id)
+        name, stock = products[product_id]
+        if final[product_id] > stock:
+            errors.append({'index': index, 'product_id': product_id,
+                           'message': f'Sản phẩm {name} chỉ còn {stock}, không đủ {final[product_id]}'})
+    if errors:
+        raise CartError(errors)
+
+    try:
+        added = [{'user_id': user_id, 'product_id': product_id, 'quantity': quantity}
+                 for product_id, quantity in sorted(increments.items()) if product_id not in absolute]
+        replaced = [{'user_id': user_id, 'product_id': product_id, 'quantity': final[product_id]}
+                    for product_id in sorted(absolute) if final[product_id] > 0]
+        removed = [product_id for product_id in absolute if final[product_id] == 0]
+        if added:
+            _upsert(CartItem, added, ['user_id', 'product_id'], increments=['quantity'])
+        if replaced:
+            _upsert(CartItem, replaced, ['user_id', 'product_id'], replace=['quantity'])
+        if removed:
+            db.session.execute(
+                db.delete(CartItem)
+                .where(CartItem.user_id == user_id, CartItem.product_id.in_(removed))
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return load_cart(user_id)
+
+# ==================== CHECKOUT ====================
+
+class OutOfStockError(Exception):
+    """Một hoặc nhiều sản phẩm trong giỏ không đủ tồn kho"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(', '.join(f"{item['name']} (còn {item['available']})" for item in shortages))
+
+
+def place_order(user_id, cart_items):
+    """Tạo đơn hàng từ giỏ và trừ kho một cách nguyên tử.
+
+    Mỗi sản phẩm được trừ bằng ``UPDATE ... WHERE quantity >= :n`` theo thứ tự
+    product_id, nên hai người mua cùng lúc không thể làm tồn kho âm (trên
+    PostgreSQL câu UPDATE giữ khóa dòng cho đến khi commit). Nếu có dòng nào
+    thiếu hàng, toàn bộ giao dịch bị rollback và ném OutOfStockError. Mỗi dòng
+    xuất kho được ghi vào sổ kho, và doanh số vào SalesRollup, trong cùng
+    transaction với đơn hàng. Email xác nhận được đưa vào hàng đợi việc nền
+    (cũng trong transaction đó) để request trả về ngay.
+    """
+    wanted = {}
+    products = {}
+    for cart_item in cart_items:
+        wanted[cart_item.product_id] = wanted.get(cart_item.product_id, 0) + cart_item.quantity
+        products[cart_item.product_id] = cart_item.product
+
+    try:
+        shortages = []
+        for product_id in sorted(wanted):
+            result = db.session.execute(
+                db.update(Product)
+                .where(Product.id == product_id, Product.quantity >= wanted[product_id])
+                .values(quantity=Product.quantity - wanted[product_id],
+                        units_out=Product.units_out + wanted[product_id])
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                shortages.append({
+                    'product_id': product_id,
+                    'name': products[product_id].name,
+                    'requested': wanted[product_id],
+                    'available': db.session.query(Product.quantity).filter_by(id=product_id).scalar() or 0
+                })
+
+        if shortages:
+            raise OutOfStockError(shortages)
+
+        total_price = sum(products[product_id].price * quantity for product_id, quantity in wanted.items())
+        order = Order(user_id=user_id, total_price=total_price, status='paid')
+        db.session.add(order)
+        db.session.flush()
+
+        db.session.execute(db.insert(OrderItem), [
+            {
+                'order_id': order.id,
+                'product_id': product_id,
+                'quantity': quantity,
+                'price': products[product_id].price
+            }
+            for product_id, quantity in wanted.items()
+        ])
+        record_movements([
+            {'product_id': product_id, 'delta': -quantity, 'reason': 'sale', 'order_id': order.id, 'user_id': user_id}
+            for product_id, quantity in wanted.items()
+        ])
+        record_sales(order.created_at, order.status, [
+            (product_id, quantity, products[product_id].price) for product_id, quantity in wanted.items()
+        ])
+
+        job_queue.enqueue('order.confirmation', {'order_id': order.id},
+                          idempotency_key=f'order-confirmation:{order.id}')
+
+        CartItem.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+        db.session.commit()
+        invalidate_products(*wanted)
+        return order
+    except Exception:
+        db.session.rollback()
+        raise
+
+# ==================== ORDERS ====================
+
+ORDERS_PER_PAGE = 20
+ADMIN_PAGE_SIZE = 50
+
+
+def parse_page_args(default_limit, max_limit=200):
+    """Đọc ?before=<id>&limit=&status= của các danh sách phân trang theo keyset"""
+    before = request.args.get('before', type=int)
+    limit = min(max(request.args.get('limit', default_limit, type=int), 1), max_limit)
+    status = request.args.get('status', '').strip()
+    return before, limit, status if status in ORDER_STATUSES else None
+
+
+def keyset_page(query, id_column, before=None, limit=ADMIN_PAGE_SIZE):
+    """Một trang mới nhất trước theo id: trả về (items, next_before) với next_before là None ở trang cuối"""
+    if before is not None:
+        query = query.filter(id_column < before)
+    items = query.order_by(id_column.desc()).limit(limit + 1).all()
+    if len(items) > limit:
+        return items[:limit], items[limit - 1].id
+    return items, None
+
+
+def get_order_page(user_id=None, status=None, before=None, limit=ORDERS_PER_PAGE):
+    """Trang đơn hàng mới nhất trước, lọc theo người dùng và/hoặc trạng thái (khách hàng nạp sẵn)"""
+    query = Order.query.options(db.joinedload(Order.user))
+    if user_id is not None:
+        query = query.filter(Order.user_id == user_id)
+    if status:
+        query = query.filter(Order.status == status)
+    return keyset_page(query, Order.id, before=before, limit=limit)
+
+
+def load_order(order_id):
+    """Một đơn hàng kèm các dòng và sản phẩm: đúng hai truy vấn, không lazy load trong template"""
+    return (Order.query
+            .options(db.selectinload(Order.items).joinedload(OrderItem.product))
+            .filter(Order.id == order_id)
+            .first())
+
+
+def order_to_dict(order):
+    return {
+        'id': order.id,
+        'user_id': order.user_id,
+        'username': order.user.username if order.user else None,
+        'total_price': order.total_price,
+        'status': order.status,
+        'created_at': order.created_at.isoformat() if order.created_at else None
+    }
+
+
+def user_to_dict(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'is_admin': user.is_admin,
+        'created_at': user.created_at.isoformat() if user.created_at else None
+    }
+
+# ==================== SALES REPORTS ====================
+
+SALES_GRANULARITIES = ['day', 'week', 'month']
+SALES_REPORT_DAYS = 30
+SALES_REPORT_MAX_DAYS = 3660
+
+
+def _upsert(model, rows, keys, increments=(), replace=()):
+    """INSERT ... ON CONFLICT DO UPDATE cộng dồn các cột ``increments`` và ghi đè các cột ``replace``
+    (SQLite và PostgreSQL)"""
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    insert = dialect.insert(model)
+    set_ = {column: getattr(model, column) + getattr(insert.excluded, column) for column in increments}
+    set_.update({column: getattr(insert.excluded, column) for column in replace})
+    insert = insert.on_conflict_do_update(index_elements=keys, set_=set_)
+    db.session.execute(insert, rows)
+
+
+def record_sales(created_at, status, lines, sign=1):
+    """Cộng (sign=1) hoặc trừ (sign=-1) các dòng đơn hàng [(product_id, quantity, price)] vào SalesRollup.
+
+    Chạy trong transaction của thay đổi đơn hàng, không commit. Các dòng được
+    sắp theo khóa để hai transaction đồng thời luôn khóa theo cùng thứ tự.
+    """
+    if created_at is None or not lines:
+        return
+    day = created_at.date()
+    rows = [{
+        'day': day,
+        'product_id': product_id,
+        'status': status,
+        'order_lines': sign,
+        'units': sign * quantity,
+        'revenue': sign * quantity * price
+    } for product_id, quantity, price in sorted(lines)]
+    _upsert(SalesRollup, rows, ['day', 'product_id', 'status'], ['order_lines', 'units', 'revenue'])
+
+
+def period_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_period(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def get_sales_report(date_from, date_to, granularity='day', statuses=None, top_n=5):
+    """Doanh số theo kỳ (ngày / tuần / tháng) trong khoảng [date_from, date_to], chỉ đọc SalesRollup.
+
+    Cơ sở dữ liệu chỉ gom theo ngày (quét một khoảng của khóa chính); gom theo
+    tuần / tháng làm bằng Python nên giống nhau trên SQLite và PostgreSQL. Các
+    kỳ không có đơn hàng vẫn có mặt với giá trị 0.
+    """
+    filters = [SalesRollup.day >= date_from, SalesRollup.day <= date_to]
+    if statuses:
+        filters.append(SalesRollup.status.in_(statuses))
+
+    series = {}
+    day = period_start(date_from, granularity)
+    while day <= date_to:
+        series[day] = {'period': day.isoformat(), 'order_lines': 0, 'units': 0, 'revenue': 0.0}
+        day = next_period(day, granularity)
+
+    daily = (db.session.query(SalesRollup.day,
+                              db.func.sum(SalesRollup.order_lines),
+                              db.func.sum(SalesRollup.units),
+                              db.func.sum(SalesRollup.revenue))
+             .filter(*filters)
+             .group_by(SalesRollup.day))
+    for day, order_lines, units, revenue in daily:
+        bucket = series[period_start(day, granularity)]
+        bucket['order_lines'] += int(order_lines or 0)
+        bucket['units'] += int(units or 0)
+        bucket['revenue'] += float(revenue or 0)
+
+    revenue = db.func.sum(SalesRollup.revenue).label('revenue')
+    top_products = [
+        {'id': id_, 'name': name, 'units': int(units or 0), 'revenue': float(total or 0)}
+        for id_, name, units, total in db.session.query(
+            Product.id, Product.name, db.func.sum(SalesRollup.units), revenue)
+        .join(Product, Product.id == SalesRollup.product_id)
+        .filter(*filters)
+        .group_by(Product.id, Product.name)
+        .order_by(revenue.desc(), Product.id)
+        .limit(top_n)
+    ]
+
+    buckets = list(series.values())
+    return {
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'granularity': granularity,
+        'statuses': statuses or ORDER_STATUSES,
+        'series': buckets,
+        'totals': {
+            'order_lines': sum(bucket['order_lines'] for bucket in buckets),
+            'units': sum(bucket['units'] for bucket in buckets),
+            'revenue': sum(bucket['revenue'] for bucket in buckets)
+        },
+        'top_products': top_products
+    }
+
+
+def rebuild_sales_rollups():
+    """Tính lại toàn bộ SalesRollup từ Order / OrderItem (cho dữ liệu có từ trước hoặc khi lệch)"""
+    db.session.execute(db.delete(SalesRollup))
+    migrations.backfill_sales_rollups(db.session.connection())
+    db.session.commit()
+    return db.session.query(db.func.count()).select_from(SalesRollup).scalar()
+
+# ==================== JOBS ====================
+
+# Hàng đợi việc nền trong database, xử lý bằng `flask worker` (xem jobs.py)
+job_queue = jobs.JobQueue(
+    db, Job,
+    max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', 5)),
+    backoff_base=float(os.environ.get('JOB_BACKOFF_BASE', 2)),
+    backoff_max=float(os.environ.get('JOB_BACKOFF_MAX', 600)),
+    lease=int(os.environ.get('JOB_LEASE_SECONDS', 300))
+)
+
+# Các job quản trị có thể đưa vào hàng đợi từ /admin/jobs
+ADMIN_JOBS = ['inventory.reconcile', 'sales.rebuild_rollups']
+
+def send_mail(to, subject, body):
+    """Gửi email qua SMTP_HOST; chưa cấu hình thì chỉ ghi log (môi trường dev).
+
+    Lỗi SMTP được ném ra để job được thử lại. Email có thể bị gửi lại nếu
+    worker chết ngay sau khi gửi, trước khi job được đánh dấu xong.
+    """
+    host = os.environ.get('SMTP_HOST')
+    if not host:
+        logger.info("Mail (SMTP_HOST chưa cấu hình) to %s: %s", to, subject)
+        return
+    message = EmailMessage()
+    message['From'] = os.environ.get('MAIL_FROM', 'support@techstore.com')
+    message['To'] = to
+    message['Subject'] = subject
+    message.set_content(body)
+    with smtplib.SMTP(host, int(os.environ.get('SMTP_PORT', 587)), timeout=30) as smtp:
+        if os.environ.get('SMTP_STARTTLS', '1') != '0':
+            smtp.starttls()
+        if os.environ.get('SMTP_USER'):
+            smtp.login(os.environ['SMTP_USER'], os.environ.get('SMTP_PASSWORD', ''))
+        smtp.send_message(message)
+
+
+@job_queue.task('order.confirmation')
+def send_order_confirmation(order_id):
+    order = load_order(order_id)
+    if order is None:
+        return
+    lines = '\n'.join(
+        f"- {item.product.name} x {item.quantity}: {item.price * item.quantity:,.0f} ₫" for item in order.items
+    )
+    send_mail(order.user.email, f'Xác nhận đơn hàng #{order.id}',
+              f"Xin chào {order.user.username},\n\n"
+              f"Cảm ơn bạn đã đặt hàng tại TechStore. Đơn hàng #{order.id} gồm:\n\n"
+              f"{lines}\n\nTổng cộng: {order.total_price:,.0f} ₫\n")
+
+
+@job_queue.task('order.status_changed')
+def send_order_status(order_id, status):
+    order = db.session.get(Order, order_id)
+    # Trạng thái đã đổi tiếp trước khi job chạy: bỏ qua thông báo cũ
+    if order is None or order.status != status:
+        return
+    send_mail(order.user.email, f'Đơn hàng #{order.id}: {ORDER_STATUS_LABELS.get(status, status)}',
+              f"Xin chào {order.user.username},\n\n"
+              f"Đơn hàng #{order.id} của bạn đã chuyển sang trạng thái: {ORDER_STATUS_LABELS.get(status, status)}.\n")
+
+
+@job_queue.task('inventory.reconcile')
+def reconcile_inventory_job(fix=False):
+    mismatches = reconcile_inventory(fix=fix)
+    if mismatches:
+        logger.warning("Inventory reconcile: %d products drifted (fix=%s)", len(mismatches), fix)
+
+
+@job_queue.task('sales.rebuild_rollups', max_attempts=1)
+def rebuild_sales_rollups_job():
+    logger.info("Rebuilt %d sales rollup rows", rebuild_sales_rollups())
+
+# ==================== PRODUCT IMAGES ====================
+
+
+def attach_uploaded_image(product, upload):
+    """Gắn ảnh tải lên cho sản phẩm (đã có id) trong transaction hiện tại.
+
+    Chỉ kiểm tra file và ghi các cột: bản gốc được ghi ra UPLOAD_DIR sau khi
+    transaction commit (rollback thì không để lại file), rồi thumbnail được sinh
+    trong thread nền của chính tiến trình web giữ UPLOAD_DIR. Tới lúc đó trang
+    hiển thị bản gốc. Ném ``images.ImageError`` nếu file không hợp lệ.
+    """
+    key, data = image_store.read(upload)
+    product.image_key = key
+    product.image_url = image_store.image_src(key)
+    product.image_widths = None
+    db.session.info.setdefault('uploaded_images', []).append((product.id, key, data))
+    return key
+
+
+@event.listens_for(db.session, 'after_commit')
+def _store_uploaded_images(session):
+    uploaded = session.info.pop('uploaded_images', [])
+    if not uploaded:
+        return
+    app = current_app._get_current_object()
+    for product_id, key, data in uploaded:
+        try:
+            image_store.write_original(key, data)
+        except OSError:
+            logger.exception('Could not store uploaded image %s for product %s', key, product_id)
+            continue
+        image_store.submit(generate_product_image_variants, app, product_id, key)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_uploaded_images(session):
+    session.info.pop('uploaded_images', None)
+
+
+def generate_product_image_variants(app, product_id, key):
+    """Sinh thumbnail cho ảnh ``key`` rồi ghi image_widths của sản phẩm.
+
+    Bỏ qua nếu sản phẩm đã đổi sang ảnh khác trong lúc sinh. Trả về True nếu đã ghi.
+    """
+    with app.app_context():
+        try:
+            widths = image_store.generate_variants(key)
+            updated = db.session.execute(
+                db.update(Product)
+                .where(Product.id == product_id, Product.image_key == key)
+                .values(image_widths=','.join(str(width) for width in widths))
+            ).rowcount
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception('Could not generate thumbnails for product %s (%s)', product_id, key)
+            return False
+        if updated:
+            invalidate_products(product_id, catalog=True)
+        return bool(updated)
+
+# ==================== CATALOG ====================
+
+CATALOG_PER_PAGE = 12
+CATALOG_COUNT_TTL = int(os.environ.get('CATALOG_COUNT_TTL', 300))
+
+
+def get_catalog_count():
+    """Tổng số sản phẩm, được cache và chỉ đếm lại khi danh mục thay đổi (hoặc hết TTL)"""
+    return cache.get_or_set(
+        'catalog:count',
+        lambda: _on_primary(lambda: db.session.query(db.func.count(Product.id)).scalar()),
+        ttl=CATALOG_COUNT_TTL
+    )
+
+
+def invalidate_catalog_count():
+    cache.delete('catalog:count')
+
+
+def get_catalog_last_modified(version):
+    """Thời điểm sản phẩm được sửa gần nhất, đọc một lần cho mỗi phiên bản namespace 'catalog'.
+
+    Mọi thay đổi danh mục đều gọi invalidate_products(..., catalog=True) (bump phiên bản),
+    nên giá trị của một phiên bản không bao giờ cũ; khóa cũ hết hạn theo TTL.
+    """
+    value = cache.get_or_set(
+        f'catalog:{version}:last_modified',
+        lambda: _on_primary(lambda: _isoformat(db.session.query(db.func.max(Product.updated_at)).scalar()))
+    )
+    return datetime.fromisoformat(value) if value else None
+
+
+def _isoformat(value):
+    # Chuỗi rỗng thay cho None: get_or_set không lưu None
+    return value.isoformat() if value else ''
+
+
+def get_cached_product(product_id):
+    """Dữ liệu một sản phẩm, đọc qua cache (None nếu không tồn tại)"""
+    def load():
+        product = db.session.get(Product, product_id)
+        return product_to_dict(product) if product else None
+    return cache.get_or_set(f'product:{product_id}', lambda: _on_primary(load))
+
+
+def _on_primary(load):
+    """Nạp cache từ primary: dữ liệu trễ của replica không được giữ trong cache tới hết TTL"""
+    with database.use_primary():
+        return load()
+
+
+def invalidate_products(*product_ids, catalog=False):
+    """Xóa cache của các sản phẩm đã thay đổi; catalog=True khi danh sách hiển thị cũng đổi"""
+    cache.delete(*(f'product:{product_id}' for product_id in product_ids))
+    if catalog:
+        cache.bump('catalog')
+
+
+def encode_cursor(product):
+    """Mã hóa vị trí (created_at, id) của sản phẩm thành cursor dùng trên URL"""
+    raw = f"{product.created_at.isoformat()}|{product.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Giải mã cursor, trả về None nếu cursor không hợp lệ"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, product_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(product_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def product_to_dict(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'description': product.description,
+        'price': product.price,
+        'quantity': product.quantity,
+        'image_url': product.image_url,
+        'image_key': product.image_key,
+        'image_widths': product.image_widths,
+        'updated_at': product.updated_at.isoformat() if product.updated_at else None
+    }
+
+
+class CatalogPage:
+    """Một trang danh mục sản phẩm, tương thích với các thuộc tính của Pagination mà template dùng"""
+
+    def __init__(self, items, page, per_page, total, has_prev, has_next):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.pages = max(1, -(-total // per_page))
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.prev_num = page - 1 if has_prev else None
+        self.next_num = page + 1 if has_next else None
+        self.prev_cursor = encode_cursor(items[0]) if has_prev and items else None
+        self.next_cursor = encode_cursor(items[-1]) if has_next and items else None
+
+
+def catalog_keyset(after=None, before=None, limit=CATALOG_PER_PAGE):
+    """Lấy một trang sản phẩm theo keyset trên (created_at, id).
+
+    Trả về (items, has_more) với has_more cho biết còn trang tiếp theo theo
+    hướng đang duyệt.
+    """
+    query = Product.query
+    if before is not None:
+        created_at, product_id = before
+        query = query.filter(db.tuple_(Product.created_at, Product.id) < db.tuple_(created_at, product_id))
+        items = query.order_by(Product.created_at.desc(), Product.id.desc()).limit(limit + 1).all()
+        has_more = len(items) > limit
+        return list(reversed(items[:limit])), has_more
+
+    if after is not None:
+        created_at, product_id = after
+        query = query.filter(db.tuple_(Product.created_at, Product.id) > db.tuple_(created_at, product_id))
+    items = query.order_by(Product.created_at, Product.id).limit(limit + 1).all()
+    return items[:limit], len(items) > limit
+
+
+def get_catalog_page(page=1, after=None, before=None, per_page=CATALOG_PER_PAGE):
+    """Trang danh mục cho storefront.
+
+    Khi có cursor (after/before) thì dùng keyset, ngược lại giữ tương thích
+    với URL ``?page=N`` cũ bằng OFFSET trên cùng thứ tự (created_at, id).
+    Trả về None nếu trang không tồn tại.
+    """
+    total = get_catalog_count()
+
+    if after is not None or before is not None:
+        items, has_more = catalog_keyset(after=after, before=before, limit=per_page)
+        if before is not None:
+            return CatalogPage(items, max(page, 1), per_page, total, has_prev=has_more, has_next=True)
+        return CatalogPage(items, max(page, 2), per_page, total, has_prev=True, has_next=has_more)
+
+    if page < 1:
+        return None
+    items = (Product.query
+             .order_by(Product.created_at, Product.id)
+             .offset((page - 1) * per_page)
+             .limit(per_page + 1)
+             .all())
+    if not items and page > 1:
+        return None
+    return CatalogPage(items[:per_page], page, per_page, total,
+                       has_prev=page > 1, has_next=len(items) > per_page)
+
+# ==================== PRODUCT API ====================
+
+PRODUCT_API_FIELDS = ['id', 'name', 'description', 'price', 'quantity', 'image_url', 'updated_at']
+PRODUCT_API_MAX_IDS = 1000
+PRODUCT_API_MAX_LIMIT = 100
+
+
+def parse_product_fields(value):
+    """``"id,name,price"`` -> danh sách trường hợp lệ; rỗng = mọi trường"""
+    if not value:
+        return PRODUCT_API_FIELDS
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in PRODUCT_API_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f'Trường không hợp lệ: {", ".join(unknown)}. Các trường: {", ".join(PRODUCT_API_FIELDS)}')
+    return fields
+
+
+def parse_id_list(value, max_ids=PRODUCT_API_MAX_IDS):
+    """``"1,2,3"`` -> [1, 2, 3] (bỏ trùng, giữ thứ tự); không có tham số -> None"""
+    if value is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+    except ValueError:
+        raise ValueError('ids phải là danh sách số nguyên cách nhau bởi dấu phẩy') from None
+    if not ids or len(ids) > max_ids:
+        raise ValueError(f'Cần từ 1 đến {max_ids} id')
+    return ids
+
+
+def product_rows(fields, ids=None, after=None, limit=CATALOG_PER_PAGE):
+    """Chỉ SELECT các cột cần thiết, không dựng đối tượng ORM. Trả về (rows, has_more).
+
+    ``id`` và ``created_at`` luôn được lấy thêm để ghép theo id và tạo cursor.
+    """
+    columns = [getattr(Product, field) for field in fields]
+    columns += [column for column in (Product.id, Product.created_at) if column.key not in fields]
+    query = db.session.query(*columns)
+    if ids is not None:
+        return query.filter(Product.id.in_(ids)).all(), False
+    if after is not None:
+        query = query.filter(db.tuple_(Product.created_at, Product.id) > db.tuple_(*after))
+    rows = query.order_by(Product.created_at, Product.id).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def product_row_to_dict(row, fields):
+    mapping = row._mapping
+    return {field: mapping[field] for field in fields}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def json_response(payload, status=200):
+    """JSON gọn (orjson nếu có, không thụt lề, giữ nguyên Unicode), nén theo Accept-Encoding"""
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=_json_default).encode()
+    body, encoding = http_cache.compress(body)
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+# ==================== SEARCH ====================
+
+SEARCH_PER_PAGE = 12
+
+
+def search_catalog(query, page=1, per_page=SEARCH_PER_PAGE):
+    """Tìm sản phẩm qua chỉ mục toàn văn, trả về (products, has_next) theo thứ tự liên quan"""
+    hits = fulltext.search(db.session, query, limit=per_page + 1, offset=(page - 1) * per_page)
+    has_next = len(hits) > per_page
+    hits = hits[:per_page]
+    if not hits:
+        return [], False
+    
+    by_id = {product.id: product for product in Product.query.filter(Product.id.in_([pid for pid, _ in hits]))}
+    return [by_id[pid] for pid, _ in hits if pid in by_id], has_next
+
+# ==================== IMPORT / EXPORT ====================
+
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+# Chỉ giữ chi tiết của N dòng lỗi đầu tiên để báo cáo không phình theo kích thước file
+IMPORT_MAX_ERRORS = 1000
+PRODUCT_FIELDS = ['name', 'description', 'price', 'quantity', 'image_url']
+EXPORT_COLUMNS = ['order_id', 'created_at', 'status', 'user_id', 'username', 'order_total',
+                  'product_id', 'product_name', 'quantity', 'price']
+
+
+def validate_product_fields(name, price_str, quantity_str):
+    """Kiểm tra dữ liệu sản phẩm giống form admin, trả về (errors, price, quantity)"""
+    errors = []
+    price = quantity = None
+    
+    if not name:
+        errors.append('Tên sản phẩm không được để trống')
+    
+    if not price_str:
+        errors.append('Giá không được để trống')
+    else:
+        try:
+            price = float(price_str)
+            if price < 0:
+                errors.append('Giá không được âm')
+        except ValueError:
+            errors.append('Giá phải là số hợp lệ')
+    
+    if not quantity_str:
+        errors.append('Số lượng không được để trống')
+    else:
+        try:
+            quantity = int(quantity_str)
+            if quantity < 0:
+                errors.append('Số lượng không được âm')
+        except ValueError:
+            errors.append('Số lượng phải là số nguyên')
+    
+    return errors, price, quantity
+
+
+def detect_import_format(filename='', content_type=''):
+    if filename.lower().endswith(('.jsonl', '.ndjson')) or 'json' in content_type:
+        return 'jsonl'
+    if filename.lower().endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    return None
+
+
+def read_product_rows(stream, fmt):
+    """Đọc lần lượt (số dòng, dict) từ luồng nhị phân CSV hoặc JSON Lines, không nạp cả file vào bộ nhớ"""
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    
+    for line_no, line in enumerate(text_stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_no, row if isinstance(row, dict) else None
+
+
+def import_products(stream, fmt, batch_size=IMPORT_BATCH_SIZE):
+    """Nhập sản phẩm hàng loạt từ CSV / JSON Lines.
+
+    Dòng hợp lệ được gom thành lô và chèn bằng một câu INSERT nhiều dòng, chỉ
+    mục tìm kiếm được cập nhật trong cùng transaction, mỗi lô commit một lần.
+    Trả về báo cáo {'imported', 'failed', 'errors': [{'line', 'errors'}]}.
+    """
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+    
+    def fail(line_no, errors):
+        report['failed'] += 1
+        if len(report['errors']) < IMPORT_MAX_ERRORS:
+            report['errors'].append({'line': line_no, 'errors': errors})
+    
+    batch = []
+    for line_no, row in read_product_rows(stream, fmt):
+        if row is None:
+            fail(line_no, ['Dòng không phải JSON object hợp lệ'])
+            continue
+        fields = {key: '' if row.get(key) is None else str(row.get(key)).strip() for key in PRODUCT_FIELDS}
+        errors, price, quantity = validate_product_fields(fields['name'], fields['price'], fields['quantity'])
+        if errors:
+            fail(line_no, errors)
+            continue
+        batch.append((line_no, {
+            'name': fields['name'],
+            'description': fields['description'],
+            'price': price,
+            'quantity': quantity,
+            'units_in': quantity,
+            'image_url': fields['image_url'] or '/static/default.jpg'
+        }))
+        if len(batch) >= batch_size:
+            _insert_product_batch(batch, report, fail)
+            batch = []
+    if batch:
+        _insert_product_batch(batch, report, fail)
+    
+    if report['imported']:
+        invalidate_catalog_count()
+        cache.bump('catalog')
+    return report
+
+
+def _insert_product_batch(batch, report, fail):
+    insert = db.insert(Product).returning(Product.id, Product.name, Product.description, Product.quantity)
+    try:
+        rows = db.session.execute(insert, [values for _, values in batch]).all()
+        _index_imported(rows)
+        db.session.commit()
+        report['imported'] += len(rows)
+        return
+    except SQLAlchemyError:
+        db.session.rollback()
+    
+    # Lô bị database từ chối: chèn lại từng dòng để biết chính xác dòng nào lỗi
+    for line_no, values in batch:
+        try:
+            rows = db.session.execute(insert, [values]).all()
+            _index_imported(rows)
+            db.session.commit()
+            report['imported'] += 1
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            fail(line_no, [str(getattr(e, 'orig', None) or e).splitlines()[0]])
+
+
+def _index_imported(rows):
+    """Ghi tồn kho đầu kỳ vào sổ kho và thêm vào chỉ mục tìm kiếm các sản phẩm vừa chèn"""
+    record_movements([{'product_id': id_, 'delta': quantity, 'reason': 'opening'} for id_, _, _, quantity in rows])
+    fulltext.index_products(db.session, [(id_, name, description) for id_, name, description, _ in rows])
+
+
+def export_orders_csv(status=None, chunk_rows=1000):
+    """Sinh file CSV (mỗi dòng một sản phẩm của đơn hàng) theo từng khối.
+
+    Dùng ``yield_per`` nên PostgreSQL đọc qua server-side cursor và mỗi lần
+    chỉ giữ ``chunk_rows`` dòng trong bộ nhớ, dù có hàng triệu dòng.
+    """
+    query = (db.select(Order.id, Order.created_at, Order.status, Order.user_id, User.username,
+                       Order.total_price, OrderItem.product_id, Product.name, OrderItem.quantity, OrderItem.price)
+             .outerjoin(User, User.id == Order.user_id)
+             .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+             .outerjoin(Product, Product.id == OrderItem.product_id)
+             .order_by(Order.id))
+    if status:
+        query = query.where(Order.status == status)
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM để Excel nhận đúng UTF-8 (tên sản phẩm tiếng Việt)
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_COLUMNS)
+    
+    # Chạy ở tầng Core (không qua ORM) vì chỉ cần các cột thô
+    result = db.session.connection().execute(query.execution_options(yield_per=chunk_rows))
+    for rows in result.partitions():
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+# ==================== HTTP CACHING ====================
+
+# Cache-Control theo endpoint; ghi đè bằng CACHE_CONTROL_<ENDPOINT>, ví dụ CACHE_CONTROL_PRODUCT_DETAIL
+CACHE_CONTROL = http_cache.load_policies({
+    'index': 'public, max-age=0, must-revalidate',
+    'product_detail': 'public, max-age=60, must-revalidate',
+})
+
+
+def conditional_page(validators, last_modified, render):
+    """Trả 304 nếu client đã có đúng phiên bản trang, nếu không thì gọi render().
+
+    ETag gồm các validator của dữ liệu, người dùng hiện tại (header của trang
+    khác nhau theo tài khoản), hash của thư mục templates và phiên bản asset. Trang có flash
+    message thì không được cache.
+    """
+    if session.get('_flashes'):
+        response = make_response(render())
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    templates = http_cache.tree_digest(os.path.join(current_app.root_path, current_app.template_folder))
+    etag = http_cache.make_etag(templates, static_assets.version, session.get('user_id'), session.get('is_admin', False),
+                                *validators)
+    policy = CACHE_CONTROL.get(request.endpoint.rpartition('.')[2])
+    if policy and session.get('user_id'):
+        policy = policy.replace('public', 'private')
+
+    if http_cache.is_not_modified(etag, last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+    return http_cache.set_validators(response, etag, last_modified, policy)
+
+# ==================== AUTH ====================
+
+def throttle(*checks):
+    """Lấy token từ từng (limiter, key); trả về số giây phải chờ nếu một bucket đã cạn, 0 nếu được phép"""
+    for limiter, key in checks:
+        if limiter is not None:
+            retry_after = limiter.hit(key)
+            if retry_after:
+                return retry_after
+    return 0
+
+
+def auth_error(template, message, status, retry_after=None):
+    response = make_response(render_template(template, error=message), status)
+    if retry_after:
+        response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response
 
 # ==================== ROUTES ====================
 
-@app.route('/')
+@bp.route('/')
+@replica_reads
 def index():
     page = request.args.get('page', 1, type=int)
-    products = Product.query.paginate(page=page, per_page=12)
-    return render_template('index.html', products=products, title='Trang Chủ')
+    after = decode_cursor(request.args.get('after', ''))
+    before = decode_cursor(request.args.get('before', '')) if after is None else None
+    # Phiên bản namespace 'catalog' đổi sau mỗi thay đổi danh mục (cache file dùng chung giữa các
+    # worker): nó là validator và khóa cache, không truy vấn database khi trang còn trong cache
+    version = cache.version('catalog')
+    last_modified = get_catalog_last_modified(version)
+    
+    def render():
+        key = 'catalog:{}:{}:{}:{}:{}'.format(
+            version, page,
+            request.args.get('after', '') if after else '',
+            request.args.get('before', '') if before else '',
+            1 if session.get('user_id') else 0
+        )
+        catalog_html = cache.get(key)
+        if catalog_html is None:
+            products = get_catalog_page(page=page, after=after, before=before)
+            if products is None:
+                abort(404)
+            catalog_html = render_template('_catalog.html', products=products)
+            cache.set(key, catalog_html)
+        return render_template('index.html', catalog_html=Markup(catalog_html), title='Trang Chủ')
+    
+    return conditional_page((version,), last_modified, render)
 
 
-@app.route('/product/<int:product_id>')
+@bp.route('/product/<int:product_id>')
+@replica_reads
 def product_detail(product_id):
-    product = Product.query.get_or_404(product_id)
-    return render_template('product_detail.html', product=product)
+    product = get_cached_product(product_id)
+    if product is None:
+        abort(404)
+    updated_at = product.get('updated_at')
+    return conditional_page(
+        (product_id, updated_at),
+        datetime.fromisoformat(updated_at) if updated_at else None,
+        lambda: render_template('product_detail.html', product=product)
+    )
+
+
+@bp.route('/search')
+@replica_reads
+def search_products():
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    
+    products, has_next = search_catalog(query, page=page) if query else ([], False)
+    return render_template('search.html', query=query, products=products, page=page,
+                           has_next=has_next, title='Tìm Kiếm')
+
+
+@bp.route('/api/search')
+@replica_reads
+def api_search():
+    """API tìm kiếm sản phẩm"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': 'Vui lòng nhập từ khóa'}), 400
+    
+    page = max(1, request.args.get('page', 1, type=int))
+    limit = max(1, min(request.args.get('limit', SEARCH_PER_PAGE, type=int), 100))
+    products, has_next = search_catalog(query, page=page, per_page=limit)
+    return jsonify({
+        'success': True,
+        'products': [product_to_dict(product) for product in products],
+        'page': page,
+        'has_next': has_next
+    })
+
+
+@bp.route('/api/products')
+@replica_reads
+def api_products():
+    """API sản phẩm công khai.
+
+    ``?ids=1,2,3`` lấy theo danh sách id (giữ thứ tự, id không tồn tại nằm trong
+    ``missing``), nếu không thì phân trang theo cursor (``?after=&limit=``).
+    ``?fields=id,name,price`` chỉ trả về các trường được chọn. Response được nén
+    gzip / brotli theo Accept-Encoding.
+    """
+    try:
+        fields = parse_product_fields(request.args.get('fields'))
+        ids = parse_id_list(request.args.get('ids'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if ids is not None:
+        rows, _ = product_rows(fields, ids=ids)
+        by_id = {row.id: row for row in rows}
+        return json_response({
+            'success': True,
+            'products': [product_row_to_dict(by_id[product_id], fields) for product_id in ids if product_id in by_id],
+            'missing': [product_id for product_id in ids if product_id not in by_id]
+        })
+    
+    limit = max(1, min(request.args.get('limit', CATALOG_PER_PAGE, type=int), PRODUCT_API_MAX_LIMIT))
+    after = request.args.get('after')
+    cursor = None
+    if after:
+        cursor = decode_cursor(after)
+        if cursor is None:
+            return jsonify({'success': False, 'message': 'Cursor không hợp lệ'}), 400
+    
+    rows, has_more = product_rows(fields, after=cursor, limit=limit)
+    return json_response({
+        'success': True,
+        'products': [product_row_to_dict(row, fields) for row in rows],
+        'next_cursor': encode_cursor(rows[-1]) if has_more else None,
+        'total': get_catalog_count()
+    })
 
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -97,6 +1558,10 @@ def register():
         password = request.form.get('password')
         confirm_password = request.form.get('confirm_password')
         
+        retry_after = throttle((login_ip_limiter, f'register:{request.remote_addr}'))
+        if retry_after:
+            return auth_error('register.html', 'Quá nhiều lần đăng ký, vui lòng thử lại sau ít phút', 429, retry_after)
+        
         if not username or not email or not password:
             return render_template('register.html', error='Vui lòng điền đầy đủ thông tin')
         
@@ -109,85 +1574,136 @@ def register():
         if User.query.filter_by(email=email).first():
             return render_template('register.html', error='Email đã tồn tại')
         
+        try:
+            password_hash = hasher.hash(password)
+        except passwords.HasherBusy:
+            return auth_error('register.html', 'Hệ thống đang bận, vui lòng thử lại sau giây lát', 503, 1)
+        
         user = User(
             username=username,
             email=email,
-            password=generate_password_hash(password)
+            password=password_hash
         )
         db.session.add(user)
         db.session.commit()
         
-        return redirect(url_for('login'))
+        return redirect(url_for('shop.login'))
     
     return render_template('register.html', title='Đăng Ký')
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
+        username = request.form.get('username', '')
+        password = request.form.get('password', '')
+        
+        # Chặn trước khi chạm tới database và hàm băm
+        retry_after = throttle((login_ip_limiter, request.remote_addr), (login_user_limiter, username[:80]))
+        if retry_after:
+            logger.warning("Login throttled for %s from %s", username[:80], request.remote_addr)
+            return auth_error('login.html', 'Quá nhiều lần đăng nhập, vui lòng thử lại sau ít phút', 429, retry_after)
         
         user = User.query.filter_by(username=username).first()
         
-        if user and check_password_hash(user.password, password):
+        try:
+            valid = user is not None and hasher.check(user.password, password)
+        except passwords.HasherBusy:
+            return auth_error('login.html', 'Hệ thống đang bận, vui lòng thử lại sau giây lát', 503, 1)
+        
+        if valid:
+            # Tham số băm đã đổi (PASSWORD_HASH_METHOD): băm lại bằng tham số mới khi đang có mật khẩu gốc
+            if hasher.needs_rehash(user.password):
+                try:
+                    user.password = hasher.hash(password)
+                    db.session.commit()
+                except passwords.HasherBusy:
+                    pass  # để lần đăng nhập sau
             session['user_id'] = user.id
             session['username'] = user.username
             session['is_admin'] = user.is_admin
-            return redirect(url_for('index'))
+            return redirect(url_for('shop.index'))
         else:
             return render_template('login.html', error='Tên đăng nhập hoặc mật khẩu không đúng')
     
     return render_template('login.html', title='Đăng Nhập')
 
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('index'))
+    return redirect(url_for('shop.index'))
 
 
-@app.route('/cart')
+@bp.route('/cart')
 def cart():
     user_id = session.get('user_id')
     if not user_id:
-        return redirect(url_for('login'))
+        return redirect(url_for('shop.login'))
     
-    cart_items = CartItem.query.filter_by(user_id=user_id).all()
+    cart_items = load_cart(user_id)
     total_price = sum(item.product.price * item.quantity for item in cart_items)
     
     return render_template('cart.html', cart_items=cart_items, total_price=total_price, title='Giỏ Hàng')
 
 
-@app.route('/add-to-cart/<int:product_id>', methods=['POST'])
+@bp.route('/add-to-cart/<int:product_id>', methods=['POST'])
 def add_to_cart(product_id):
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'success': False, 'message': 'Vui lòng đăng nhập'}), 401
     
     quantity = request.form.get('quantity', 1, type=int)
-    product = Product.query.get_or_404(product_id)
+    try:
+        apply_cart_ops(user_id, [{'op': 'add', 'product_id': product_id, 'quantity': quantity}])
+    except CartError as e:
+        return jsonify({'success': False, 'message': e.errors[0]['message']}), 400
     
-    if product.quantity < quantity:
-        return jsonify({'success': False, 'message': 'Số lượng sản phẩm không đủ'}), 400
+    return jsonify({'success': True, 'message': 'Thêm vào giỏ hàng thành công'})
+
+
+@bp.route('/api/cart', methods=['GET'])
+def api_cart():
+    """Giỏ hàng hiện tại dạng JSON"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'message': 'Vui lòng đăng nhập'}), 401
+    
+    return jsonify({'success': True, **cart_to_dict(load_cart(user_id))})
+
+
+@bp.route('/api/cart', methods=['POST'])
+def api_update_cart():
+    """Áp dụng một loạt thao tác trong một transaction:
+    {"ops": [{"op": "set"|"add"|"remove", "product_id": 1, "quantity": 2}, ...]}"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'message': 'Vui lòng đăng nhập'}), 401
     
-    cart_item = CartItem.query.filter_by(user_id=user_id, product_id=product_id).first()
+    data = request.get_json(silent=True)
+    ops = data.get('ops') if isinstance(data, dict) else None
+    if not isinstance(ops, list) or not ops or len(ops) > CART_MAX_OPS:
+        return jsonify({
+            'success': False,
+            'message': f'Cần JSON {{"ops": [...]}} với 1 đến {CART_MAX_OPS} thao tác'
+        }), 400
     
-    if cart_item:
-        cart_item.quantity += quantity
-    else:
-        cart_item = CartItem(user_id=user_id, product_id=product_id, quantity=quantity)
-        db.session.add(cart_item)
+    try:
+        cart_items = apply_cart_ops(user_id, ops)
+    except CartError as e:
+        return jsonify({'success': False, 'message': str(e), 'errors': e.errors}), 400
+    except Exception as e:
+        logger.error("Error updating cart: %s", e)
+        return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
     
-    db.session.commit()
-    return jsonify({'success': True, 'message': 'Thêm vào giỏ hàng thành công'})
+    return jsonify({'success': True, 'message': 'Đã cập nhật giỏ hàng', **cart_to_dict(cart_items)})
 
 
-@app.route('/remove-from-cart/<int:cart_item_id>', methods=['POST'])
+@bp.route('/remove-from-cart/<int:cart_item_id>', methods=['POST'])
 def remove_from_cart(cart_item_id):
     user_id = session.get('user_id')
     if not user_id:
-        return redirect(url_for('login'))
+        return redirect(url_for('shop.login'))
     
     cart_item = CartItem.query.get_or_404(cart_item_id)
     if cart_item.user_id != user_id:
@@ -196,86 +1712,245 @@ def remove_from_cart(cart_item_id):
     db.session.delete(cart_item)
     db.session.commit()
     
-    return redirect(url_for('cart'))
+    return redirect(url_for('shop.cart'))
 
 
-@app.route('/checkout', methods=['GET', 'POST'])
+@bp.route('/checkout', methods=['GET', 'POST'])
 def checkout():
     user_id = session.get('user_id')
     if not user_id:
-        return redirect(url_for('login'))
+        return redirect(url_for('shop.login'))
     
-    user = User.query.get(user_id)
-    cart_items = CartItem.query.filter_by(user_id=user_id).all()
+    cart_items = load_cart(user_id)
     
     if not cart_items:
-        return redirect(url_for('cart'))
+        return redirect(url_for('shop.cart'))
     
     if request.method == 'POST':
-        total_price = sum(item.product.price * item.quantity for item in cart_items)
-        
-        order = Order(user_id=user_id, total_price=total_price, status='paid')
-        db.session.add(order)
-        db.session.flush()
-        
-        for cart_item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
-            )
-            cart_item.product.quantity -= cart_item.quantity
-            db.session.add(order_item)
-        
-        CartItem.query.filter_by(user_id=user_id).delete()
-        db.session.commit()
+        try:
+            order = place_order(user_id, cart_items)
+        except OutOfStockError as e:
+            for item in e.shortages:
+                flash(f"Sản phẩm {item['name']} chỉ còn {item['available']}, không đủ {item['requested']}", 'error')
+            return redirect(url_for('shop.cart'))
         
-        return redirect(url_for('order_success', order_id=order.id))
+        return redirect(url_for('shop.order_success', order_id=order.id))
     
+    user = User.query.get(user_id)
     total_price = sum(item.product.price * item.quantity for item in cart_items)
     return render_template('checkout.html', cart_items=cart_items, total_price=total_price, 
                          user=user, title='Thanh Toán')
 
 
-@app.route('/order-success/<int:order_id>')
+@bp.route('/order-success/<int:order_id>')
 def order_success(order_id):
     user_id = session.get('user_id')
     if not user_id:
-        return redirect(url_for('login'))
+        return redirect(url_for('shop.login'))
     
-    order = Order.query.get_or_404(order_id)
+    order = load_order(order_id)
+    if order is None:
+        abort(404)
     if order.user_id != user_id:
         return jsonify({'success': False, 'message': 'Không có quyền xem'}), 403
     
     return render_template('order_success.html', order=order, title='Đơn Hàng Thành Công')
 
 
-@app.route('/orders')
+@bp.route('/orders')
+@replica_reads
 def orders():
     user_id = session.get('user_id')
     if not user_id:
-        return redirect(url_for('login'))
+        return redirect(url_for('shop.login'))
     
-    orders = Order.query.filter_by(user_id=user_id).all()
-    return render_template('orders.html', orders=orders, title='Đơn Hàng Của Tôi')
+    before, limit, status = parse_page_args(ORDERS_PER_PAGE, max_limit=100)
+    orders, next_before = get_order_page(user_id=user_id, status=status, before=before, limit=limit)
+    return render_template('orders.html', orders=orders, next_before=next_before, status=status,
+                           title='Đơn Hàng Của Tôi')
 
 
-@app.route('/admin')
+@bp.route('/admin')
+@replica_reads
 def admin():
     is_admin = session.get('is_admin', False)
     if not is_admin:
-        return redirect(url_for('login'))
+        return redirect(url_for('shop.login'))
     
     products = Product.query.all()
-    orders = Order.query.all()
-    users = User.query.all()
+    # Chỉ trang đầu; các trang sau được tab tải dần qua /admin/orders và /admin/users
+    orders, orders_next = get_order_page(limit=ADMIN_PAGE_SIZE)
+    users, users_next = keyset_page(User.query, User.id, limit=ADMIN_PAGE_SIZE)
+    stats = get_admin_stats()
     
-    return render_template('admin.html', products=products, orders=orders, 
-                         users=users, title='Trang Quản Trị')
+    return render_template('admin.html', products=products, orders=orders, orders_next=orders_next,
+                         users=users, users_next=users_next, stats=stats, title='Trang Quản Trị')
 
 
-@app.route('/admin/product/<int:product_id>', methods=['GET'])
+@bp.route('/admin/orders', methods=['GET'])
+@replica_reads
+def admin_orders():
+    """Trang đơn hàng dạng JSON cho tab Đơn Hàng: ?before=<id>&status=&limit="""
+    is_admin = session.get('is_admin', False)
+    if not is_admin:
+        return jsonify({'success': False, 'message': 'Không có quyền'}), 403
+    
+    before, limit, status = parse_page_args(ADMIN_PAGE_SIZE)
+    orders, next_before = get_order_page(status=status, before=before, limit=limit)
+    return jsonify({
+        'success': True,
+        'orders': [order_to_dict(order) for order in orders],
+        'html': render_template('_admin_order_rows.html', orders=orders),
+        'next_before': next_before
+    })
+
+
+@bp.route('/admin/users', methods=['GET'])
+@replica_reads
+def admin_users():
+    """Trang người dùng dạng JSON cho tab Người Dùng: ?before=<id>&limit="""
+    is_admin = session.get('is_admin', False)
+    if not is_admin:
+        return jsonify({'success': False, 'message': 'Không có quyền'}), 403
+    
+    before, limit, _ = parse_page_args(ADMIN_PAGE_SIZE)
+    users, next_before = keyset_page(User.query, User.id, before=before, limit=limit)
+    return jsonify({
+        'success': True,
+        'users': [user_to_dict(user) for user in users],
+        'html': render_template('_admin_user_rows.html', users=users),
+        'next_before': next_before
+    })
+
+
+@bp.route('/admin/stats', methods=['GET'])
+@replica_reads
+def admin_stats():
+    """API endpoint trả về số liệu thống kê của trang quản trị"""
+    is_admin = session.get('is_admin', False)
+    if not is_admin:
+        return jsonify({'success': False, 'message': 'Không có quyền'}), 403
+    
+    top_n = request.args.get('top', 5, type=int)
+    try:
+        return jsonify({'success': True, 'stats': get_admin_stats(top_n=max(1, min(top_n, 50)))})
+    except Exception as e:
+        logger.error("Error computing stats: %s", e)
+        return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
+
+
+@bp.route('/admin/reports/sales', methods=['GET'])
+@replica_reads
+def admin_sales_report():
+    """Doanh số theo kỳ từ SalesRollup: ?from=YYYY-MM-DD&to=YYYY-MM-DD&granularity=day|week|month&status="""
+    is_admin = session.get('is_admin', False)
+    if not is_admin:
+        return jsonify({'success': False, 'message': 'Không có quyền'}), 403
+    
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in SALES_GRANULARITIES:
+        return jsonify({'success': False, 'message': f'granularity phải là một trong: {", ".join(SALES_GRANULARITIES)}'}), 400
+    
+    statuses = [status for status in request.args.get('status', '').split(',') if status]
+    if any(status not in ORDER_STATUSES for status in statuses):
+        return jsonify({'success': False, 'message': f'Trạng thái hợp lệ: {", ".join(ORDER_STATUSES)}'}), 400
+    
+    try:
+        date_to = date.fromisoformat(request.args['to']) if request.args.get('to') else datetime.utcnow().date()
+        date_from = (date.fromisoformat(request.args['from']) if request.args.get('from')
+                     else date_to - timedelta(days=SALES_REPORT_DAYS - 1))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Ngày không hợp lệ, dùng định dạng YYYY-MM-DD'}), 400
+    if date_from > date_to:
+        return jsonify({'success': False, 'message': 'Ngày bắt đầu phải trước ngày kết thúc'}), 400
+    if (date_to - date_from).days > SALES_REPORT_MAX_DAYS:
+        return jsonify({'success': False, 'message': f'Khoảng thời gian tối đa {SALES_REPORT_MAX_DAYS} ngày'}), 400
+    
+    top_n = request.args.get('top', 5, type=int)
+    try:
+        report = get_sales_report(date_from, date_to, granularity, statuses, top_n=max(1, min(top_n, 50)))
+        return jsonify({'success': True, 'report': report})
+    except Exception as e:
+        logger.error("Error computing sales report: %s", e)
+        return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
+
+
+@bp.route('/admin/cache-stats', methods=['GET'])
+def admin_cache_stats():
+    """API endpoint trả về bộ đếm hit/miss của cache (cộng dồn mọi worker qua METRICS_DIR)"""
+    is_admin = session.get('is_admin', False)
+    if not is_admin:
+        return jsonify({'success': False, 'message': 'Không có quyền'}), 403
+    
+    return jsonify({'success': True, 'cache': cache.stats(metrics.counters('cache'))})
+
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Số liệu hiệu năng dạng text của Prometheus"""
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'success': False, 'message': 'Không có quyền'}), 403
+    
+    return metrics.response()
+
+
+@bp.route('/admin/import-products', methods=['POST'])
+def admin_import_products():
+    is_admin = session.get('is_admin', False)
+    if not is_admin:
+        return jsonify({'success': False, 'message': 'Không có quyền'}), 403
+    
+    # Nhận file qua form multipart (trường "file") hoặc nội dung thô với Content-Type text/csv / application/x-ndjson
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+        fmt = request.args.get('format') or detect_import_format(upload.filename or '', upload.mimetype or '')
+    else:
+        stream = request.stream
+        fmt = request.args.get('format') or detect_import_format(content_type=request.mimetype or '')
+    
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'message': 'Định dạng không hỗ trợ, dùng CSV hoặc JSON Lines'}), 400
+    
+    try:
+        report = import_products(stream, fmt)
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'File không hợp lệ: {str(e)}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error importing products: %s", e)
+        return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
+    
+    logger.info("Admin imported products: %s imported, %s failed", report['imported'], report['failed'])
+    return jsonify({
+        'success': report['failed'] == 0,
+        'message': f"Đã nhập {report['imported']} sản phẩm, {report['failed']} dòng lỗi",
+        **report
+    })
+
+
+@bp.route('/admin/export-orders', methods=['GET'])
+@replica_reads
+def admin_export_orders():
+    is_admin = session.get('is_admin', False)
+    if not is_admin:
+        return jsonify({'success': False, 'message': 'Không có quyền'}), 403
+    
+    status = request.args.get('status') or None
+    if status and status not in ORDER_STATUSES:
+        return jsonify({'success': False, 'message': 'Trạng thái không hợp lệ'}), 400
+    
+    filename = f"orders-{datetime.utcnow():%Y%m%d-%H%M%S}.csv"
+    return current_app.response_class(
+        stream_with_context(export_orders_csv(status)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+@bp.route('/admin/product/<int:product_id>', methods=['GET'])
 def admin_get_product(product_id):
     """API endpoint để lấy dữ liệu sản phẩm"""
     is_admin = session.get('is_admin', False)
@@ -284,26 +1959,19 @@ def admin_get_product(product_id):
     
     try:
         product = Product.query.get_or_404(product_id)
-        return jsonify({
-            'id': product.id,
-            'name': product.name,
-            'description': product.description,
-            'price': product.price,
-            'quantity': product.quantity,
-            'image_url': product.image_url
-        })
+        return jsonify(product_to_dict(product))
     except Exception as e:
-        logger.error(f"Error getting product: {str(e)}")
+        logger.error("Error getting product: %s", e)
         return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
 
 
 # ĐÃ SỬA: Thay vì return jsonify, hàm này dùng flash và redirect
-@app.route('/admin/add-product', methods=['POST'])
+@bp.route('/admin/add-product', methods=['POST'])
 def admin_add_product():
     is_admin = session.get('is_admin', False)
     if not is_admin:
         flash('Không có quyền truy cập', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('shop.login'))
     
     # Lấy dữ liệu từ form
     name = request.form.get('name', '').strip()
@@ -311,11 +1979,12 @@ def admin_add_product():
     price_str = request.form.get('price', '').strip()
     quantity_str = request.form.get('quantity', '').strip()
     image_url = request.form.get('image_url', '').strip()
+    image_file = request.files.get('image_file')
     
     # Validate required fields
     if not name or not price_str or not quantity_str:
         flash('Vui lòng điền đầy đủ Tên, Giá và Số lượng', 'error')
-        return redirect(url_for('admin'))
+        return redirect(url_for('shop.admin'))
     
     try:
         price = float(price_str)
@@ -323,34 +1992,47 @@ def admin_add_product():
         
         if price < 0 or quantity < 0:
             flash('Giá và số lượng không được âm', 'error')
-            return redirect(url_for('admin'))
+            return redirect(url_for('shop.admin'))
             
         product = Product(
             name=name, 
             description=description, 
             price=price, 
             quantity=quantity, 
+            units_in=quantity,
             image_url=image_url if image_url else '/static/default.jpg'
         )
         db.session.add(product)
+        db.session.flush()
+        if image_file and image_file.filename:
+            attach_uploaded_image(product, image_file)
+        record_movements([{'product_id': product.id, 'delta': quantity, 'reason': 'opening',
+                           'user_id': session.get('user_id')}])
+        fulltext.index_product(db.session, product.id, product.name, product.description)
         db.session.commit()
-        logger.info(f"Admin added product: {product.name} (id={product.id})")
+        invalidate_catalog_count()
+        invalidate_products(product.id, catalog=True)
+        logger.info("Admin added product: %s (id=%s)", product.name, product.id)
         
         # Sửa ở đây: Trả về trang admin kèm thông báo thành công
         flash('Thêm sản phẩm thành công!', 'success')
-        return redirect(url_for('admin'))
+        return redirect(url_for('shop.admin'))
         
+    except images.ImageError as e:
+        db.session.rollback()
+        flash(str(e), 'error')
+        return redirect(url_for('shop.admin'))
     except ValueError:
         flash('Giá và số lượng phải là số hợp lệ', 'error')
-        return redirect(url_for('admin'))
+        return redirect(url_for('shop.admin'))
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error adding product: {str(e)}")
+        logger.error("Error adding product: %s", e)
         flash(f'Có lỗi xảy ra: {str(e)}', 'error')
-        return redirect(url_for('admin'))
+        return redirect(url_for('shop.admin'))
 
 
-@app.route('/admin/update-product/<int:product_id>', methods=['POST'])
+@bp.route('/admin/update-product/<int:product_id>', methods=['POST'])
 def admin_update_product(product_id):
     is_admin = session.get('is_admin', False)
     if not is_admin:
@@ -365,56 +2047,51 @@ def admin_update_product(product_id):
         price_str = request.form.get('price', '').strip()
         quantity_str = request.form.get('quantity', '').strip()
         image_url = request.form.get('image_url', '').strip()
+        image_file = request.files.get('image_file')
         
         # Validation
-        errors = []
-        
-        if not name:
-            errors.append('Tên sản phẩm không được để trống')
-        
-        if not price_str:
-            errors.append('Giá không được để trống')
-        else:
-            try:
-                price = float(price_str)
-                if price < 0:
-                    errors.append('Giá không được âm')
-            except ValueError:
-                errors.append('Giá phải là số hợp lệ')
-        
-        if not quantity_str:
-            errors.append('Số lượng không được để trống')
-        else:
-            try:
-                quantity = int(quantity_str)
-                if quantity < 0:
-                    errors.append('Số lượng không được âm')
-            except ValueError:
-                errors.append('Số lượng phải là số nguyên')
-        
+        errors, price, quantity = validate_product_fields(name, price_str, quantity_str)
         if errors:
             return jsonify({'success': False, 'message': ', '.join(errors)}), 400
         
         # Cập nhật sản phẩm
         product.name = name
         product.description = description
-        product.price = float(price_str)
-        product.quantity = int(quantity_str)
-        product.image_url = image_url if image_url else product.image_url
+        product.price = price
+        if image_file and image_file.filename:
+            try:
+                attach_uploaded_image(product, image_file)
+            except images.ImageError as e:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': str(e)}), 400
+        elif image_url and image_url != product.image_url:
+            # URL ngoài thay cho ảnh tải lên: bỏ các thumbnail cũ
+            product.image_url = image_url
+            product.image_key = None
+            product.image_widths = None
+        fulltext.index_product(db.session, product.id, product.name, product.description)
+        # Số lượng mới được ghi thành một dòng điều chỉnh trong sổ kho
+        if quantity != product.quantity:
+            try:
+                adjust_stock(product.id, quantity - product.quantity, 'correction', user_id=session.get('user_id'))
+            except InsufficientStockError:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': 'Tồn kho vừa thay đổi, vui lòng tải lại và thử lại'}), 409
         
         db.session.commit()
-        logger.info(f"Admin updated product: {product.name} (id={product.id})")
+        invalidate_products(product_id, catalog=True)
+        logger.info("Admin updated product: %s (id=%s)", product.name, product.id)
         
         return jsonify({'success': True, 'message': 'Cập nhật sản phẩm thành công'})
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error updating product: {str(e)}")
+        logger.error("Error updating product: %s", e)
         return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
 
 
 # Giữ nguyên return jsonify vì Javascript fetch của bạn đang chờ chuỗi JSON
-@app.route('/admin/delete-product/<int:product_id>', methods=['POST'])
+@bp.route('/admin/delete-product/<int:product_id>', methods=['POST'])
 def admin_delete_product(product_id):
     is_admin = session.get('is_admin', False)
     if not is_admin:
@@ -433,19 +2110,25 @@ def admin_delete_product(product_id):
             }), 400
         
         product_name = product.name
+        # Tồn còn lại được ghi xuất khỏi sổ trước khi xóa; các dòng sổ kho của sản phẩm được giữ lại
+        record_movements([{'product_id': product_id, 'delta': -(product.quantity or 0), 'reason': 'delete',
+                           'user_id': session.get('user_id')}])
         db.session.delete(product)
+        fulltext.remove_product(db.session, product_id)
         db.session.commit()
+        invalidate_catalog_count()
+        invalidate_products(product_id, catalog=True)
         
-        logger.info(f"Admin deleted product: {product_name} (id={product_id})")
+        logger.info("Admin deleted product: %s (id=%s)", product_name, product_id)
         return jsonify({'success': True, 'message': 'Xóa sản phẩm thành công'})
     
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error deleting product: {str(e)}")
+        logger.error("Error deleting product: %s", e)
         return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
 
 
-@app.route('/admin/adjust-inventory', methods=['POST'])
+@bp.route('/admin/adjust-inventory', methods=['POST'])
 def admin_adjust_inventory():
     is_admin = session.get('is_admin', False)
     if not is_admin:
@@ -471,33 +2154,69 @@ def admin_adjust_inventory():
             return jsonify({'success': False, 'message': 'Số lượng phải là số nguyên'}), 400
         
         product = Product.query.get_or_404(product_id)
-        old_quantity = product.quantity
         
+        # Cộng/trừ ngay trong câu UPDATE thay vì đọc - sửa - ghi, và ghi sổ kho trong cùng transaction
         if adjustment_type == 'in':
-            product.quantity += quantity
+            new_quantity = adjust_stock(product.id, quantity, 'restock', user_id=session.get('user_id'))
             action = 'Nhập'
         else:  # out
-            if product.quantity < quantity:
+            try:
+                new_quantity = adjust_stock(product.id, -quantity, 'adjust_out', user_id=session.get('user_id'))
+            except InsufficientStockError:
+                db.session.rollback()
                 return jsonify({'success': False, 'message': 'Tồn kho không đủ để xuất'}), 400
-            product.quantity -= quantity
             action = 'Xuất'
+        old_quantity = new_quantity - quantity if adjustment_type == 'in' else new_quantity + quantity
         
         db.session.commit()
-        logger.info(f"Admin adjusted inventory: {product.name} - {action} {quantity} (từ {old_quantity} sang {product.quantity})")
+        invalidate_products(product.id)
+        logger.info("Admin adjusted inventory: %s - %s %s (từ %s sang %s)",
+                    product.name, action, quantity, old_quantity, new_quantity)
         
         return jsonify({
             'success': True, 
-            'message': f'{action} {quantity} đơn vị {product.name} thành công (từ {old_quantity} sang {product.quantity})'
+            'message': f'{action} {quantity} đơn vị {product.name} thành công (từ {old_quantity} sang {new_quantity})'
         })
     
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error adjusting inventory: {str(e)}")
+        logger.error("Error adjusting inventory: %s", e)
         return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
 
 
+@bp.route('/admin/inventory-movements', methods=['GET'])
+@replica_reads
+def admin_inventory_movements():
+    """Lịch sử sổ kho mới nhất trước; lọc theo ?product_id=, trang tiếp theo bằng ?before=<id>"""
+    is_admin = session.get('is_admin', False)
+    if not is_admin:
+        return jsonify({'success': False, 'message': 'Không có quyền'}), 403
+    
+    product_id = request.args.get('product_id', type=int)
+    before, limit, _ = parse_page_args(50)
+    
+    query = InventoryMovement.query
+    if product_id:
+        query = query.filter(InventoryMovement.product_id == product_id)
+    movements, next_before = keyset_page(query, InventoryMovement.id, before=before, limit=limit)
+    
+    return jsonify({
+        'success': True,
+        'movements': [{
+            'id': movement.id,
+            'product_id': movement.product_id,
+            'delta': movement.delta,
+            'reason': movement.reason,
+            'order_id': movement.order_id,
+            'user_id': movement.user_id,
+            'created_at': movement.created_at.isoformat() if movement.created_at else None
+        } for movement in movements],
+        'next_before': next_before
+    })
+
+
 # Giữ nguyên return jsonify vì Javascript fetch của bạn đang chờ chuỗi JSON
-@app.route('/admin/update-order-status/<int:order_id>', methods=['POST'])
+@bp.route('/admin/update-order-status/<int:order_id>', methods=['POST'])
 def admin_update_order_status(order_id):
     is_admin = session.get('is_admin', False)
     if not is_admin:
@@ -508,7 +2227,7 @@ def admin_update_order_status(order_id):
         status = request.form.get('status', '').strip()
         
         # Validate status
-        valid_statuses = ['pending', 'paid', 'shipped', 'delivered']
+        valid_statuses = ORDER_STATUSES
         if status not in valid_statuses:
             return jsonify({
                 'success': False, 
@@ -522,26 +2241,95 @@ def admin_update_order_status(order_id):
             })
         
         old_status = order.status
-        order.status = status
+        # Chỉ đổi nếu trạng thái vẫn là trạng thái vừa đọc, để doanh số không bị chuyển hai lần
+        result = db.session.execute(
+            db.update(Order)
+            .where(Order.id == order_id, Order.status == old_status)
+            .values(status=status)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'Đơn hàng vừa được cập nhật bởi người khác, vui lòng tải lại'}), 409
+        
+        lines = db.session.query(OrderItem.product_id, OrderItem.quantity, OrderItem.price).filter_by(order_id=order_id).all()
+        record_sales(order.created_at, old_status, lines, sign=-1)
+        record_sales(order.created_at, status, lines)
+        job_queue.enqueue('order.status_changed', {'order_id': order_id, 'status': status},
+                          idempotency_key=f'order-status:{order_id}:{status}')
         db.session.commit()
         
-        logger.info(f"Admin updated order #{order_id} status from '{old_status}' to '{status}'")
+        logger.info("Admin updated order #%s status from '%s' to '%s'", order_id, old_status, status)
         return jsonify({'success': True, 'message': f'Cập nhật trạng thái thành công: {old_status} → {status}'})
     
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error updating order status: {str(e)}")
+        logger.error("Error updating order status: %s", e)
+        return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
+
+
+@bp.route('/admin/jobs', methods=['GET'])
+def admin_jobs():
+    """Số job theo trạng thái và các job lỗi gần nhất"""
+    is_admin = session.get('is_admin', False)
+    if not is_admin:
+        return jsonify({'success': False, 'message': 'Không có quyền'}), 403
+    
+    failed = Job.query.filter_by(status=jobs.FAILED).order_by(Job.id.desc()).limit(20).all()
+    return jsonify({
+        'success': True,
+        'counts': job_queue.counts(),
+        'failed': [{
+            'id': job.id,
+            'name': job.name,
+            'attempts': job.attempts,
+            'last_error': job.last_error,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        } for job in failed]
+    })
+
+
+@bp.route('/admin/jobs', methods=['POST'])
+def admin_enqueue_job():
+    """Đưa một job quản trị (ADMIN_JOBS) vào hàng đợi; trùng job đang chờ thì bỏ qua"""
+    is_admin = session.get('is_admin', False)
+    if not is_admin:
+        return jsonify({'success': False, 'message': 'Không có quyền'}), 403
+    
+    name = request.form.get('name', '').strip()
+    if name not in ADMIN_JOBS:
+        return jsonify({
+            'success': False,
+            'message': f'Job không hợp lệ. Các job hợp lệ: {", ".join(ADMIN_JOBS)}'
+        }), 400
+    
+    payload = {'fix': True} if name == 'inventory.reconcile' and request.form.get('fix') == '1' else {}
+    # Mỗi job quản trị chỉ chờ một bản trong cùng một phút (bấm nút nhiều lần)
+    key = f"admin:{name}:{datetime.utcnow():%Y%m%d%H%M}"
+    try:
+        job_id = job_queue.enqueue(name, payload, idempotency_key=key)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error enqueuing job: %s", e)
         return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
+    
+    if job_id is None:
+        return jsonify({'success': True, 'message': 'Job này vừa được đưa vào hàng đợi'})
+    logger.info("Admin enqueued job #%s (%s)", job_id, name)
+    return jsonify({'success': True, 'job_id': job_id, 'message': f'Đã đưa {name} vào hàng đợi'})
 
 
-@app.route('/admin/order/<int:order_id>', methods=['GET'])
+@bp.route('/admin/order/<int:order_id>', methods=['GET'])
 def admin_view_order(order_id):
     is_admin = session.get('is_admin', False)
     if not is_admin:
         return jsonify({'success': False, 'message': 'Không có quyền'}), 403
     
     try:
-        order = Order.query.get_or_404(order_id)
+        order = load_order(order_id)
+        if order is None:
+            return jsonify({'success': False, 'message': 'Không tìm thấy đơn hàng'}), 404
         
         items = []
         for order_item in order.items:
@@ -557,51 +2345,181 @@ def admin_view_order(order_id):
             'items': items
         })
     except Exception as e:
-        logger.error(f"Error viewing order: {str(e)}")
+        logger.error("Error viewing order: %s", e)
         return jsonify({'success': False, 'message': f'Có lỗi xảy ra: {str(e)}'}), 500
 
 
 # ==================== UTILS ====================
 
 def init_db():
-    """Khởi tạo cơ sở dữ liệu và thêm dữ liệu mẫu"""
+    """Khởi tạo cơ sở dữ liệu và thêm dữ liệu mẫu (trong app context). Chạy lại nhiều lần vẫn an toàn."""
+    db.create_all(bind_key=None)  # chỉ primary; replica nhận schema qua replication
+    migrations.upgrade(db.engine)
+    if fulltext.ensure_index(db.session):
+        fulltext.rebuild(db.session, db.session.query(Product.id, Product.name, Product.description))
+    
+    # Tạo admin nếu chưa có
+    if not User.query.filter_by(username='admin').first():
+        admin = User(
+            username='admin',
+            email='admin@shop.com',
+            password=hasher.hash('admin123'),
+            is_admin=True
+        )
+        db.session.add(admin)
+    db.session.commit()
+
+
+def warmup(app, templates=True, pool=True):
+    """Làm nóng worker của ứng dụng ``app`` trước request đầu tiên.
+
+    Biên dịch trước mọi template Jinja, cấu hình mapper SQLAlchemy và mở sẵn
+    ``pool_size`` kết nối. Khi chạy gunicorn với ``preload_app``, phần template
+    chạy một lần ở tiến trình master; phần pool phải chạy trong từng worker
+    (sau fork), xem gunicorn.conf.py.
+    """
     with app.app_context():
-        db.create_all()
-        
-        # Tạo admin nếu chưa có
-        if not User.query.filter_by(username='admin').first():
-            admin = User(
-                username='admin',
-                email='admin@shop.com',
-                password=generate_password_hash('admin123'),
-                is_admin=True
-            )
-            db.session.add(admin)
-        db.session.commit()
+        if templates:
+            for name in app.jinja_env.list_templates():
+                app.jinja_env.get_template(name)
+            db.configure_mappers()
+            hasher.warmup()
+        if pool:
+            size = app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('pool_size', 1)
+            connections = [db.engine.connect() for _ in range(size)]
+            for connection in connections:
+                connection.close()
+
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Tạo bảng, áp dụng migration, dựng chỉ mục tìm kiếm và tạo tài khoản admin"""
+    init_db()
+    click.echo('Đã khởi tạo database')
+
+
+@bp.cli.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Mặc định đoán theo đuôi file')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+def import_products_command(path, fmt, batch_size):
+    """Nhập sản phẩm từ file CSV hoặc JSON Lines"""
+    fmt = fmt or detect_import_format(path)
+    if fmt is None:
+        raise click.UsageError('Không đoán được định dạng, dùng --format csv|jsonl')
+    with open(path, 'rb') as f:
+        report = import_products(f, fmt, batch_size=batch_size)
+    for error in report['errors']:
+        click.echo(f"dòng {error['line']}: {', '.join(error['errors'])}", err=True)
+    click.echo(f"Đã nhập {report['imported']} sản phẩm, {report['failed']} dòng lỗi")
+
+
+@bp.cli.command('reconcile-inventory')
+@click.option('--fix', is_flag=True, help='Ghi dòng điều chỉnh vào sổ kho và tính lại bộ đếm')
+def reconcile_inventory_command(fix):
+    """Đối chiếu tồn kho và bộ đếm nhập/xuất của sản phẩm với sổ kho"""
+    mismatches = reconcile_inventory(fix=fix)
+    for row in mismatches:
+        click.echo(f"#{row['id']} {row['name']}: tồn {row['quantity']}, nhập {row['units_in']}/{row['ledger_in']}, "
+                   f"xuất {row['units_out']}/{row['ledger_out']}, lệch {row['drift']}", err=True)
+    if not mismatches:
+        click.echo('Tồn kho khớp với sổ kho')
+    elif fix:
+        click.echo(f'Đã điều chỉnh {len(mismatches)} sản phẩm')
+    else:
+        raise click.ClickException(f'{len(mismatches)} sản phẩm lệch với sổ kho, chạy lại với --fix để điều chỉnh')
+
+
+@bp.cli.command('rebuild-sales-rollups')
+def rebuild_sales_rollups_command():
+    """Tính lại bảng SalesRollup từ toàn bộ đơn hàng hiện có"""
+    rows = rebuild_sales_rollups()
+    click.echo(f'Đã tính lại {rows} dòng doanh số')
+
+
+@bp.cli.command('generate-thumbnails')
+def generate_thumbnails_command():
+    """Sinh thumbnail còn thiếu (ví dụ web service khởi động lại khi đang sinh); chạy trên service giữ UPLOAD_DIR"""
+    rows = db.session.query(Product.id, Product.image_key).filter(
+        Product.image_key.isnot(None), Product.image_widths.is_(None)
+    ).all()
+    app = current_app._get_current_object()
+    done = sum(generate_product_image_variants(app, product_id, key) for product_id, key in rows)
+    click.echo(f'Đã sinh thumbnail cho {done}/{len(rows)} sản phẩm')
+
+
+@bp.cli.command('worker')
+@click.option('--processes', default=1, show_default=True, help='Số tiến trình worker')
+@click.option('--threads', default=4, show_default=True, help='Số job chạy song song trong mỗi tiến trình')
+@click.option('--poll', 'poll_interval', default=1.0, show_default=True, help='Số giây chờ khi hàng đợi trống')
+@click.option('--burst', is_flag=True, help='Chạy hết các job đang đến hạn rồi thoát')
+def worker_command(processes, threads, poll_interval, burst):
+    """Xử lý hàng đợi việc nền (email đơn hàng, job quản trị)"""
+    processed = jobs.run_workers(job_queue, current_app._get_current_object(), processes=processes, threads=threads,
+                                 poll_interval=poll_interval, burst=burst)
+    if processed is not None:
+        click.echo(f'Đã xử lý {processed} job, hàng đợi: {job_queue.counts()}')
+
+
+@bp.cli.command('enqueue')
+@click.argument('name')
+@click.option('--payload', default='{}', show_default=True, help='Tham số của job dạng JSON')
+@click.option('--key', help='Idempotency key: bỏ qua nếu đã có job cùng khóa')
+def enqueue_command(name, payload, key):
+    """Đưa một job vào hàng đợi, ví dụ: flask enqueue sales.rebuild_rollups"""
+    if name not in job_queue.handlers:
+        raise click.UsageError(f"Job không hợp lệ. Các job: {', '.join(sorted(job_queue.handlers))}")
+    job_id = job_queue.enqueue(name, json.loads(payload), idempotency_key=key)
+    db.session.commit()
+    click.echo(f'Đã đưa job #{job_id} vào hàng đợi' if job_id else 'Đã có job cùng idempotency key')
+
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    """Rút gọn, gắn hash và nén sẵn CSS/JS vào static/dist"""
+    manifest = assets.build(current_app.static_folder)
+    static_assets.reload()
+    for name, hashed in manifest.items():
+        click.echo(f'{name} -> {hashed}')
+    if assets.brotli is None:
+        click.echo('Chưa cài brotli: chỉ sinh biến thể .gz')
+
+
+@bp.cli.command('migrate')
+@click.option('--status', 'show_status', is_flag=True, help='Chỉ hiển thị trạng thái migration')
+def migrate_command(show_status):
+    """Áp dụng các migration schema còn thiếu"""
+    if show_status:
+        for version, description, applied in migrations.status(db.engine):
+            click.echo(f"{'[x]' if applied else '[ ]'} {version:04d} {description}")
+        return
+    
+    # Như init_db(): bảng mới (inventory_movement, sales_rollup, job...) do create_all() tạo,
+    # migration chỉ thêm cột / chỉ mục và backfill dữ liệu cho bảng đã có
+    db.create_all(bind_key=None)
+    applied = migrations.upgrade(db.engine)
+    click.echo(f"Đã áp dụng {len(applied)} migration" + (f": {applied}" if applied else ''))
 
 
 # ==================== ERROR HANDLERS ====================
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def page_not_found(e):
-    logger.warning(f"404 Not Found: {request.path}")
+    logger.warning("404 Not Found: %s", request.path)
     return render_template('404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(e):
-    logger.error(f"500 Internal Error: {str(e)}")
+    logger.error("500 Internal Error: %s", e)
     db.session.rollback()
     return render_template('500.html'), 500
 
 
-@app.before_request
-def before_request():
-    logger.info(f"Request: {request.method} {request.path}")
-
-
 if __name__ == '__main__':
-    init_db()
+    app = create_app()
+    with app.app_context():
+        init_db()
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
     app.run(debug=debug, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""Pipeline static asset: rút gọn, gắn hash nội dung và nén sẵn gzip / brotli.
+
+``flask build-assets`` đọc các file nguồn trong ``static/`` (``ASSETS``), ghi
+bản đã rút gọn thành ``static/dist/<tên>.<hash>.<đuôi>`` kèm ``.gz`` và ``.br``
+(nếu cài gói ``brotli``), và ghi ``static/dist/manifest.json`` ánh xạ tên gốc
+sang tên có hash.
+
+Khi đã có manifest, ``url_for('static', filename='css/admin.css')`` tự trả về
+URL có hash, và các file đó được phục vụ với ``Cache-Control: immutable`` và
+biến thể nén phù hợp với ``Accept-Encoding``. Chưa build thì mọi thứ vẫn chạy
+bằng file nguồn như cũ.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # tùy chọn: không có thì chỉ sinh biến thể gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ASSETS = ['style.css', 'css/layout.css', 'css/admin.css', 'js/admin.js']
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Thứ tự ưu tiên khi client chấp nhận nhiều encoding
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+# ==================== MINIFY ====================
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCT = re.compile(r'\s*([{};,>])\s*')
+# Giữ khoảng trắng trước ":" vì "a :hover" khác "a:hover"
+_CSS_COLON = re.compile(r':\s+')
+
+
+def minify_css(source):
+    css = _CSS_COMMENT.sub('', source)
+    css = _CSS_SPACE.sub(' ', css)
+    css = _CSS_PUNCT.sub(r'\1', css)
+    css = _CSS_COLON.sub(':', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    """Rút gọn an toàn: bỏ comment và khoảng trắng đầu/cuối dòng, giữ nguyên xuống dòng.
+
+    Không đổi tên biến hay nối dòng nên không phụ thuộc vào việc tự chèn dấu
+    chấm phẩy của JavaScript; chuỗi và template literal được giữ nguyên.
+    """
+    out = []
+    i, n = 0, len(source)
+    quote = None
+    while i < n:
+        c = source[i]
+        if quote:
+            out.append(c)
+            if c == '\\' and i + 1 < n:
+                out.append(source[i + 1])
+                i += 2
+                continue
+            if c == quote:
+                quote = None
+            i += 1
+            continue
+        if c in '\'"`':
+            quote = c
+        elif source.startswith('//', i):
+            while i < n and source[i] != '\n':
+                i += 1
+            continue
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        out.append(c)
+        i += 1
+
+    # Gộp khoảng trắng chỉ trên những dòng không nằm trong template literal
+    lines = []
+    in_template = False
+    for line in ''.join(out).split('\n'):
+        text = line if in_template else line.strip()
+        if text or in_template:
+            lines.append(text)
+        if _unescaped_backticks(line) % 2:
+            in_template = not in_template
+    return '\n'.join(lines)
+
+
+def _unescaped_backticks(line):
+    return len(re.findall(r'(?<!\\)`', line))
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+# ==================== BUILD ====================
+
+def build(static_folder, sources=ASSETS):
+    """Build mọi asset, trả về manifest {tên gốc: đường dẫn có hash trong static/}"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name in sources:
+        with open(os.path.join(static_folder, name), encoding='utf-8') as f:
+            source = f.read()
+        stem, ext = os.path.splitext(name)
+        data = MINIFIERS.get(ext, lambda s: s)(source).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:10]
+        hashed = f'{DIST_DIR}/{stem.replace("/", "-")}.{digest}{ext}'
+        path = os.path.join(static_folder, hashed)
+
+        _write(path, data)
+        # mtime=0 để file .gz giống hệt nhau giữa các lần build
+        _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(path + '.br', brotli.compress(data, quality=11))
+        manifest[name] = hashed
+        logger.info('Built %s -> %s (%d -> %d bytes)', name, hashed, len(source.encode('utf-8')), len(data))
+
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def _write(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# ==================== SERVE ====================
+
+class Assets:
+    """Gắn manifest vào ``url_for('static', ...)`` và phục vụ file có hash"""
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.hashed = set()
+        self.version = ''
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        self.reload()
+        app.url_defaults(self._url_defaults)
+        app.view_functions['static'] = self.send_static_file
+        app.extensions['assets'] = self
+
+    def reload(self):
+        self.manifest = load_manifest(self.static_folder)
+        self.hashed = set(self.manifest.values())
+        # Đổi khi asset đổi, dùng trong ETag của các trang HTML tham chiếu tới chúng
+        self.version = hashlib.sha1(json.dumps(self.manifest, sort_keys=True).encode()).hexdigest()[:12]
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.manifest:
+            values['filename'] = self.manifest[values['filename']]
+
+    def send_static_file(self, filename):
+        if filename not in self.hashed:
+            return send_from_directory(self.static_folder, filename)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for name, suffix in ENCODINGS:
+            if name in request.accept_encodings and os.path.exists(os.path.join(self.static_folder, filename + suffix)):
+                encoding, filename = name, filename + suffix
+                break
+
+        response = send_from_directory(self.static_folder, filename, mimetype=mimetype, max_age=31536000)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+        return response
@@ -0,0 +1,97 @@
+"""Đo nhập sản phẩm hàng loạt và xuất CSV đơn hàng.
+
+    python benchmarks/bulk_bench.py --products 100000 --orders 200000
+
+Nhập: so sánh ``import_products`` (INSERT theo lô) với cách thêm từng sản phẩm
+một transaction như ``admin_add_product``. Xuất: stream ``/admin/export-orders``
+qua test client và đo đỉnh bộ nhớ Python (tracemalloc) để thấy bộ nhớ không
+tăng theo số dòng.
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datagen import BRANDS, KINDS, WORDS, add_database_arguments, select_database  # noqa: E402
+
+
+def write_csv(path, count, seed):
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'description', 'price', 'quantity', 'image_url'])
+        for i in range(count):
+            writer.writerow([f'{rng.choice(KINDS)} {rng.choice(BRANDS)} nhập {i}', ', '.join(rng.sample(WORDS, 3)),
+                             rng.randint(10, 5000) * 10000, rng.randint(0, 500), ''])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000, help='số dòng của file nhập')
+    parser.add_argument('--baseline-rows', type=int, default=2000, help='số dòng thêm từng cái một để so sánh')
+    parser.add_argument('--orders', type=int, default=200000, help='số đơn hàng sinh ra để xuất')
+    parser.add_argument('--seed', type=int, default=7)
+    add_database_arguments(parser, sqlite_file=False)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    # generate() xóa dữ liệu cũ: mặc định file SQLite tạm, không bao giờ dùng DATABASE_URL có sẵn
+    select_database(args, wipe=True, scratch_name='bulk.db')
+    import logging
+    logging.disable(logging.INFO)
+
+    from app import create_app, db, import_products, Product
+    from datagen import generate
+    import search as fulltext
+
+    path = os.path.join(workdir, 'products.csv')
+    write_csv(path, args.products, args.seed)
+
+    app = create_app()
+    with app.app_context():
+        generate(products=1000, users=200, orders=args.orders, seed=args.seed, log=lambda *a: None)
+
+        start = time.perf_counter()
+        with open(path, 'rb') as f:
+            report = import_products(f, 'csv')
+        elapsed = time.perf_counter() - start
+        print(f"import_products  : {report['imported']} dòng trong {elapsed:.2f}s "
+              f"({report['imported'] / elapsed:,.0f} dòng/s), {report['failed']} lỗi")
+
+        start = time.perf_counter()
+        for i in range(args.baseline_rows):
+            product = Product(name=f'Từng dòng {i}', description='x', price=1.0, quantity=1,
+                              image_url='/static/default.jpg')
+            db.session.add(product)
+            db.session.flush()
+            fulltext.index_product(db.session, product.id, product.name, product.description)
+            db.session.commit()
+        elapsed = time.perf_counter() - start
+        print(f'từng dòng        : {args.baseline_rows} dòng trong {elapsed:.2f}s '
+              f'({args.baseline_rows / elapsed:,.0f} dòng/s)')
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get('/admin/export-orders', buffered=False)
+    lines = size = 0
+    for chunk in response.response:
+        size += len(chunk)
+        lines += chunk.count(b'\n') if isinstance(chunk, bytes) else chunk.count('\n')
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'export-orders    : {lines - 1:,} dòng, {size / 1e6:.1f} MB trong {elapsed:.2f}s, '
+          f'đỉnh bộ nhớ Python {peak / 1e6:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
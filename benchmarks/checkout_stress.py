@@ -0,0 +1,118 @@
+"""Stress test checkout đồng thời: chứng minh không bán vượt tồn kho và đo checkouts/giây.
+
+Chạy trên SQLite (mặc định, file tạm) hoặc PostgreSQL cục bộ. Script xóa và tạo
+lại mọi bảng, nên database chỉ định từ ngoài cần ``--yes-wipe``:
+
+    python benchmarks/checkout_stress.py --threads 8 --buyers 200 --stock 50
+    python benchmarks/checkout_stress.py --database-url postgresql://localhost/techstore_bench --yes-wipe
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datagen import add_database_arguments, select_database  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--buyers', type=int, default=200, help='số lượt checkout')
+    parser.add_argument('--stock', type=int, default=50, help='tồn kho ban đầu của mỗi sản phẩm')
+    parser.add_argument('--products', type=int, default=2)
+    parser.add_argument('--per-line', type=int, default=1, help='số lượng mỗi dòng giỏ hàng')
+    add_database_arguments(parser, sqlite_file=False)
+    args = parser.parse_args()
+
+    # drop_all() bên dưới: mặc định file SQLite tạm, không bao giờ dùng DATABASE_URL có sẵn
+    select_database(args, wipe=True, scratch_name='stress.db')
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from app import (create_app, db, Product, Order, OrderItem, User, CartItem, OutOfStockError, load_cart, place_order,
+                     InventoryMovement, reconcile_inventory)
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        products = [Product(name=f'Stress {i}', price=100.0, quantity=args.stock, units_in=args.stock)
+                    for i in range(args.products)]
+        users = [User(username=f'buyer{i}', email=f'buyer{i}@bench.local', password='x') for i in range(args.buyers)]
+        db.session.add_all(products + users)
+        db.session.commit()
+        product_ids = [p.id for p in products]
+        db.session.add_all([InventoryMovement(product_id=pid, delta=args.stock, reason='opening') for pid in product_ids])
+        db.session.add_all([
+            CartItem(user_id=u.id, product_id=pid, quantity=args.per_line)
+            for u in users for pid in product_ids
+        ])
+        db.session.commit()
+        user_ids = [u.id for u in users]
+
+    counters = {'ok': 0, 'out_of_stock': 0, 'error': 0}
+    lock = threading.Lock()
+    queue = list(user_ids)
+
+    def worker():
+        while True:
+            with lock:
+                if not queue:
+                    return
+                user_id = queue.pop()
+            with app.app_context():
+                try:
+                    place_order(user_id, load_cart(user_id))
+                    outcome = 'ok'
+                except OutOfStockError:
+                    outcome = 'out_of_stock'
+                except Exception as e:
+                    print(f'lỗi: {e}', file=sys.stderr)
+                    outcome = 'error'
+                finally:
+                    db.session.remove()
+            with lock:
+                counters[outcome] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        stock = dict(db.session.query(Product.id, Product.quantity))
+        sold = dict(db.session.query(OrderItem.product_id, db.func.sum(OrderItem.quantity))
+                    .group_by(OrderItem.product_id))
+        order_count = Order.query.count()
+        drift = reconcile_inventory()
+
+    print(f"database       : {os.environ['DATABASE_URL'].split('@')[-1]}")
+    print(f"threads        : {args.threads}")
+    print(f"checkouts      : {counters['ok']} ok, {counters['out_of_stock']} hết hàng, {counters['error']} lỗi")
+    print(f"thời gian      : {elapsed:.3f}s ({args.buyers / elapsed:.1f} checkouts/s)")
+
+    oversold = False
+    for pid in product_ids:
+        sold_qty = int(sold.get(pid, 0))
+        print(f"sản phẩm #{pid}   : còn {stock[pid]}, đã bán {sold_qty} / {args.stock}")
+        if stock[pid] < 0 or stock[pid] + sold_qty != args.stock:
+            oversold = True
+    if drift:
+        print(f'sổ kho lệch  : {drift}')
+    if order_count != counters['ok'] or oversold or drift:
+        print('THẤT BẠI: tồn kho không khớp với đơn hàng')
+        return 1
+    print('OK: không bán vượt tồn kho')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
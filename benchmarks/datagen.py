@@ -0,0 +1,208 @@
+"""Sinh dữ liệu mẫu có thể tái lập cho benchmark.
+
+    python benchmarks/datagen.py --db /tmp/bench.db --yes-wipe --products 50000 --users 10000 --orders 500000
+    python benchmarks/datagen.py --database-url postgresql://localhost/techstore_bench --yes-wipe --preset small
+
+Database đích phải được chỉ định rõ (``--db`` hoặc ``--database-url``);
+``DATABASE_URL`` trong môi trường không bao giờ được dùng ngầm. Xóa dữ liệu cũ
+(mặc định, trừ khi ``--append``) cần thêm ``--yes-wipe``.
+
+Mọi người dùng sinh ra có mật khẩu ``bench123`` (username ``bench<N>``); admin
+mặc định vẫn là ``admin`` / ``admin123``. Cùng ``--seed`` luôn cho cùng dữ liệu.
+"""
+import argparse
+from datetime import datetime, timedelta
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BENCH_PASSWORD = 'bench123'
+
+BRANDS = ['Samsung', 'Apple', 'Xiaomi', 'Oppo', 'Dell', 'Asus', 'Lenovo', 'Sony', 'LG', 'Vivo']
+KINDS = ['Điện thoại', 'Máy tính bảng', 'Laptop', 'Tai nghe', 'Đồng hồ thông minh',
+         'Loa bluetooth', 'Màn hình', 'Bàn phím cơ', 'Chuột không dây', 'Sạc dự phòng']
+WORDS = ['chính hãng', 'bảo hành 12 tháng', 'pin trâu', 'màn hình đẹp', 'siêu mỏng', 'chống nước',
+         'sạc nhanh', 'âm thanh sống động', 'hiệu năng cao', 'giá rẻ', 'màu đen', 'màu trắng']
+STATUSES = ['pending', 'paid', 'shipped', 'delivered']
+
+PRESETS = {
+    'small': {'products': 2000, 'users': 500, 'orders': 10000},
+    'medium': {'products': 10000, 'users': 2000, 'orders': 100000},
+    'large': {'products': 50000, 'users': 10000, 'orders': 500000},
+}
+
+
+def add_database_arguments(parser, sqlite_file=True):
+    """Tham số chọn database dùng chung cho các script benchmark (xem ``select_database()``)"""
+    if sqlite_file:
+        parser.add_argument('--db', help='file SQLite của benchmark')
+    parser.add_argument('--database-url', help='URL database của benchmark (vd. postgresql://localhost/techstore_bench)')
+    parser.add_argument('--yes-wipe', action='store_true', help='xác nhận cho phép xóa dữ liệu của database này')
+
+
+def select_database(args, wipe, scratch_name=None):
+    """Đặt ``DATABASE_URL`` cho script benchmark, phải gọi trước khi import app.
+
+    Database chỉ được chọn bằng ``--db`` / ``--database-url``; không có thì dùng
+    file SQLite tạm ``scratch_name`` (hoặc dừng nếu script cần database có sẵn
+    dữ liệu). Script sẽ xóa dữ liệu (``wipe``) trên database được chỉ định thì
+    phải có ``--yes-wipe``. ``DATABASE_URL`` sẵn có (có thể là database thật) bị bỏ qua.
+    """
+    url = args.database_url
+    if getattr(args, 'db', None):
+        url = 'sqlite:///' + os.path.abspath(args.db)
+    if url is None:
+        if scratch_name is None:
+            sys.exit('Hãy chỉ định database benchmark bằng --db hoặc --database-url')
+        url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), scratch_name)
+    elif wipe and not args.yes_wipe:
+        sys.exit(f"Mọi dữ liệu trong {url.split('@')[-1]} sẽ bị xóa; "
+                 'thêm --yes-wipe nếu đây đúng là database dành cho benchmark')
+    os.environ['DATABASE_URL'] = url
+    return url
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(products=50000, users=10000, orders=500000, max_items=4, days=365,
+             seed=42, batch_size=5000, reset=True, log=print):
+    """Sinh dữ liệu vào database của ứng dụng. Phải gọi bên trong app context."""
+    from werkzeug.security import generate_password_hash
+
+    from app import db, init_db, Product, User, Order, OrderItem, CartItem, InventoryMovement, SalesRollup, Job
+    import migrations
+    import search as fulltext
+
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = time.perf_counter()
+
+    init_db()
+    if reset:
+        for model in (Job, CartItem, InventoryMovement, SalesRollup, OrderItem, Order, Product, User):
+            db.session.execute(db.delete(model))
+        db.session.commit()
+        init_db()
+
+    def product_rows():
+        for i in range(products):
+            yield {
+                'name': f'{rng.choice(KINDS)} {rng.choice(BRANDS)} {i + 1}',
+                'description': ', '.join(rng.sample(WORDS, 3)).capitalize(),
+                'price': float(rng.randint(10, 5000) * 10000),
+                'quantity': rng.randint(1000, 100000),
+                'image_url': '/static/default.jpg',
+                'created_at': now - timedelta(days=days, seconds=-i * 60),
+                'updated_at': now - timedelta(days=days, seconds=-i * 60),
+            }
+
+    for batch in _batched(product_rows(), batch_size):
+        db.session.execute(db.insert(Product), batch)
+    db.session.commit()
+    log(f'products: {products}')
+
+    password = generate_password_hash(BENCH_PASSWORD)
+
+    def user_rows():
+        for i in range(users):
+            yield {
+                'username': f'bench{i}',
+                'email': f'bench{i}@bench.local',
+                'password': password,
+                'is_admin': False,
+                'created_at': now - timedelta(days=rng.randint(0, days)),
+            }
+
+    for batch in _batched(user_rows(), batch_size):
+        db.session.execute(db.insert(User), batch)
+    db.session.commit()
+    log(f'users: {users}')
+
+    user_ids = [row[0] for row in db.session.query(User.id).filter(User.username.like('bench%'))]
+    products_by_id = dict(db.session.query(Product.id, Product.price))
+    product_ids = list(products_by_id)
+
+    item_count = 0
+    for first in range(0, orders, batch_size):
+        order_batch = []
+        lines = []
+        for _ in range(min(batch_size, orders - first)):
+            total = 0.0
+            items = []
+            for product_id in rng.sample(product_ids, rng.randint(1, max_items)):
+                quantity = rng.randint(1, 3)
+                price = products_by_id[product_id]
+                total += price * quantity
+                items.append({'product_id': product_id, 'quantity': quantity, 'price': price})
+            lines.append(items)
+            order_batch.append({
+                'user_id': rng.choice(user_ids),
+                'total_price': total,
+                'status': rng.choice(STATUSES),
+                'created_at': now - timedelta(seconds=rng.randint(0, days * 86400)),
+            })
+        # id do database cấp (sequence của PostgreSQL vẫn đúng cho các đơn hàng thật sau đó),
+        # RETURNING trả về theo đúng thứ tự các dòng để gắn order_id cho từng dòng hàng
+        order_ids = db.session.execute(
+            db.insert(Order).returning(Order.id, sort_by_parameter_order=True), order_batch
+        ).scalars().all()
+        item_batch = [dict(item, order_id=order_id) for order_id, items in zip(order_ids, lines) for item in items]
+        db.session.execute(db.insert(OrderItem), item_batch)
+        db.session.commit()
+        item_count += len(item_batch)
+    log(f'orders: {orders} ({item_count} items)')
+
+    # Tồn đầu kỳ + mỗi dòng đơn hàng là một lần xuất kho (để `flask reconcile-inventory` khớp), và doanh số theo ngày
+    if reset:
+        migrations.backfill_inventory_ledger(db.session.connection())
+        migrations.backfill_sales_rollups(db.session.connection())
+        db.session.commit()
+        log('inventory ledger and sales rollups rebuilt')
+
+    fulltext.rebuild(db.session, db.session.query(Product.id, Product.name, Product.description))
+    db.session.commit()
+    log(f'search index rebuilt, total {time.perf_counter() - start:.1f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--preset', choices=sorted(PRESETS))
+    parser.add_argument('--products', type=int, default=PRESETS['large']['products'])
+    parser.add_argument('--users', type=int, default=PRESETS['large']['users'])
+    parser.add_argument('--orders', type=int, default=PRESETS['large']['orders'])
+    parser.add_argument('--max-items', type=int, default=4, help='số dòng tối đa mỗi đơn hàng')
+    parser.add_argument('--days', type=int, default=365, help='rải dữ liệu trong bao nhiêu ngày gần nhất')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--append', action='store_true', help='không xóa dữ liệu cũ')
+    add_database_arguments(parser)
+    args = parser.parse_args()
+    select_database(args, wipe=not args.append)
+
+    sizes = PRESETS[args.preset] if args.preset else {
+        'products': args.products, 'users': args.users, 'orders': args.orders
+    }
+
+    import logging
+    logging.disable(logging.INFO)
+    from app import create_app
+
+    with create_app().app_context():
+        generate(max_items=args.max_items, days=args.days, seed=args.seed, reset=not args.append, **sizes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+"""Benchmark các luồng chính của cửa hàng và ghi kết quả ra JSON để so sánh giữa các commit.
+
+    # Sinh dữ liệu rồi chạy trên Flask test client (trong tiến trình)
+    python benchmarks/harness.py --db /tmp/bench.db --generate small --yes-wipe --out bench-before.json
+
+    # Chạy trên một tiến trình gunicorn thật (2 worker x 2 thread như Dockerfile)
+    python benchmarks/harness.py --db /tmp/bench.db --gunicorn --out bench-after.json
+
+    # So sánh hai lần chạy
+    python benchmarks/harness.py --compare bench-before.json bench-after.json
+
+Kết quả gồm p50/p95/p99 độ trễ, throughput và số câu SQL mỗi request (đọc từ
+header ``Server-Timing`` nên hoạt động cả với gunicorn).
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datagen import BENCH_PASSWORD, PRESETS, add_database_arguments, select_database  # noqa: E402
+
+FLOWS = ['browse', 'product_detail', 'add_to_cart', 'checkout', 'orders', 'admin']
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+# ==================== CLIENTS ====================
+
+class TestClientSession:
+    """Phiên người dùng chạy trong tiến trình qua Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.get_data()
+        return response.status_code, response.headers.get('Server-Timing', '')
+
+
+class HttpSession:
+    """Phiên người dùng gửi HTTP thật tới gunicorn, tự giữ cookie session"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.cookies = {}
+        self.conn = None
+
+    def _conn(self):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        return self.conn
+
+    def request(self, method, path, data=None):
+        body = urlencode(data) if data else None
+        headers = {'Cookie': '; '.join(f'{k}={v}' for k, v in self.cookies.items())}
+        if body:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        conn = self._conn()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self.conn = None
+            raise
+        response.read()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            name, _, rest = header.partition('=')
+            self.cookies[name.strip()] = rest.split(';', 1)[0]
+        return response.status, response.headers.get('Server-Timing', '')
+
+
+# ==================== FLOWS ====================
+
+class Scenario:
+    def __init__(self, new_session, product_ids, usernames, pages, seed):
+        self.new_session = new_session
+        self.product_ids = product_ids
+        self.usernames = usernames
+        self.pages = pages
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def _choice(self, seq):
+        with self.lock:
+            return self.rng.choice(seq)
+
+    def _randint(self, a, b):
+        with self.lock:
+            return self.rng.randint(a, b)
+
+    def user_session(self):
+        """Mỗi thread đăng nhập một người dùng riêng một lần"""
+        if getattr(self.local, 'user', None) is None:
+            session = self.new_session()
+            session.request('POST', '/login', {'username': self._choice(self.usernames), 'password': BENCH_PASSWORD})
+            self.local.user = session
+        return self.local.user
+
+    def admin_session(self):
+        if getattr(self.local, 'admin', None) is None:
+            session = self.new_session()
+            session.request('POST', '/login', {'username': 'admin', 'password': 'admin123'})
+            self.local.admin = session
+        return self.local.admin
+
+    def anonymous_session(self):
+        if getattr(self.local, 'anonymous', None) is None:
+            self.local.anonymous = self.new_session()
+        return self.local.anonymous
+
+    def prepare(self, flow):
+        """Phần chuẩn bị không được tính giờ; trả về hàm thực hiện request được đo"""
+        if flow == 'browse':
+            page = self._randint(1, self.pages)
+            session = self.anonymous_session()
+            return lambda: session.request('GET', f'/?page={page}')
+        if flow == 'product_detail':
+            product_id = self._choice(self.product_ids)
+            session = self.anonymous_session()
+            return lambda: session.request('GET', f'/product/{product_id}')
+        if flow == 'add_to_cart':
+            product_id = self._choice(self.product_ids)
+            session = self.user_session()
+            return lambda: session.request('POST', f'/add-to-cart/{product_id}', {'quantity': 1})
+        if flow == 'checkout':
+            session = self.user_session()
+            for _ in range(self._randint(1, 3)):
+                session.request('POST', f'/add-to-cart/{self._choice(self.product_ids)}', {'quantity': 1})
+            return lambda: session.request('POST', '/checkout', {'address': 'bench', 'phone': '0900000000'})
+        if flow == 'orders':
+            session = self.user_session()
+            return lambda: session.request('GET', '/orders')
+        if flow == 'admin':
+            session = self.admin_session()
+            return lambda: session.request('GET', '/admin')
+        raise ValueError(flow)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def run_flow(scenario, flow, requests, concurrency):
+    latencies = []
+    queries = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        action = scenario.prepare(flow)
+        start = time.perf_counter()
+        try:
+            status, timing = action()
+        except Exception:
+            status, timing = 599, ''
+        elapsed = (time.perf_counter() - start) * 1000
+        match = QUERIES_RE.search(timing)
+        with lock:
+            latencies.append(elapsed)
+            if match:
+                queries.append(int(match.group(1)))
+            if status >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(requests / wall, 2),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+    }
+
+
+# ==================== GUNICORN ====================
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(env, workers, threads):
+    port = _free_port()
+    process = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers), '--threads', str(threads), '--worker-class', 'gthread',
+        '--log-level', 'warning', 'wsgi:app'
+    ], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not become ready')
+
+
+# ==================== REPORT ====================
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report):
+    print(f"commit {report['commit']}  mode {report['mode']}  concurrency {report['concurrency']}")
+    print(f"{'flow':<16}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'errors':>8}")
+    for flow, r in report['flows'].items():
+        q = '-' if r['queries_per_request'] is None else r['queries_per_request']
+        print(f"{flow:<16}{r['throughput_rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{q:>9}{r['errors']:>8}")
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'flow':<16}{'p50':>18}{'p95':>18}{'req/s':>18}{'queries':>14}")
+    for flow in new['flows']:
+        if flow not in old['flows']:
+            continue
+        a, b = old['flows'][flow], new['flows'][flow]
+
+        def delta(key):
+            before, after = a[key], b[key]
+            if not before:
+                return f'{after}'
+            return f'{after} ({(after - before) / before * 100:+.0f}%)'
+
+        print(f"{flow:<16}{delta('p50_ms'):>18}{delta('p95_ms'):>18}{delta('throughput_rps'):>18}"
+              f"{str(a['queries_per_request']) + '->' + str(b['queries_per_request']):>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_database_arguments(parser)
+    parser.add_argument('--generate', choices=sorted(PRESETS), help='xóa và sinh lại dữ liệu trước khi chạy (cần --yes-wipe)')
+    parser.add_argument('--flows', default=','.join(FLOWS))
+    parser.add_argument('--requests', type=int, default=200, help='số request mỗi luồng')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--gunicorn', action='store_true', help='chạy trên tiến trình gunicorn thật')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', default='bench_output.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    select_database(args, wipe=bool(args.generate))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from app import create_app, db, Product, User
+    from datagen import generate
+
+    app = create_app()
+    with app.app_context():
+        if args.generate:
+            generate(**PRESETS[args.generate])
+        product_ids = [row[0] for row in db.session.query(Product.id)]
+        usernames = [row[0] for row in db.session.query(User.username).filter(User.username.like('bench%'))]
+    if not product_ids or not usernames:
+        sys.exit('Database chưa có dữ liệu benchmark, hãy chạy với --generate')
+    pages = max(1, len(product_ids) // 12)
+
+    process = None
+    if args.gunicorn:
+        process, port = start_gunicorn(dict(os.environ), args.workers, args.threads)
+        new_session = lambda: HttpSession('127.0.0.1', port)  # noqa: E731
+    else:
+        new_session = lambda: TestClientSession(app)  # noqa: E731
+
+    try:
+        report = {
+            'commit': git_revision(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'mode': 'gunicorn' if args.gunicorn else 'test_client',
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1],
+            'concurrency': args.concurrency,
+            'dataset': {'products': len(product_ids), 'users': len(usernames)},
+            'flows': {},
+        }
+        for flow in args.flows.split(','):
+            scenario = Scenario(new_session, product_ids, usernames, pages, args.seed)
+            report['flows'][flow] = run_flow(scenario, flow, args.requests, args.concurrency)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f'-> {args.out}')
+
+
+if __name__ == '__main__':
+    main()
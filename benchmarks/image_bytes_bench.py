@@ -0,0 +1,159 @@
+"""Đo số byte tải về cho một trang danh mục: ảnh gốc so với thumbnail theo srcset.
+
+    python benchmarks/image_bytes_bench.py --width 2400 --height 1800
+
+Tạo một trang sản phẩm (12 thẻ) với ảnh giả lập kích thước máy ảnh, tải lên qua
+``attach_uploaded_image`` (bản gốc được ghi khi commit, thumbnail sinh nền; script chờ
+cho xong) rồi đo trang ``/`` qua test client:
+
+- ``trước``: bỏ danh sách thumbnail, thẻ dùng ảnh gốc (như khi ``image_url`` trỏ tới ảnh đầy đủ).
+- ``sau``: mỗi ảnh được chọn từ ``srcset`` như trình duyệt: biến thể nhỏ nhất rộng
+  ít nhất (độ rộng ô theo ``sizes``) x DPR, WebP nếu trình duyệt hỗ trợ, ngược lại JPEG.
+
+Script xóa và tạo lại mọi bảng: mặc định chạy trên file SQLite tạm, database chỉ
+định bằng ``--database-url`` cần thêm ``--yes-wipe``.
+"""
+import argparse
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datagen import add_database_arguments, select_database  # noqa: E402
+
+_PICTURE = re.compile(r'<picture.*?</picture>|<img [^>]*>', re.S)
+_ATTR = re.compile(r'(srcset|src|sizes|type)="([^"]*)"')
+
+
+def photo(width, height, seed):
+    """Ảnh giả lập có gradient, khối màu và nhiễu nhẹ (nén gần giống ảnh chụp hơn nhiễu thuần)"""
+    from PIL import Image, ImageDraw, ImageFilter
+    rng = random.Random(seed)
+    base = Image.linear_gradient('L').resize((width, height))
+    channels = [base, base.rotate(90).resize((width, height)), Image.new('L', (width, height), rng.randint(0, 255))]
+    image = Image.merge('RGB', channels)
+    draw = ImageDraw.Draw(image)
+    for _ in range(30):
+        x, y = rng.randrange(width), rng.randrange(height)
+        r = rng.randint(width // 20, width // 5)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    image = image.filter(ImageFilter.GaussianBlur(3))
+    noise = Image.effect_noise((width, height), 24).convert('RGB')
+    image = Image.blend(image, noise, 0.08)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def slot_width(sizes, viewport):
+    """Độ rộng ô (px CSS) theo thuộc tính ``sizes`` dạng ``(max-width: Npx) Xvw, Ypx``"""
+    for entry in sizes.split(','):
+        entry = entry.strip()
+        match = re.match(r'\(max-width:\s*(\d+)px\)\s*(.+)', entry)
+        if match:
+            if viewport > int(match.group(1)):
+                continue
+            entry = match.group(2)
+        if entry.endswith('vw'):
+            return viewport * float(entry[:-2]) / 100
+        return float(entry.rstrip('px'))
+    return viewport
+
+
+def pick(srcset, needed):
+    candidates = sorted((int(w.rstrip('w')), url) for url, w in (part.split() for part in srcset.split(', ')))
+    return next((url for w, url in candidates if w >= needed), candidates[-1][1])
+
+
+def page_images(html, viewport, dpr, webp):
+    """URL ảnh trình duyệt sẽ tải cho mỗi thẻ sản phẩm"""
+    urls = []
+    for block in _PICTURE.findall(html):
+        if '<picture' not in block:
+            urls.append(dict(_ATTR.findall(block))['src'])
+            continue
+        sources = [dict(_ATTR.findall(tag)) for tag in re.findall(r'<(?:source|img)[^>]*>', block)]
+        chosen = next(s for s in sources if webp or s.get('type') != 'image/webp')
+        urls.append(pick(chosen['srcset'], slot_width(chosen['sizes'], viewport) * dpr))
+    return urls
+
+
+def measure(client, viewport, dpr, webp):
+    html = client.get('/').data
+    images = page_images(html.decode(), viewport, dpr, webp)
+    image_bytes = sum(len(client.get(url).data) for url in images)
+    return len(html), len(images), image_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=2400, help='chiều rộng ảnh gốc')
+    parser.add_argument('--height', type=int, default=1800)
+    parser.add_argument('--viewports', default='1280,390', help='độ rộng màn hình (px CSS)')
+    parser.add_argument('--dprs', default='1,2', help='device pixel ratio')
+    add_database_arguments(parser, sqlite_file=False)
+    args = parser.parse_args()
+
+    # drop_all() bên dưới: mặc định file SQLite tạm, không bao giờ dùng DATABASE_URL có sẵn
+    select_database(args, wipe=True, scratch_name='images.db')
+    os.environ.setdefault('UPLOAD_DIR', os.path.join(tempfile.mkdtemp(), 'uploads'))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from werkzeug.datastructures import FileStorage
+    from app import create_app, db, Product, CATALOG_PER_PAGE, attach_uploaded_image, image_store, \
+        invalidate_products
+
+    photos = [photo(args.width, args.height, i) for i in range(CATALOG_PER_PAGE)]
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        start = time.perf_counter()
+        with app.test_request_context():
+            for i, data in enumerate(photos):
+                product = Product(name=f'Ảnh {i}', description='benchmark', price=1000, quantity=1)
+                db.session.add(product)
+                db.session.flush()
+                attach_uploaded_image(product, FileStorage(io.BytesIO(data), f'{i}.jpg'))
+            db.session.commit()
+        uploaded = time.perf_counter()
+        image_store.wait()
+        generated = time.perf_counter()
+        widths = {p.id: p.image_widths for p in Product.query.all()}
+
+    def set_widths(values):
+        with app.app_context():
+            products = Product.query.all()
+            for product in products:
+                product.image_widths = values.get(product.id)
+            db.session.commit()
+            invalidate_products(*(product.id for product in products), catalog=True)
+
+    client = app.test_client()
+    configs = [(int(v), float(d), webp) for v in args.viewports.split(',') for d in args.dprs.split(',')
+               for webp in (True, False)]
+    set_widths({})
+    before = {config: measure(client, *config) for config in configs}
+    set_widths(widths)
+    after = {config: measure(client, *config) for config in configs}
+
+    print(f'{len(photos)} ảnh {args.width}x{args.height}: tải lên {(uploaded - start) / len(photos) * 1000:.0f} ms/ảnh, '
+          f'thumbnail (nền) {(generated - uploaded) / len(photos) * 1000:.0f} ms/ảnh')
+    print(f"{'viewport':>9}{'dpr':>5}{'format':>8}{'ảnh':>5}{'trước (KB)':>12}{'sau (KB)':>10}{'giảm':>8}")
+    for config in configs:
+        viewport, dpr, webp = config
+        html_before, count, images_before = before[config]
+        html_after, _, images_after = after[config]
+        total_before, total_after = html_before + images_before, html_after + images_after
+        print(f'{viewport:>9}{dpr:>5g}{"webp" if webp else "jpeg":>8}{count:>5}{total_before / 1024:>12.0f}'
+              f'{total_after / 1024:>10.0f}{1 - total_after / total_before:>8.1%}')
+
+
+if __name__ == '__main__':
+    main()
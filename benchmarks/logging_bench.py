@@ -0,0 +1,112 @@
+"""Micro-benchmark chi phí log mỗi request: StreamHandler đồng bộ so với pipeline hàng đợi.
+
+    python benchmarks/logging_bench.py --threads 4 --records 20000 --sample-rate 0.1
+    python benchmarks/logging_bench.py --write-latency-us 50   # stdout chậm (pipe bị nghẽn)
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import logging_setup  # noqa: E402
+
+
+class SlowStream:
+    """File giả lập stdout chậm: mỗi lần write mất thêm một khoảng thời gian"""
+
+    def __init__(self, path, latency):
+        self._file = open(path, 'w')
+        self._latency = latency
+
+    def write(self, data):
+        if self._latency:
+            time.sleep(self._latency)
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def run(threads, records, log_one):
+    """Chạy log_one() song song, trả về micro giây mỗi lần gọi (phía thread gọi)"""
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for i in range(records):
+            log_one(i)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in pool:
+        t.join()
+    return (time.perf_counter() - start) / (threads * records) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--sample-rate', type=float, default=0.1)
+    parser.add_argument('--write-latency-us', type=float, default=0, help='độ trễ giả lập mỗi lần ghi stdout')
+    args = parser.parse_args()
+
+    out_path = os.path.join(tempfile.mkdtemp(), 'bench.log')
+    method, path = 'GET', '/product/42'
+
+    # Trước: basicConfig + f-string đồng bộ trên thread của request
+    reset_root()
+    stream = SlowStream(out_path, args.write_latency_us / 1e6)
+    logging.basicConfig(level=logging.INFO, stream=stream, force=True)
+    before_logger = logging.getLogger('before')
+    before = run(args.threads, args.records,
+                 lambda i: before_logger.info(f"Request: {method} {path}"))
+    stream.close()
+
+    # Sau: QueueHandler + JSON + lấy mẫu dòng log truy cập
+    reset_root()
+    stream = SlowStream(out_path, args.write_latency_us / 1e6)
+    listener = logging_setup.setup_logging(sample_rate=args.sample_rate, stream=stream)
+    after = run(args.threads, args.records, lambda i: logging_setup.log_request(method, path, 200, 1.0))
+    drain_start = time.perf_counter()
+    listener.stop()
+    drain = time.perf_counter() - drain_start
+    stream.close()
+
+    # Log bị tắt: f-string vẫn định dạng, lazy thì không
+    reset_root()
+    logging.getLogger().setLevel(logging.WARNING)
+    quiet = logging.getLogger('quiet')
+    product = {'name': 'Điện thoại', 'id': 42}
+    eager = run(1, args.records * 5, lambda i: quiet.info(f"Admin updated product: {product['name']} (id={product['id']})"))
+    lazy = run(1, args.records * 5, lambda i: quiet.info("Admin updated product: %s (id=%s)", product['name'], product['id']))
+
+    print(f'threads={args.threads} records/thread={args.records} sample_rate={args.sample_rate} '
+          f'write_latency={args.write_latency_us}µs')
+    print(f'đồng bộ (basicConfig, f-string) : {before:8.2f} µs/request')
+    print(f'hàng đợi + JSON + lấy mẫu       : {after:8.2f} µs/request  (listener xả nốt trong {drain * 1000:.0f} ms)')
+    print(f'log tắt, f-string               : {eager:8.2f} µs/lần gọi')
+    print(f'log tắt, lazy %-format          : {lazy:8.2f} µs/lần gọi')
+
+
+if __name__ == '__main__':
+    main()
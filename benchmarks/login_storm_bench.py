@@ -0,0 +1,137 @@
+"""Đo độ trễ của trang sản phẩm trong khi bị dồn dập đăng nhập sai (login storm).
+
+Chạy gunicorn thật với từng cấu hình băm mật khẩu / giới hạn đăng nhập, đo
+trang ``/product/<id>`` khi yên tĩnh và khi có ``--attackers`` thread liên tục
+POST ``/login`` với mật khẩu sai:
+
+    python benchmarks/datagen.py --db /tmp/bench.db --yes-wipe --preset small   # hoặc dùng --generate small
+    python benchmarks/login_storm_bench.py --db /tmp/bench.db --generate small --yes-wipe
+
+Cấu hình ``inline`` là cách làm cũ (băm ngay trong thread của request, không
+giới hạn); ``pool`` chỉ bật pool băm giới hạn; ``pool+throttle`` là mặc định.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datagen import add_database_arguments, select_database  # noqa: E402
+from harness import HttpSession, percentile, start_gunicorn  # noqa: E402
+
+CONFIGS = {
+    'inline': {'PASSWORD_HASH_WORKERS': '0', 'LOGIN_RATE_IP': '0', 'LOGIN_RATE_USER': '0'},
+    'pool': {'PASSWORD_HASH_WORKERS': '1', 'PASSWORD_HASH_QUEUE': '2', 'LOGIN_RATE_IP': '0', 'LOGIN_RATE_USER': '0'},
+    'pool+throttle': {'PASSWORD_HASH_WORKERS': '1', 'PASSWORD_HASH_QUEUE': '2'},
+}
+
+
+def browse(port, product_ids, duration, readers):
+    """Đọc trang sản phẩm trong ``duration`` giây từ ``readers`` thread, trả về danh sách độ trễ (ms)"""
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def reader(seed):
+        rng = random.Random(seed)
+        session = HttpSession('127.0.0.1', port)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            session.request('GET', f'/product/{rng.choice(product_ids)}')
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies
+
+
+def storm(port, usernames, stop, attackers, statuses):
+    def attacker(seed):
+        rng = random.Random(seed)
+        session = HttpSession('127.0.0.1', port)
+        while not stop.is_set():
+            try:
+                status, _ = session.request('POST', '/login', {'username': rng.choice(usernames), 'password': 'wrong'})
+            except OSError:
+                status = 599
+            statuses[status] += 1
+
+    threads = [threading.Thread(target=attacker, args=(i,), daemon=True) for i in range(attackers)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def run_config(name, overrides, args, product_ids, usernames):
+    env = dict(os.environ, **overrides)
+    process, port = start_gunicorn(env, args.workers, args.threads)
+    try:
+        browse(port, product_ids, 1, args.readers)  # làm nóng
+        quiet = browse(port, product_ids, args.duration, args.readers)
+
+        statuses = Counter()
+        stop = threading.Event()
+        threads = storm(port, usernames, stop, args.attackers, statuses)
+        time.sleep(0.5)
+        loaded = browse(port, product_ids, args.duration, args.readers)
+        stop.set()
+        for t in threads:
+            t.join(timeout=15)
+    finally:
+        process.terminate()
+        process.wait()
+
+    return {
+        'config': name,
+        'quiet_p50': percentile(quiet, 50), 'quiet_p95': percentile(quiet, 95),
+        'storm_p50': percentile(loaded, 50), 'storm_p95': percentile(loaded, 95),
+        'browse_rps': len(loaded) / args.duration,
+        'logins': dict(sorted(statuses.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_database_arguments(parser)
+    parser.add_argument('--generate', help='xóa và sinh lại dữ liệu trước khi chạy (small, medium, large; cần --yes-wipe)')
+    parser.add_argument('--configs', default=','.join(CONFIGS))
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=2, help='số thread đọc trang sản phẩm')
+    parser.add_argument('--attackers', type=int, default=8, help='số thread gửi đăng nhập sai')
+    parser.add_argument('--duration', type=float, default=5.0, help='số giây đo mỗi pha')
+    args = parser.parse_args()
+
+    select_database(args, wipe=bool(args.generate))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from app import create_app, db, Product, User
+    from datagen import PRESETS, generate
+
+    app = create_app()
+    with app.app_context():
+        if args.generate:
+            generate(**PRESETS[args.generate])
+        product_ids = [row[0] for row in db.session.query(Product.id).limit(1000)]
+        usernames = [row[0] for row in db.session.query(User.username).filter(User.username.like('bench%')).limit(1000)]
+    if not product_ids or not usernames:
+        sys.exit('Database chưa có dữ liệu benchmark, hãy chạy với --generate')
+
+    print(f"{'config':<16}{'quiet p50':>11}{'quiet p95':>11}{'storm p50':>11}{'storm p95':>11}{'req/s':>8}  logins")
+    for name in args.configs.split(','):
+        r = run_config(name, CONFIGS[name], args, product_ids, usernames)
+        print(f"{r['config']:<16}{r['quiet_p50']:>11.1f}{r['quiet_p95']:>11.1f}{r['storm_p50']:>11.1f}"
+              f"{r['storm_p95']:>11.1f}{r['browse_rps']:>8.1f}  {r['logins']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark tìm kiếm toàn văn so với LIKE '%term%' trên danh mục lớn.
+
+    python benchmarks/search_bench.py --products 100000
+    python benchmarks/search_bench.py --database-url postgresql://localhost/techstore_bench --yes-wipe
+
+Script xóa mọi sản phẩm trước khi sinh dữ liệu; mặc định chạy trên file SQLite tạm.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datagen import add_database_arguments, select_database  # noqa: E402
+
+BRANDS = ['Samsung', 'Apple', 'Xiaomi', 'Oppo', 'Dell', 'Asus', 'Lenovo', 'Sony', 'LG', 'Vivo']
+KINDS = ['Điện thoại', 'Máy tính bảng', 'Laptop', 'Tai nghe', 'Đồng hồ thông minh',
+         'Loa bluetooth', 'Màn hình', 'Bàn phím cơ', 'Chuột không dây', 'Sạc dự phòng']
+WORDS = ['chính hãng', 'bảo hành', 'pin trâu', 'màn hình đẹp', 'siêu mỏng', 'chống nước',
+         'sạc nhanh', 'âm thanh sống động', 'hiệu năng cao', 'giá rẻ', 'màu đen', 'màu trắng']
+QUERIES = ['điện thoại samsung', 'dien thoai', 'laptop del', 'tai nghe chong nuoc',
+           'sạc nhanh', 'màn hình', 'xiaomi pin', 'dong ho']
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    add_database_arguments(parser, sqlite_file=False)
+    args = parser.parse_args()
+
+    # Mọi sản phẩm bị xóa trước khi sinh dữ liệu: mặc định file SQLite tạm
+    select_database(args, wipe=True, scratch_name='search.db')
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from app import create_app, db, init_db, Product, search_catalog
+    import search as fulltext
+
+    rng = random.Random(args.seed)
+    app = create_app()
+    with app.app_context():
+        init_db()
+        db.session.execute(db.delete(Product))
+        rows = []
+        for i in range(args.products):
+            rows.append({
+                'name': f'{rng.choice(KINDS)} {rng.choice(BRANDS)} {rng.randint(1, 999)}',
+                'description': ', '.join(rng.sample(WORDS, 3)),
+                'price': float(rng.randint(100, 50000) * 1000),
+                'quantity': rng.randint(0, 100)
+            })
+        start = time.perf_counter()
+        db.session.execute(db.insert(Product), rows)
+        db.session.commit()
+        print(f'insert {args.products} sản phẩm: {time.perf_counter() - start:.2f}s')
+
+        start = time.perf_counter()
+        fulltext.rebuild(db.session, db.session.query(Product.id, Product.name, Product.description))
+        db.session.commit()
+        print(f'xây chỉ mục: {time.perf_counter() - start:.2f}s')
+
+        print(f"{'truy vấn':<24}{'fts (ms)':>10}{'like (ms)':>11}{'kết quả':>9}")
+        for query in QUERIES:
+            fts_ms = timed(lambda: search_catalog(query), args.repeat)
+            like = Product.query.filter(db.and_(*[
+                db.or_(Product.name.ilike(f'%{word}%'), Product.description.ilike(f'%{word}%'))
+                for word in query.split()
+            ])).limit(12)
+            like_ms = timed(lambda: like.all(), args.repeat)
+            hits = len(fulltext.search(db.session, query, limit=100000))
+            print(f'{query:<24}{fts_ms:>10.2f}{like_ms:>11.2f}{hits:>9}')
+
+
+if __name__ == '__main__':
+    main()
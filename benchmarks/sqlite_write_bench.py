@@ -0,0 +1,92 @@
+"""So sánh throughput ghi đồng thời trên SQLite: cấu hình mặc định so với WAL + PRAGMA của database.py.
+
+    python benchmarks/sqlite_write_bench.py --threads 8 --transactions 300
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+import database  # noqa: E402
+
+SCHEMA = [
+    'CREATE TABLE product (id INTEGER PRIMARY KEY, quantity INTEGER NOT NULL)',
+    'CREATE TABLE order_item (id INTEGER PRIMARY KEY, product_id INTEGER NOT NULL, quantity INTEGER NOT NULL)',
+]
+
+
+def run(engine, threads, transactions, products, read_ratio):
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text('INSERT INTO product (id, quantity) VALUES (:id, 1000000)'),
+                     [{'id': i} for i in range(1, products + 1)])
+
+    counters = {'writes': 0, 'reads': 0, 'locked': 0}
+    lock = threading.Lock()
+
+    def worker(index):
+        for i in range(transactions):
+            product_id = (index * 7919 + i) % products + 1
+            try:
+                if (i % 100) < read_ratio * 100:
+                    with engine.connect() as conn:
+                        conn.execute(text('SELECT quantity FROM product WHERE id = :id'), {'id': product_id}).scalar()
+                        conn.execute(text('SELECT COUNT(*) FROM order_item WHERE product_id = :id'),
+                                     {'id': product_id}).scalar()
+                    kind = 'reads'
+                else:
+                    with engine.begin() as conn:
+                        conn.execute(text('UPDATE product SET quantity = quantity - 1 WHERE id = :id AND quantity >= 1'),
+                                     {'id': product_id})
+                        conn.execute(text('INSERT INTO order_item (product_id, quantity) VALUES (:id, 1)'),
+                                     {'id': product_id})
+                    kind = 'writes'
+            except Exception as e:
+                if 'locked' not in str(e):
+                    raise
+                kind = 'locked'
+            with lock:
+                counters[kind] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return counters, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--transactions', type=int, default=300, help='số transaction mỗi thread')
+    parser.add_argument('--products', type=int, default=50)
+    parser.add_argument('--read-ratio', type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f'threads={args.threads} transactions/thread={args.transactions} read_ratio={args.read_ratio}')
+    for label in ('mặc định', 'tuned'):
+        url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        if label == 'tuned':
+            engine = create_engine(url, **database.engine_options(url))
+            database.configure_engine(engine)
+        else:
+            engine = create_engine(url)
+        counters, elapsed = run(engine, args.threads, args.transactions, args.products, args.read_ratio)
+        print(f"{label:<10} {counters['writes'] / elapsed:8.1f} ghi/s  {counters['reads'] / elapsed:8.1f} đọc/s"
+              f"  {counters['locked']:4d} lỗi 'database is locked'  ({elapsed:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Đo thời gian khởi động: import ứng dụng và thời gian tới response đầu tiên của các worker gunicorn.
+
+    python benchmarks/startup_bench.py --workers 4 --runs 3
+
+So sánh hai chế độ: ``cold`` (không preload, không warmup: mỗi worker tự import
+ứng dụng và biên dịch template ở request đầu tiên) và ``preload``
+(``preload_app`` + ``warmup()`` như gunicorn.conf.py). Mỗi lần chạy ghi lại thời
+gian từ lúc khởi chạy gunicorn đến response đầu tiên, độ trễ của loạt request
+đồng thời đầu tiên (rơi vào các worker khác nhau) và độ trễ khi đã nóng.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    'cold': {'GUNICORN_PRELOAD': '0', 'WARMUP': '0'},
+    'preload': {'GUNICORN_PRELOAD': '1', 'WARMUP': '1'},
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def import_time(env):
+    """Thời gian import wsgi.py (import app.py + create_app()) trong một tiến trình mới (ms)"""
+    code = 'import time; t = time.perf_counter(); import wsgi; print((time.perf_counter() - t) * 1000)'
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def get(port, path='/'):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        start = time.perf_counter()
+        conn.request('GET', path)
+        response = conn.getresponse()
+        response.read()
+        return response.status, (time.perf_counter() - start) * 1000
+    finally:
+        conn.close()
+
+
+def run_once(env, workers, timeout=60):
+    """Trả về (ms tới response đầu tiên, [ms của loạt request đồng thời đầu tiên], [ms khi đã nóng])"""
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers), '--log-level', 'warning', 'wsgi:app'
+    ], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError('gunicorn exited during startup')
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError('gunicorn did not become ready')
+            try:
+                status, _ = get(port)
+                break
+            except OSError:
+                time.sleep(0.005)
+        if status != 200:
+            raise RuntimeError(f'GET / returned {status}')
+        ready = (time.perf_counter() - started) * 1000
+        with ThreadPoolExecutor(max_workers=workers * 2) as pool:
+            burst = [latency for _, latency in pool.map(lambda _: get(port), range(workers * 2))]
+        warm = [get(port)[1] for _ in range(20)]
+    finally:
+        process.terminate()
+        process.wait()
+    return ready, burst, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if 'DATABASE_URL' not in env:
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup.db')
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    subprocess.check_call([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], cwd=ROOT, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    print(f'import wsgi.py: {statistics.median(import_time(env) for _ in range(args.runs)):.0f} ms (median)')
+    print(f'{args.workers} worker, {args.runs} lần chạy (median)')
+    print(f"{'mode':<10}{'first response':>16}{'burst p50':>12}{'burst max':>12}{'warm p50':>12}")
+    for mode, overrides in MODES.items():
+        ready, burst, burst_max, warm = [], [], [], []
+        for _ in range(args.runs):
+            ready_ms, burst_run, warm_run = run_once({**env, **overrides}, args.workers)
+            ready.append(ready_ms)
+            burst += burst_run
+            burst_max.append(max(burst_run))
+            warm += warm_run
+        print(f'{mode:<10}{statistics.median(ready):>13.0f} ms{statistics.median(burst):>9.1f} ms'
+              f'{statistics.median(burst_max):>9.1f} ms{statistics.median(warm):>9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+"""Lớp cache dùng chung cho danh mục sản phẩm.
+
+Có ba backend:
+
+- ``memory``: LRU + TTL trong tiến trình (mỗi worker gunicorn một bản, chỉ hợp
+  với một worker).
+- ``file``: lưu từng khóa thành một file JSON trong thư mục dùng chung, nhờ vậy
+  các worker cùng nhìn thấy dữ liệu và cùng bị vô hiệu hóa.
+- ``none``: tắt cache.
+
+Các trang danh sách được vô hiệu hóa theo "namespace": khóa của chúng chứa
+phiên bản của namespace, và ``bump()`` đổi phiên bản để mọi khóa cũ tự hết
+hiệu lực mà không cần liệt kê chúng.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+
+class MemoryCache:
+    """Cache LRU có TTL trong bộ nhớ của tiến trình"""
+
+    def __init__(self, maxsize=1024, default_ttl=300):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FileCache:
+    """Cache lưu trên đĩa, dùng chung giữa các worker trên cùng một máy.
+
+    Giá trị phải serialize được bằng JSON. Việc ghi dùng file tạm rồi
+    ``os.replace`` nên worker khác không bao giờ đọc phải file ghi dở.
+
+    Khóa bị thay thế (ví dụ trang của phiên bản namespace cũ sau ``bump()``)
+    không bao giờ được đọc lại nên không tự bị xóa. Vì vậy mtime của mỗi file
+    được đặt bằng thời điểm hết hạn (khóa không có TTL: xa trong tương lai), và
+    cứ sau ``sweep_every`` lần ghi, ``sweep()`` duyệt thư mục chỉ bằng stat:
+    xóa file đã hết hạn, file tạm bị bỏ dở, rồi nếu vẫn quá ``max_entries``
+    thì xóa các file sắp hết hạn nhất (khóa ``ns:`` không có TTL bị xóa sau cùng).
+    """
+
+    NO_EXPIRY = 10 * 365 * 24 * 3600  # mtime của khóa không có TTL: now + 10 năm
+    TMP_MAX_AGE = 60  # file .tmp cũ hơn (giây) là của lần ghi bị gián đoạn
+
+    def __init__(self, directory=None, default_ttl=300, max_entries=1024, sweep_every=None):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'techstore-cache')
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.sweep_every = sweep_every or max(1, max_entries // 10)
+        self._writes = 0
+        self._sweep_lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry['expires'] is not None and entry['expires'] <= time.time():
+            self.delete(key)
+            return None
+        return entry['value']
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        entry = {'value': value, 'expires': time.time() + ttl if ttl else None}
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        except FileNotFoundError:
+            # Thư mục được tạo ở lần ghi đầu tiên, không phải lúc import
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            now = time.time()
+            os.utime(tmp_path, (now, entry['expires'] or now + self.NO_EXPIRY))
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        self._writes += 1
+        if self._writes >= self.sweep_every:
+            self._writes = 0
+            self.sweep()
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def sweep(self):
+        """Dọn thư mục, trả về số file đã xóa. Nhiều worker cùng dọn cũng không sao."""
+        if not self._sweep_lock.acquire(blocking=False):
+            return 0
+        try:
+            now = time.time()
+            removed, live = 0, []
+            for entry in self._entries():
+                try:
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    continue
+                if entry.name.endswith('.json'):
+                    if mtime > now:
+                        live.append((mtime, entry.path))
+                        continue
+                elif not (entry.name.endswith('.tmp') and mtime < now - self.TMP_MAX_AGE):
+                    continue
+                removed += _unlink(entry.path)
+            if len(live) > self.max_entries:
+                live.sort()
+                removed += sum(_unlink(path) for _, path in live[:len(live) - self.max_entries])
+            return removed
+        finally:
+            self._sweep_lock.release()
+
+    def clear(self):
+        for entry in self._entries():
+            if entry.name.endswith('.json'):
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+
+    def __len__(self):
+        return sum(1 for entry in self._entries() if entry.name.endswith('.json'))
+
+    def _entries(self):
+        try:
+            return list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return []
+
+
+class NullCache:
+    """Backend không lưu gì, dùng khi tắt cache"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class Cache:
+    """Mặt tiền của backend: thêm bộ đếm hit/miss và phiên bản namespace"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'sets': 0, 'deletes': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key):
+        value = self.backend.get(key)
+        self._count('misses' if value is None else 'hits')
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl)
+        self._count('sets')
+
+    def delete(self, *keys):
+        for key in keys:
+            self.backend.delete(key)
+            self._count('deletes')
+
+    def get_or_set(self, key, factory, ttl=None):
+        """Đọc khóa, nếu chưa có thì gọi ``factory()`` và lưu kết quả (bỏ qua None)"""
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    def version(self, namespace):
+        """Phiên bản hiện tại của namespace, dùng làm một phần của khóa"""
+        key = f'ns:{namespace}'
+        version = self.backend.get(key)
+        if version is None:
+            version = uuid.uuid4().hex[:12]
+            self.backend.set(key, version, 0)
+        return version
+
+    def bump(self, namespace):
+        """Vô hiệu hóa mọi khóa được tạo với phiên bản cũ của namespace"""
+        self.backend.set(f'ns:{namespace}', uuid.uuid4().hex[:12], 0)
+        self._count('deletes')
+
+    def clear(self):
+        self.backend.clear()
+
+    def counters(self):
+        """Bộ đếm hits / misses / sets / deletes của tiến trình này"""
+        with self._lock:
+            return dict(self._counters)
+
+    def stats(self, counters=None):
+        """Bộ đếm kèm hit rate; ``counters`` đã cộng dồn giữa các worker (xem metrics.py) nếu có"""
+        counters = dict(counters or self.counters())
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = counters['hits'] / lookups if lookups else 0.0
+        counters['backend'] = type(self.backend).__name__
+        counters['size'] = len(self.backend)
+        counters['pid'] = os.getpid()
+        return counters
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        return 0
+    return 1
+
+
+def create_cache(backend='memory', maxsize=1024, default_ttl=300, directory=None):
+    if backend == 'memory':
+        return Cache(MemoryCache(maxsize=maxsize, default_ttl=default_ttl))
+    if backend == 'file':
+        return Cache(FileCache(directory=directory, default_ttl=default_ttl, max_entries=maxsize))
+    if backend == 'none':
+        return Cache(NullCache())
+    raise ValueError(f'Unknown cache backend: {backend}')
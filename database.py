@@ -0,0 +1,270 @@
+"""Cấu hình engine SQLAlchemy cho SQLite (chế độ production) và PostgreSQL.
+
+SQLite: mỗi kết nối mới được đặt WAL (người đọc không chặn người ghi),
+``synchronous=NORMAL`` (an toàn với WAL, ít fsync hơn), ``busy_timeout`` (chờ
+khóa thay vì báo ``database is locked`` ngay), mmap và cache trang lớn hơn.
+
+PostgreSQL: kích thước pool, ``pool_pre_ping`` (bỏ kết nối chết sau khi DB
+khởi động lại), ``pool_recycle`` và ``statement_timeout`` phía server.
+
+Read replica (tùy chọn): ``DATABASE_REPLICA_URL`` thêm bind ``replica``; view
+được đánh dấu ``@replica_reads`` đọc từ đó, mọi câu ghi và request ngay sau
+khi người dùng ghi vẫn đi tới primary, và replica hỏng thì đọc quay về primary.
+
+Mọi giá trị đều đọc từ biến môi trường, xem ``engine_options()``.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import logging
+import os
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(env, name, default):
+    return int(env.get(name, default))
+
+
+def is_sqlite_memory(database_url):
+    return database_url in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in database_url
+
+
+def engine_options(database_url, env=None):
+    """Giá trị cho ``SQLALCHEMY_ENGINE_OPTIONS`` theo loại database"""
+    env = os.environ if env is None else env
+
+    if database_url.startswith('sqlite'):
+        busy_timeout_ms = _env_int(env, 'SQLITE_BUSY_TIMEOUT_MS', 5000)
+        options = {
+            'connect_args': {'timeout': busy_timeout_ms / 1000, 'check_same_thread': False},
+        }
+        if not is_sqlite_memory(database_url):
+            options.update(
+                pool_size=_env_int(env, 'DB_POOL_SIZE', 5),
+                max_overflow=_env_int(env, 'DB_MAX_OVERFLOW', 10),
+                pool_timeout=_env_int(env, 'DB_POOL_TIMEOUT', 30),
+            )
+        return options
+
+    options = {
+        'pool_size': _env_int(env, 'DB_POOL_SIZE', 5),
+        'max_overflow': _env_int(env, 'DB_MAX_OVERFLOW', 10),
+        'pool_timeout': _env_int(env, 'DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int(env, 'DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': env.get('DB_POOL_PRE_PING', '1') not in ('0', 'false', 'False'),
+    }
+    if database_url.startswith('postgresql'):
+        statement_timeout_ms = _env_int(env, 'DB_STATEMENT_TIMEOUT_MS', 15000)
+        lock_timeout_ms = _env_int(env, 'DB_LOCK_TIMEOUT_MS', 5000)
+        options['connect_args'] = {
+            'options': f'-c statement_timeout={statement_timeout_ms} -c lock_timeout={lock_timeout_ms}',
+            'application_name': env.get('DB_APPLICATION_NAME', 'techstore'),
+        }
+    return options
+
+
+def replica_engine_options(database_url, env=None):
+    """Như ``engine_options()``, thêm thời gian chờ kết nối ngắn để replica hỏng được phát hiện nhanh"""
+    env = os.environ if env is None else env
+    options = engine_options(database_url, env)
+    if database_url.startswith('postgresql'):
+        options['connect_args']['connect_timeout'] = _env_int(env, 'REPLICA_CONNECT_TIMEOUT', 2)
+    return options
+
+
+def sqlite_pragmas(env=None):
+    env = os.environ if env is None else env
+    return [
+        ('journal_mode', env.get('SQLITE_JOURNAL_MODE', 'WAL')),
+        ('synchronous', env.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('busy_timeout', _env_int(env, 'SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        ('mmap_size', _env_int(env, 'SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        # Số âm = KiB
+        ('cache_size', -_env_int(env, 'SQLITE_CACHE_SIZE_KB', 64 * 1024)),
+        ('temp_store', 'MEMORY'),
+    ]
+
+
+def configure_engine(engine, env=None):
+    """Gắn các PRAGMA vào mỗi kết nối SQLite mới. Không làm gì với database khác."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = sqlite_pragmas(env)
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+# ==================== READ REPLICA ====================
+
+REPLICA = 'replica'
+_STICKY_KEY = '_db_primary_until'
+
+
+def replica_reads(view):
+    """Đánh dấu view GET chỉ đọc: truy vấn của nó được gửi tới replica nếu có và đang khỏe.
+
+    Replica lỗi giữa chừng (OperationalError) thì view được chạy lại một lần trên primary.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if g.get('_db_route') != REPLICA:
+            return view(*args, **kwargs)
+        try:
+            return view(*args, **kwargs)
+        except OperationalError as e:
+            logger.warning('Read replica query failed, retrying on primary: %s', e)
+            current_app.extensions['sqlalchemy'].session.rollback()
+            g.pop('_db_route', None)
+            return view(*args, **kwargs)
+    wrapper.replica_reads = True
+    return wrapper
+
+
+def _is_write(clause):
+    if clause is None:
+        return False
+    return getattr(clause, 'is_dml', False) or getattr(clause, '_for_update_arg', None) is not None
+
+
+class RoutingSession(Session):
+    """Session của Flask-SQLAlchemy gửi truy vấn đọc sang bind ``replica`` khi request được định tuyến như vậy.
+
+    Mọi câu ghi (flush, INSERT / UPDATE / DELETE, SELECT ... FOR UPDATE) luôn
+    đi tới primary và đánh dấu request là đã ghi.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or _is_write(clause):
+                g._db_wrote = True
+            elif g.get('_db_route') == REPLICA and REPLICA in self._db.engines:
+                return self._db.engines[REPLICA]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def use_primary():
+    """Đọc từ primary trong khối lệnh, ví dụ khi nạp cache (không để dữ liệu trễ của replica vào cache)"""
+    if not has_request_context():
+        yield
+        return
+    route = g.pop('_db_route', None)
+    try:
+        yield
+    finally:
+        if route is not None:
+            g._db_route = route
+
+
+class ReplicaHealth:
+    """Trạng thái replica, kiểm tra lại (SELECT 1, độ trễ replay trên PostgreSQL) tối đa mỗi ``interval`` giây.
+
+    Lỗi kết nối trong lúc phục vụ request đánh dấu replica hỏng ngay; trong
+    lúc đó mọi truy vấn đọc quay về primary.
+    """
+
+    def __init__(self, engine, interval=5.0, max_lag=30.0):
+        self.engine = engine
+        self.interval = interval
+        self.max_lag = max_lag
+        self.up = True
+        self.checked_at = 0.0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def healthy(self):
+        if time.monotonic() - self.checked_at >= self.interval and self._lock.acquire(blocking=False):
+            # Chỉ một thread kiểm tra, các thread khác dùng kết quả lần trước
+            try:
+                self.up = self.check()
+                self.checked_at = time.monotonic()
+            finally:
+                self._lock.release()
+        return self.up
+
+    def check(self):
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+                if self.engine.dialect.name == 'postgresql':
+                    lag = conn.execute(text(
+                        'SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)'
+                    )).scalar()
+                    if lag > self.max_lag:
+                        logger.warning('Read replica lagging %.1fs behind, reading from primary', lag)
+                        return False
+            if not self.up:
+                logger.info('Read replica is back')
+            return True
+        except Exception as e:
+            if self.up:
+                logger.warning('Read replica unavailable, reading from primary: %s', e)
+            return False
+
+    def mark_down(self):
+        if self.up:
+            logger.warning('Read replica marked down after a query error')
+        self.up = False
+        self.failures += 1
+        self.checked_at = time.monotonic()
+
+
+class ReplicaRouter:
+    """Định tuyến request ``@replica_reads`` tới bind ``replica``.
+
+    Request nào ghi vào database sẽ giữ người dùng đó ở primary thêm
+    ``sticky_seconds`` giây (lưu trong session cookie), để trang tiếp theo
+    (ví dụ ``order_success`` ngay sau ``checkout``) đọc được chính thay đổi vừa ghi.
+    """
+
+    def __init__(self, sticky_seconds=5.0, check_interval=5.0, max_lag=30.0):
+        self.sticky_seconds = sticky_seconds
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.health = None
+
+    def init_app(self, app, db):
+        engine = db.engines[REPLICA]
+        configure_engine(engine)
+        self.health = ReplicaHealth(engine, self.check_interval, self.max_lag)
+        event.listen(engine, 'handle_error', self._on_error)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['replica_router'] = self
+
+    def _on_error(self, context):
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+            self.health.mark_down()
+
+    def _before_request(self):
+        if request.method not in ('GET', 'HEAD'):
+            return
+        view = current_app.view_functions.get(request.endpoint)
+        if not getattr(view, 'replica_reads', False):
+            return
+        if session.get(_STICKY_KEY, 0) > time.time():
+            return
+        if self.health.healthy():
+            g._db_route = REPLICA
+
+    def _after_request(self, response):
+        if g.get('_db_wrote'):
+            session[_STICKY_KEY] = time.time() + self.sticky_seconds
+        if g.get('_db_route') == REPLICA:
+            response.headers['X-DB-Route'] = REPLICA
+        return response
@@ -0,0 +1,44 @@
+"""Cấu hình gunicorn.
+
+Với ``preload_app`` (mặc định bật), ứng dụng được import và template được biên
+dịch một lần ở tiến trình master; mỗi worker fork ra dùng chung bộ nhớ đó và chỉ
+cần mở pool kết nối của riêng mình. Schema không được tạo ở đây, chạy
+``flask init-db`` trước khi khởi động. Các hook lấy ứng dụng gunicorn đã nạp
+(``wsgi:app``) qua ``server.app.wsgi()`` / ``worker.wsgi``.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# app.py đọc WEB_CONCURRENCY để chọn cache dùng chung (file) khi có nhiều worker
+os.environ.setdefault('WEB_CONCURRENCY', str(workers))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+worker_class = 'gthread'
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+# Không ghi access log của gunicorn: mỗi request đã được ghi (có lấy mẫu, qua QueueHandler)
+# bởi logging_setup.log_request; accesslog = '-' sẽ ghi thêm một dòng đồng bộ, không lấy mẫu
+accesslog = None
+errorlog = '-'
+
+WARMUP = os.environ.get('WARMUP', '1') != '0'
+
+
+def when_ready(server):
+    if preload_app and WARMUP:
+        from app import warmup
+        warmup(server.app.wsgi(), pool=False)
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app import db
+        app = server.app.wsgi()
+        # Không dùng lại kết nối mở ở master (nếu có) trong tiến trình con
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    if WARMUP:
+        from app import warmup
+        warmup(worker.wsgi, templates=not preload_app)
@@ -0,0 +1,99 @@
+"""Cache HTTP có điều kiện: ETag, Last-Modified và 304 Not Modified.
+
+Route tính validator (ETag, thời điểm sửa đổi cuối) từ dữ liệu trong database
+rồi gọi ``is_not_modified()`` *trước khi* render template: nếu client (hoặc CDN)
+đã có đúng phiên bản đó thì trả 304 rỗng, không tốn công render.
+
+Chính sách ``Cache-Control`` được cấu hình theo endpoint, có thể ghi đè bằng
+biến môi trường ``CACHE_CONTROL_<ENDPOINT>`` (ví dụ ``CACHE_CONTROL_INDEX``).
+
+``compress()`` nén body động (API JSON) bằng brotli hoặc gzip theo
+``Accept-Encoding`` của request.
+"""
+from datetime import timezone
+from functools import lru_cache
+import gzip
+import hashlib
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # tùy chọn: không có thì chỉ nén gzip
+    brotli = None
+
+# Body nhỏ hơn ngưỡng này không đáng nén (header + CPU tốn hơn phần tiết kiệm)
+COMPRESS_MIN_SIZE = 1024
+
+
+def load_policies(defaults, env=None):
+    """Chính sách Cache-Control theo endpoint, ghi đè được bằng biến môi trường"""
+    env = os.environ if env is None else env
+    return {endpoint: env.get(f'CACHE_CONTROL_{endpoint.upper()}', policy)
+            for endpoint, policy in defaults.items()}
+
+
+@lru_cache(maxsize=None)
+def tree_digest(directory):
+    """Hash nội dung mọi file trong thư mục (ví dụ templates) để ETag đổi sau mỗi lần deploy"""
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, directory).encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+def _utc(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def is_not_modified(etag, last_modified=None):
+    """Request hiện tại có thể được trả lời bằng 304 không.
+
+    ``If-None-Match`` được ưu tiên; ``If-Modified-Since`` chỉ được xét khi
+    client không gửi ETag (RFC 9110).
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return _utc(last_modified) <= request.if_modified_since
+    return False
+
+
+def set_validators(response, etag=None, last_modified=None, cache_control=None):
+    if etag is not None:
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _utc(last_modified)
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+    response.vary.add('Cookie')
+    return response
+
+
+def compress(data, min_size=COMPRESS_MIN_SIZE):
+    """Nén ``data`` (bytes) theo Accept-Encoding, ưu tiên br rồi gzip. Trả về (data, encoding hoặc None)."""
+    if len(data) < min_size:
+        return data, None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality('br') > 0:
+        # Mức vừa phải: nén động cho từng request, không phải nén sẵn một lần như static asset
+        return brotli.compress(data, quality=5), 'br'
+    if accepted.quality('gzip') > 0:
+        return gzip.compress(data, compresslevel=6), 'gzip'
+    return data, None
@@ -0,0 +1,207 @@
+"""Ảnh sản phẩm tải lên: lưu bản gốc, sinh thumbnail WebP / JPEG nhiều kích thước.
+
+``ImageStore.read()`` kiểm tra file bằng Pillow, ``write_original()`` lưu bản
+gốc vào ``UPLOAD_DIR/originals/<hash>.<đuôi>``; tên file là hash nội dung nên
+cùng một ảnh tải lên hai lần chỉ lưu một bản. ``generate_variants()`` ghi
+``<hash>-<rộng>.webp`` và ``<hash>-<rộng>.jpg`` cho từng chiều rộng trong
+``widths`` không lớn hơn ảnh gốc; app.py chạy nó ngoài request qua ``submit()``
+(thread pool trong chính tiến trình giữ ``UPLOAD_DIR``, xem ``attach_uploaded_image``).
+
+Mọi file được phục vụ tại ``/media/<tên>`` với ``Cache-Control: immutable``:
+nội dung của một URL không bao giờ đổi. Template dùng ``image_srcset()`` và
+``image_src()`` (xem ``_product_image.html``) để trình duyệt tự chọn kích
+thước vừa với ô hiển thị thay vì tải ảnh gốc.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+import hashlib
+import io
+import logging
+import os
+import threading
+
+from flask import send_from_directory, url_for
+
+from assets import IMMUTABLE
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # tùy chọn: không có Pillow thì không nhận ảnh tải lên
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (160, 320, 640, 960)
+ORIGINALS_DIR = 'originals'
+# Định dạng Pillow được nhận -> đuôi file của bản gốc
+ALLOWED_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+# Đuôi biến thể -> (định dạng Pillow, tham số lưu)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+class ImageError(ValueError):
+    """File tải lên không phải ảnh hợp lệ hoặc vượt giới hạn"""
+
+
+def parse_widths(value):
+    """``"160,320,640"`` (cột Product.image_widths) -> [160, 320, 640]"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [int(width) for width in value.split(',') if width]
+    return list(value)
+
+
+class ImageStore:
+    def __init__(self, directory=None, widths=WIDTHS, max_bytes=5 * 1024 * 1024, max_pixels=40_000_000, workers=1):
+        self.directory = directory
+        self.widths = tuple(sorted(widths))
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.workers = workers
+        self._executor = None
+        self._executor_pid = None
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        if not self.directory:
+            self.directory = os.path.join(app.instance_path, 'uploads')
+        os.makedirs(os.path.join(self.directory, ORIGINALS_DIR), exist_ok=True)
+        app.add_url_rule('/media/<path:filename>', 'media', self.send_file)
+        app.add_template_global(self.image_src)
+        app.add_template_global(self.image_srcset)
+        app.extensions['images'] = self
+
+    # ==================== UPLOAD ====================
+
+    def read(self, upload):
+        """Đọc và kiểm tra file tải lên (FileStorage), trả về (khóa ``<hash>.<đuôi>``, bytes); chưa ghi gì ra đĩa"""
+        if Image is None:
+            raise ImageError('Máy chủ chưa cài Pillow, không thể nhận ảnh tải lên')
+        data = upload.stream.read(self.max_bytes + 1)
+        if len(data) > self.max_bytes:
+            raise ImageError(f'Ảnh quá lớn (tối đa {self.max_bytes // (1024 * 1024)} MB)')
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                fmt, size = image.format, image.size
+                image.verify()
+        except Exception:
+            raise ImageError('File không phải ảnh hợp lệ') from None
+        if fmt not in ALLOWED_FORMATS:
+            raise ImageError(f'Định dạng ảnh không được hỗ trợ: {fmt}. Chấp nhận JPEG, PNG, WebP, GIF')
+        if size[0] * size[1] > self.max_pixels:
+            raise ImageError('Ảnh có độ phân giải quá lớn')
+
+        key = f'{hashlib.sha256(data).hexdigest()[:24]}.{ALLOWED_FORMATS[fmt]}'
+        logger.info('Accepted uploaded image %s (%s, %dx%d, %d bytes)', key, fmt, size[0], size[1], len(data))
+        return key, data
+
+    def write_original(self, key, data):
+        """Ghi bản gốc đã kiểm tra bởi read()"""
+        path = self._original_path(key)
+        if not os.path.exists(path):
+            _write(path, data)
+
+    def _original_path(self, key):
+        return os.path.join(self.directory, ORIGINALS_DIR, key)
+
+    # ==================== VARIANTS ====================
+
+    def variant_widths(self, original_width):
+        """Các chiều rộng sẽ sinh: không phóng to, ảnh nhỏ hơn mọi mốc thì giữ kích thước gốc"""
+        widths = [width for width in self.widths if width < original_width]
+        widths.append(min(original_width, self.widths[-1]))
+        return sorted(set(widths))
+
+    def generate_variants(self, key):
+        """Sinh mọi biến thể còn thiếu của ảnh ``key``, trả về danh sách chiều rộng đã có"""
+        if Image is None:
+            raise ImageError('Máy chủ chưa cài Pillow, không thể sinh thumbnail')
+        stem = key.rsplit('.', 1)[0]
+        with Image.open(self._original_path(key)) as image:
+            # JPEG: giải mã thẳng ở độ phân giải nhỏ hơn nhưng vẫn >= mốc lớn nhất (nhanh hơn nhiều
+            # với ảnh máy ảnh); khung vuông để vẫn đủ lớn khi ảnh được xoay theo EXIF
+            image.draft('RGB', (self.widths[-1], self.widths[-1]))
+            image = _flatten(ImageOps.exif_transpose(image))
+            widths = self.variant_widths(image.width)
+            for width in reversed(widths):
+                height = max(1, round(image.height * width / image.width))
+                # Thu nhỏ dần từ biến thể lớn hơn: mỗi lần resize xử lý ít điểm ảnh hơn
+                if width < image.width:
+                    image = image.resize((width, height), Image.LANCZOS)
+                for ext, (fmt, options) in VARIANT_FORMATS.items():
+                    path = os.path.join(self.directory, f'{stem}-{width}.{ext}')
+                    if os.path.exists(path):
+                        continue
+                    buffer = io.BytesIO()
+                    image.save(buffer, fmt, **options)
+                    _write(path, buffer.getvalue())
+        logger.info('Generated image variants for %s: %s', key, widths)
+        return widths
+
+    def submit(self, fn, *args):
+        """Chạy ``fn(*args)`` trong thread pool sinh thumbnail của tiến trình này.
+
+        Pool được tạo lần đầu cần dùng trong từng tiến trình: thread không sống qua fork
+        của gunicorn (preload_app).
+        """
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='images')
+                self._executor_pid = os.getpid()
+                self._futures = set()
+            future = self._executor.submit(fn, *args)
+            self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        return future
+
+    def wait(self, timeout=None):
+        """Chờ các việc đã submit() xong (script, test)"""
+        with self._lock:
+            futures = set(self._futures)
+        wait(futures, timeout=timeout)
+
+    # ==================== URLS ====================
+
+    def image_src(self, key, widths=None, fmt='jpg', width=320):
+        """URL một ảnh: biến thể nhỏ nhất rộng tối thiểu ``width``, hoặc bản gốc nếu chưa có biến thể"""
+        widths = parse_widths(widths)
+        if not widths:
+            return url_for('media', filename=f'{ORIGINALS_DIR}/{key}')
+        chosen = next((w for w in widths if w >= width), widths[-1])
+        return url_for('media', filename=f'{key.rsplit(".", 1)[0]}-{chosen}.{fmt}')
+
+    def image_srcset(self, key, widths, fmt='jpg'):
+        """Giá trị ``srcset`` (``url 160w, url 320w, ...``) của các biến thể định dạng ``fmt``"""
+        stem = key.rsplit('.', 1)[0]
+        return ', '.join(
+            f"{url_for('media', filename=f'{stem}-{width}.{fmt}')} {width}w" for width in parse_widths(widths)
+        )
+
+    def send_file(self, filename):
+        # Tên file là hash nội dung (+ chiều rộng): URL không bao giờ trỏ tới nội dung khác
+        response = send_from_directory(self.directory, filename, max_age=31536000)
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+
+def _flatten(image):
+    """Chuyển về RGB; nền trong suốt (PNG, GIF) được phủ trắng vì JPEG không có kênh alpha"""
+    if image.mode == 'RGB':
+        return image
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _write(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,319 @@
+"""Hàng đợi việc nền lưu trong chính database của ứng dụng.
+
+``enqueue()`` chỉ thêm một dòng vào bảng job trong transaction hiện tại: việc
+được ghi cùng lúc với thay đổi sinh ra nó (ví dụ đơn hàng) và mất cùng nó khi
+rollback. ``flask worker`` nhận việc bằng một câu UPDATE nguyên tử (PostgreSQL:
+``FOR UPDATE SKIP LOCKED``) nên nhiều worker chạy song song không tranh việc.
+
+Handler chạy trong app context; mọi thay đổi database của handler được commit
+cùng với trạng thái ``done`` của job, nên một job thành công có tác dụng đúng
+một lần. Handler lỗi được thử lại với backoff tăng dần tới ``max_attempts``,
+sau đó job chuyển sang ``failed``. Worker gia hạn lease (``locked_at``) của
+các job đang chạy sau mỗi ``lease / 3`` giây; job mà worker chết (quá ``lease``
+giây không gia hạn) được trả lại hàng đợi. Trạng thái cuối chỉ được ghi khi job
+vẫn đang thuộc worker đó: nếu lease đã bị lấy lại, kết quả của lần chạy bị bỏ.
+
+``idempotency_key`` (duy nhất) bỏ qua việc enqueue trùng, ví dụ khi người dùng
+gửi lại cùng một form.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+class JobQueue:
+    def __init__(self, db, model, max_attempts=5, backoff_base=2.0, backoff_max=600.0, lease=300):
+        self.db = db
+        self.model = model
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.handlers = {}
+
+    def task(self, name, max_attempts=None):
+        """Đăng ký handler cho job ``name``; payload được truyền vào dưới dạng keyword argument"""
+        def decorator(fn):
+            self.handlers[name] = (fn, max_attempts or self.max_attempts)
+            return fn
+        return decorator
+
+    # ==================== ENQUEUE ====================
+
+    def enqueue(self, name, payload=None, idempotency_key=None, delay=0):
+        """Thêm job vào transaction hiện tại (không commit). Trả về id, hoặc None nếu trùng idempotency_key."""
+        if name not in self.handlers:
+            raise KeyError(f'Không có handler cho job {name!r}')
+        session = self.db.session
+        dialect = postgresql if session.get_bind().dialect.name == 'postgresql' else sqlite
+        insert = dialect.insert(self.model).values(
+            name=name,
+            payload=json.dumps(payload or {}),
+            status=QUEUED,
+            attempts=0,
+            max_attempts=self.handlers[name][1],
+            run_at=datetime.utcnow() + timedelta(seconds=delay),
+            idempotency_key=idempotency_key,
+        )
+        if idempotency_key is not None:
+            insert = insert.on_conflict_do_nothing(index_elements=['idempotency_key'])
+        return session.execute(insert.returning(self.model.id)).scalar()
+
+    # ==================== WORKER SIDE ====================
+
+    def claim(self, worker_id, limit):
+        """Nhận tối đa ``limit`` job đến hạn, đánh dấu running và tăng attempts; trả về danh sách id"""
+        session, Job = self.db.session, self.model
+        now = datetime.utcnow()
+        due = (self.db.select(Job.id)
+               .where(Job.status == QUEUED, Job.run_at <= now)
+               .order_by(Job.run_at, Job.id)
+               .limit(limit)
+               .with_for_update(skip_locked=True))
+        ids = session.execute(
+            self.db.update(Job)
+            .where(Job.id.in_(due.scalar_subquery()), Job.status == QUEUED)
+            .values(status=RUNNING, attempts=Job.attempts + 1, locked_by=worker_id, locked_at=now)
+            .returning(Job.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        session.commit()
+        return sorted(ids)
+
+    def requeue_stale(self):
+        """Trả lại hàng đợi các job running quá ``lease`` giây (worker đã chết)"""
+        Job = self.model
+        expired = datetime.utcnow() - timedelta(seconds=self.lease)
+        result = self.db.session.execute(
+            self.db.update(Job)
+            .where(Job.status == RUNNING, Job.locked_at < expired)
+            .values(status=self.db.case((Job.attempts >= Job.max_attempts, FAILED), else_=QUEUED),
+                    last_error='lease expired', locked_by=None)
+            .execution_options(synchronize_session=False)
+        )
+        self.db.session.commit()
+        return result.rowcount
+
+    def heartbeat(self, worker_id, job_ids):
+        """Gia hạn lease các job ``worker_id`` đang chạy, trả về số job vẫn còn thuộc worker này"""
+        if not job_ids:
+            return 0
+        result = self.db.session.execute(
+            self.db.update(self.model)
+            .where(self.model.id.in_(job_ids), self.model.locked_by == worker_id, self.model.status == RUNNING)
+            .values(locked_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        self.db.session.commit()
+        return result.rowcount
+
+    def _finish(self, job_id, worker_id, **values):
+        """Ghi trạng thái cuối nếu job vẫn do ``worker_id`` giữ; False nếu lease đã mất"""
+        Job = self.model
+        result = self.db.session.execute(
+            self.db.update(Job)
+            .where(Job.id == job_id, Job.locked_by == worker_id, Job.status == RUNNING)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            self.db.session.rollback()
+            logger.warning('Job %s is no longer held by %s (lease lost), discarding this run', job_id, worker_id)
+            return False
+        self.db.session.commit()
+        return True
+
+    def backoff(self, attempts):
+        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+        return delay * random.uniform(0.8, 1.2)
+
+    def execute(self, job_id, worker_id):
+        """Chạy một job ``worker_id`` đã nhận. Gọi trong app context.
+
+        Trả về trạng thái mới của job, hoặc None nếu lease đã mất (job bị trả lại hàng
+        đợi và có thể đang chạy ở worker khác): thay đổi database của handler bị rollback.
+        """
+        session = self.db.session
+        job = session.get(self.model, job_id)
+        name, payload = job.name, job.payload
+        fn, _ = self.handlers.get(name, (None, None))
+        try:
+            if fn is None:
+                raise KeyError(f'Không có handler cho job {name!r}')
+            fn(**json.loads(payload or '{}'))
+            if not self._finish(job_id, worker_id, status=DONE, finished_at=datetime.utcnow(), last_error=None):
+                return None
+            return DONE
+        except Exception as e:
+            session.rollback()
+            return self._fail(job_id, worker_id, e)
+
+    def _fail(self, job_id, worker_id, error):
+        job = self.db.session.get(self.model, job_id)
+        values = {'last_error': f'{type(error).__name__}: {error}'[:2000], 'locked_by': None}
+        if job.attempts >= job.max_attempts:
+            values.update(status=FAILED, finished_at=datetime.utcnow())
+        else:
+            values.update(status=QUEUED, run_at=datetime.utcnow() + timedelta(seconds=self.backoff(job.attempts)))
+        name, attempts = job.name, job.attempts
+        if not self._finish(job_id, worker_id, **values):
+            return None
+        if values['status'] == FAILED:
+            logger.error('Job %s (%s) failed after %s attempts: %s', job_id, name, attempts, error)
+        else:
+            logger.warning('Job %s (%s) attempt %s failed, retry at %s: %s',
+                           job_id, name, attempts, values['run_at'], error)
+        return values['status']
+
+    def counts(self):
+        Job = self.model
+        return dict(self.db.session.query(Job.status, self.db.func.count(Job.id)).group_by(Job.status).all())
+
+
+class Worker:
+    """Vòng lặp nhận và chạy job bằng một thread pool ``concurrency`` thread.
+
+    ``run(burst=True)`` chạy hết các job đang đến hạn rồi trả về, dùng để chạy
+    worker ngay trong tiến trình (script kiểm tra, dev).
+    """
+
+    def __init__(self, queue, app, concurrency=4, poll_interval=1.0):
+        self.queue = queue
+        self.app = app
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.id = f'{socket.gethostname()}:{os.getpid()}:{id(self):x}'[:60]
+        self.stopping = threading.Event()
+        self.processed = 0
+        self._running = set()
+        self._running_lock = threading.Lock()
+
+    def _execute(self, job_id):
+        with self._running_lock:
+            self._running.add(job_id)
+        with self.app.app_context():
+            try:
+                return self.queue.execute(job_id, self.id)
+            finally:
+                self.queue.db.session.remove()
+                with self._running_lock:
+                    self._running.discard(job_id)
+
+    def _heartbeat(self):
+        with self._running_lock:
+            job_ids = sorted(self._running)
+        if not job_ids:
+            return
+        with self.app.app_context():
+            try:
+                self.queue.heartbeat(self.id, job_ids)
+            except Exception:
+                logger.exception('Could not renew job leases')
+            finally:
+                self.queue.db.session.remove()
+
+    def _claim(self, limit):
+        with self.app.app_context():
+            try:
+                return self.queue.claim(self.id, limit)
+            finally:
+                self.queue.db.session.remove()
+
+    def _requeue_stale(self):
+        with self.app.app_context():
+            try:
+                return self.queue.requeue_stale()
+            finally:
+                self.queue.db.session.remove()
+
+    def stop(self, *_):
+        self.stopping.set()
+
+    def run(self, burst=False):
+        inflight = set()
+        next_sweep = datetime.utcnow()
+        next_heartbeat = datetime.utcnow()
+
+        def heartbeat_due():
+            # Vòng lặp dưới quay lại ít nhất mỗi poll_interval giây khi có job đang chạy
+            nonlocal next_heartbeat
+            if datetime.utcnow() >= next_heartbeat:
+                self._heartbeat()
+                next_heartbeat = datetime.utcnow() + timedelta(seconds=self.queue.lease / 3)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job') as executor:
+            while not self.stopping.is_set():
+                heartbeat_due()
+                if datetime.utcnow() >= next_sweep:
+                    if self._requeue_stale():
+                        logger.warning('Requeued stale jobs')
+                    next_sweep = datetime.utcnow() + timedelta(seconds=self.queue.lease / 2)
+
+                free = self.concurrency - len(inflight)
+                claimed = self._claim(free) if free > 0 else []
+                for job_id in claimed:
+                    inflight.add(executor.submit(self._execute, job_id))
+
+                if inflight:
+                    done, inflight = wait(inflight, timeout=0 if claimed else self.poll_interval,
+                                          return_when=FIRST_COMPLETED)
+                    self.processed += len(done)
+                elif burst:
+                    break
+                elif not claimed:
+                    self.stopping.wait(self.poll_interval)
+
+            # Dừng có trật tự: chờ các job đang chạy xong, vẫn gia hạn lease của chúng
+            while inflight:
+                heartbeat_due()
+                done, inflight = wait(inflight, timeout=self.poll_interval)
+                self.processed += len(done)
+        return self.processed
+
+
+def run_workers(queue, app, processes=1, threads=4, poll_interval=1.0, burst=False):
+    """Chạy ``processes`` tiến trình worker (fork), mỗi tiến trình ``threads`` thread.
+
+    SIGTERM / SIGINT dừng nhận việc mới và chờ các job đang chạy xong.
+    Trả về số job đã xử lý (chỉ đếm được khi ``processes=1``).
+    """
+    if processes <= 1:
+        worker = Worker(queue, app, concurrency=threads, poll_interval=poll_interval)
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        return worker.run(burst=burst)
+
+    def child():
+        # Không dùng lại kết nối database mở ở tiến trình cha
+        with app.app_context():
+            queue.db.engine.dispose(close=False)
+        run_workers(queue, app, 1, threads, poll_interval, burst)
+
+    context = multiprocessing.get_context('fork')
+    children = [context.Process(target=child, name=f'worker-{i}') for i in range(processes)]
+    for process in children:
+        process.start()
+
+    def forward(signum, _):
+        for process in children:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in children:
+        process.join()
+    return None
@@ -0,0 +1,141 @@
+"""Pipeline log không chặn request.
+
+Request thread chỉ đưa bản ghi vào một hàng đợi (``QueueHandler``); một luồng
+nền (``QueueListener``) mới định dạng và ghi ra stdout, nên các thread gthread
+không phải tranh nhau khóa của handler khi ghi I/O.
+
+Mỗi dòng log là một object JSON có ``request_id``, ``user_id`` và các trường
+truyền qua ``extra=``. Dòng log truy cập của từng request (rất nhiều) được lấy
+mẫu theo ``sample_rate``; request lỗi 5xx hoặc chậm luôn được ghi.
+"""
+import atexit
+from datetime import datetime, timezone
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+from flask import g, has_request_context, request, session
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+access_logger = logging.getLogger('access')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Gắn request_id và user_id vào bản ghi; phải chạy trên thread của request"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.user_id = session.get('user_id')
+        return True
+
+
+_sampling = {'rate': 1.0, 'slow_ms': 1000.0}
+# Listener của lần setup_logging() gần nhất (mỗi create_app() gọi lại một lần)
+_active = {'listener': None}
+
+
+def log_request(method, path, status, duration_ms):
+    """Ghi dòng log truy cập của một request.
+
+    Quyết định lấy mẫu được đưa ra trước khi tạo LogRecord, nên các request bị
+    bỏ qua gần như không tốn gì. Lỗi 5xx và request chậm luôn được ghi.
+    """
+    if not access_logger.isEnabledFor(logging.INFO):
+        return
+    if status < 500 and duration_ms < _sampling['slow_ms'] and _sampling['rate'] < 1 \
+            and random.random() >= _sampling['rate']:
+        return
+    access_logger.info('%s %s %s', method, path, status, extra={
+        'method': method,
+        'path': path,
+        'status': status,
+        'duration_ms': round(duration_ms, 2),
+    })
+
+
+def _stop_listener(listener):
+    if listener._thread is not None:
+        listener.stop()
+
+
+def _restart_listener(listener):
+    if listener._thread is not None:
+        listener._thread = None
+        listener.start()
+
+
+def setup_logging(level='INFO', fmt='json', sample_rate=1.0, slow_ms=1000, stream=None):
+    """Cấu hình root logger ghi qua hàng đợi. Trả về QueueListener đã chạy.
+
+    Gọi lại thì dừng listener cũ (đã ghi hết hàng đợi) trước khi thay handler.
+    """
+    if _active['listener'] is not None:
+        _stop_listener(_active['listener'])
+    handler = logging.StreamHandler(stream or sys.stdout)
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    _sampling.update(rate=sample_rate, slow_ms=slow_ms)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    _active['listener'] = listener
+    atexit.register(_stop_listener, listener)
+    # Luồng nền không tồn tại sau fork (gunicorn preload_app): khởi động lại trong tiến trình con
+    os.register_at_fork(after_in_child=lambda: _restart_listener(listener))
+    return listener
+
+
+def init_app(app):
+    """Sinh request id và ghi một dòng log truy cập (được lấy mẫu) cho mỗi request"""
+
+    @app.before_request
+    def _start_request_log():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+        g._log_start = time.perf_counter()
+
+    @app.after_request
+    def _finish_request_log(response):
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        start = g.pop('_log_start', None)
+        if start is not None:
+            log_request(request.method, request.path, response.status_code,
+                        (time.perf_counter() - start) * 1000)
+        return response
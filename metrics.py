@@ -0,0 +1,339 @@
+"""Đo hiệu năng theo từng request và xuất ra dạng text của Prometheus.
+
+Mỗi request ghi lại độ trễ (histogram theo endpoint), mã trạng thái, số câu
+lệnh SQL, thời gian chờ database (qua sự kiện ``before/after_cursor_execute``
+của SQLAlchemy) và thời gian render template (qua signal ``before_render_template``
+/ ``template_rendered`` của Flask, thêm histogram theo từng template). Request dùng nhiều câu lệnh hơn ``query_budget`` bị đánh dấu
+và ghi log cảnh báo, giúp phát hiện N+1.
+
+Khi chạy nhiều worker gunicorn, đặt ``METRICS_DIR``: mỗi worker định kỳ ghi
+snapshot của mình vào ``<METRICS_DIR>/<pid>.json`` và ``/metrics`` cộng dồn
+tất cả các file. Thư mục nên được làm trống mỗi lần deploy.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {'counts': list(self.counts), 'sum': self.sum, 'count': self.count}
+
+
+class MetricsRegistry:
+    """Bộ đếm của một tiến trình worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.queries = {}
+        self.db_seconds = {}
+        self.render_seconds = {}
+        self.templates = {}
+        self.statuses = {}
+        self.over_budget = {}
+        self.in_flight = 0
+        # Bộ đếm của thành phần khác (vd. cache): tên -> hàm trả về {tên bộ đếm: giá trị}
+        self.counter_sources = {}
+
+    def register_counters(self, name, collect):
+        """Xuất thêm bộ đếm ``<name>_<khóa>_total`` lấy từ ``collect()`` mỗi lần chụp snapshot"""
+        self.counter_sources[name] = collect
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, endpoint, method, status, duration, query_count, db_time, over_budget, render_time=0.0):
+        key = (endpoint, method)
+        with self._lock:
+            self.in_flight -= 1
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(duration)
+            self.queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(query_count)
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + db_time
+            self.render_seconds[key] = self.render_seconds.get(key, 0.0) + render_time
+            status_key = (endpoint, method, str(status))
+            self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+            if over_budget:
+                self.over_budget[key] = self.over_budget.get(key, 0) + 1
+
+    def template_rendered(self, name, duration):
+        with self._lock:
+            self.templates.setdefault((name,), Histogram(LATENCY_BUCKETS)).observe(duration)
+
+    def snapshot(self):
+        counters = [[f'{name}_{key}', value]
+                    for name, collect in self.counter_sources.items() for key, value in collect().items()]
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'in_flight': self.in_flight,
+                'latency': [[*key, h.to_dict()] for key, h in self.latency.items()],
+                'queries': [[*key, h.to_dict()] for key, h in self.queries.items()],
+                'db_seconds': [[*key, value] for key, value in self.db_seconds.items()],
+                'render_seconds': [[*key, value] for key, value in self.render_seconds.items()],
+                'templates': [[*key, h.to_dict()] for key, h in self.templates.items()],
+                'statuses': [[*key, value] for key, value in self.statuses.items()],
+                'over_budget': [[*key, value] for key, value in self.over_budget.items()],
+                'counters': counters,
+            }
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge(snapshots):
+    """Cộng dồn snapshot của nhiều worker. Gauge in_flight chỉ tính worker còn sống."""
+    merged = {'in_flight': 0, 'latency': {}, 'queries': {}, 'templates': {}, 'db_seconds': {}, 'render_seconds': {},
+              'statuses': {}, 'over_budget': {}, 'counters': {}}
+    for snap in snapshots:
+        if snap['pid'] == os.getpid() or _pid_alive(snap['pid']):
+            merged['in_flight'] += snap['in_flight']
+        for name in ('latency', 'queries', 'templates'):
+            # Snapshot của worker chạy bản cũ có thể chưa có các khóa mới
+            for *key, hist in snap.get(name, []):
+                target = merged[name].setdefault(tuple(key), {'counts': [0] * len(hist['counts']), 'sum': 0.0, 'count': 0})
+                target['counts'] = [a + b for a, b in zip(target['counts'], hist['counts'])]
+                target['sum'] += hist['sum']
+                target['count'] += hist['count']
+        for name in ('db_seconds', 'render_seconds', 'statuses', 'over_budget', 'counters'):
+            for *key, value in snap.get(name, []):
+                merged[name][tuple(key)] = merged[name].get(tuple(key), 0) + value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name, help_text, buckets, series, label_names=('endpoint', 'method')):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for key, hist in sorted(series.items()):
+        labels = ','.join(f'{label}="{_escape(value)}"' for label, value in zip(label_names, key))
+        cumulative = 0
+        for bound, count in zip(buckets, hist['counts']):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist["count"]}')
+        lines.append(f'{name}_sum{{{labels}}} {hist["sum"]}')
+        lines.append(f'{name}_count{{{labels}}} {hist["count"]}')
+    return lines
+
+
+def render(merged):
+    """Định dạng text exposition của Prometheus"""
+    lines = _histogram_lines('http_request_duration_seconds', 'Request latency by endpoint.',
+                             LATENCY_BUCKETS, merged['latency'])
+    lines += _histogram_lines('http_request_db_queries', 'SQL statements executed per request.',
+                              QUERY_BUCKETS, merged['queries'])
+    lines += _histogram_lines('template_render_duration_seconds', 'Jinja render time by top-level template.',
+                              LATENCY_BUCKETS, merged['templates'], label_names=('template',))
+
+    lines += ['# HELP http_request_db_seconds_total Time spent waiting on the database.',
+              '# TYPE http_request_db_seconds_total counter']
+    for (endpoint, method), value in sorted(merged['db_seconds'].items()):
+        lines.append(f'http_request_db_seconds_total{{endpoint="{_escape(endpoint)}",method="{method}"}} {value}')
+
+    lines += ['# HELP http_request_render_seconds_total Time spent rendering templates.',
+              '# TYPE http_request_render_seconds_total counter']
+    for (endpoint, method), value in sorted(merged['render_seconds'].items()):
+        lines.append(f'http_request_render_seconds_total{{endpoint="{_escape(endpoint)}",method="{method}"}} {value}')
+
+    lines += ['# HELP http_requests_total Requests by endpoint and status.',
+              '# TYPE http_requests_total counter']
+    for (endpoint, method, status), value in sorted(merged['statuses'].items()):
+        lines.append(f'http_requests_total{{endpoint="{_escape(endpoint)}",method="{method}",status="{status}"}} {value}')
+
+    lines += ['# HELP http_requests_over_query_budget_total Requests that exceeded the query budget.',
+              '# TYPE http_requests_over_query_budget_total counter']
+    for (endpoint, method), value in sorted(merged['over_budget'].items()):
+        lines.append(f'http_requests_over_query_budget_total{{endpoint="{_escape(endpoint)}",method="{method}"}} {value}')
+
+    for (name,), value in sorted(merged['counters'].items()):
+        lines += [f'# HELP {name}_total {name} counter summed over workers.', f'# TYPE {name}_total counter',
+                  f'{name}_total {value}']
+
+    lines += ['# HELP http_requests_in_flight Requests currently being served.',
+              '# TYPE http_requests_in_flight gauge',
+              f'http_requests_in_flight {merged["in_flight"]}']
+    return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    """Gắn bộ đo vào ứng dụng Flask và engine SQLAlchemy"""
+
+    def __init__(self, app=None, engine=None, query_budget=30, directory=None, flush_interval=1.0):
+        self.registry = MetricsRegistry()
+        self.query_budget = query_budget
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, engine)
+
+    def init_app(self, app, engine):
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        self.watch_engine(engine)
+        app.extensions['metrics'] = self
+
+    def register_counters(self, name, collect):
+        """Bộ đếm riêng của một tiến trình (vd. cache hit/miss), cộng dồn giữa các worker như số liệu request"""
+        self.registry.register_counters(name, collect)
+
+    def counters(self, name):
+        """Bộ đếm ``name`` đã cộng dồn giữa mọi worker: {khóa: giá trị}"""
+        prefix = f'{name}_'
+        return {key[len(prefix):]: value for (key,), value in self.collect()['counters'].items()
+                if key.startswith(prefix)}
+
+    def watch_engine(self, engine):
+        """Đếm truy vấn của thêm một engine (ví dụ read replica) vào số liệu của request"""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # ----- SQLAlchemy -----
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g._metrics_query_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and hasattr(g, '_metrics_queries'):
+            g._metrics_queries += 1
+            g._metrics_db_time += time.perf_counter() - g.pop('_metrics_query_start', time.perf_counter())
+
+    # ----- Jinja -----
+
+    def _before_render(self, sender, template, context, **extra):
+        if has_request_context():
+            g.setdefault('_metrics_render_stack', []).append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        stack = g.get('_metrics_render_stack') if has_request_context() else None
+        if not stack:
+            return
+        duration = time.perf_counter() - stack.pop()
+        self.registry.template_rendered(template.name or 'unknown', duration)
+        # Template render lồng nhau (render_template bên trong template khác) chỉ tính một lần
+        if not stack:
+            g._metrics_render_time = g.get('_metrics_render_time', 0.0) + duration
+
+    # ----- Flask -----
+
+    def _before_request(self):
+        g._metrics_start = time.perf_counter()
+        g._metrics_queries = 0
+        g._metrics_db_time = 0.0
+        g._metrics_render_time = 0.0
+        self.registry.request_started()
+
+    def _after_request(self, response):
+        if '_metrics_start' in g:
+            duration = time.perf_counter() - g._metrics_start
+            response.headers['Server-Timing'] = (
+                f'db;dur={g._metrics_db_time * 1000:.1f};desc="{g._metrics_queries} queries", '
+                f'tpl;dur={g.get("_metrics_render_time", 0.0) * 1000:.1f}, '
+                f'total;dur={duration * 1000:.1f}'
+            )
+            g._metrics_status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        queries = g.pop('_metrics_queries', 0)
+        db_time = g.pop('_metrics_db_time', 0.0)
+        render_time = g.pop('_metrics_render_time', 0.0)
+        status = g.pop('_metrics_status', 500)
+        endpoint = request.endpoint or 'unknown'
+        over_budget = queries > self.query_budget
+        if over_budget:
+            logger.warning('Query budget exceeded: %s %s ran %d queries (budget %d)',
+                           request.method, request.path, queries, self.query_budget)
+        self.registry.request_finished(endpoint, request.method, status, duration, queries, db_time, over_budget,
+                                       render_time)
+        self._maybe_flush()
+
+    # ----- Multi-worker -----
+
+    def _path(self, pid=None):
+        return os.path.join(self.directory, f'{pid or os.getpid()}.json')
+
+    def _maybe_flush(self, force=False):
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        if not self._flush_lock.acquire(blocking=force):
+            return
+        try:
+            self._last_flush = now
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.registry.snapshot(), f)
+            os.replace(tmp_path, self._path())
+        except OSError as e:
+            logger.warning('Could not write metrics snapshot: %s', e)
+        finally:
+            self._flush_lock.release()
+
+    def collect(self):
+        """Snapshot đã cộng dồn của mọi worker (hoặc chỉ tiến trình này)"""
+        if not self.directory:
+            return merge([self.registry.snapshot()])
+        self._maybe_flush(force=True)
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return merge(snapshots)
+
+    def response(self):
+        return Response(render(self.collect()), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,233 @@
+"""Migration schema có đánh số phiên bản.
+
+``db.create_all()`` chỉ tạo bảng còn thiếu, không bao giờ sửa bảng đã có. Các
+thay đổi schema cho database đang chạy (SQLite hoặc PostgreSQL) được khai báo
+ở đây bằng decorator ``@migration(version, description)`` và được áp dụng theo
+thứ tự bởi ``upgrade()``. Phiên bản đã áp dụng được lưu trong bảng
+``schema_version``. Mỗi migration chạy trong một transaction riêng và nên
+idempotent (ví dụ ``CREATE INDEX IF NOT EXISTS``) để an toàn với database vừa
+được tạo bởi ``create_all()``.
+
+Bảng mới hoàn toàn không được tạo ở đây: ``upgrade()`` luôn được gọi sau
+``db.create_all()`` (``init_db()`` và ``flask migrate``), nên migration chỉ
+thêm cột, chỉ mục và backfill dữ liệu vào các bảng đó.
+"""
+from datetime import datetime
+import logging
+import re
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+# Khóa advisory của PostgreSQL để các worker không chạy migration cùng lúc
+_PG_LOCK_ID = 4211337
+
+
+def migration(version, description):
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def _ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_version ('
+            ' version INTEGER PRIMARY KEY,'
+            ' description VARCHAR(200) NOT NULL,'
+            ' applied_at TIMESTAMP NOT NULL)'
+        ))
+
+
+def applied_versions(engine):
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text('SELECT version FROM schema_version'))}
+
+
+def status(engine):
+    """Danh sách (version, description, applied) của mọi migration"""
+    applied = applied_versions(engine)
+    return [(version, description, version in applied) for version, description, _ in MIGRATIONS]
+
+
+def upgrade(engine, target=None):
+    """Áp dụng các migration chưa chạy, trả về danh sách phiên bản vừa áp dụng"""
+    applied = applied_versions(engine)
+    done = []
+    for version, description, fn in MIGRATIONS:
+        if version in applied or (target is not None and version > target):
+            continue
+        try:
+            with engine.begin() as conn:
+                if conn.dialect.name == 'postgresql':
+                    conn.execute(text('SELECT pg_advisory_xact_lock(:id)'), {'id': _PG_LOCK_ID})
+                    if conn.execute(text('SELECT 1 FROM schema_version WHERE version = :v'),
+                                    {'v': version}).scalar():
+                        continue
+                fn(conn)
+                conn.execute(
+                    text('INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)'),
+                    {'v': version, 'd': description, 't': datetime.utcnow()}
+                )
+        except IntegrityError:
+            # Một worker khác đã áp dụng migration này trước
+            continue
+        logger.info('Applied migration %s: %s', version, description)
+        done.append(version)
+    return done
+
+
+def _create_index(conn, name, table, columns, unique=False):
+    cols = ', '.join(f'"{column}"' for column in columns)
+    conn.execute(text(
+        f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS {name} ON "{table}" ({cols})'
+    ))
+
+
+def _add_column(conn, table, column, ddl_type):
+    """ALTER TABLE ADD COLUMN nếu cột chưa có (bảng vừa tạo bởi create_all() đã có sẵn)"""
+    if column in {c['name'] for c in inspect(conn).get_columns(table)}:
+        return False
+    conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {ddl_type}'))
+    return True
+
+
+# ==================== MIGRATIONS ====================
+
+@migration(1, 'Add indexes for hot query paths')
+def add_hot_path_indexes(conn):
+    _create_index(conn, 'ix_cart_item_user_id_product_id', 'cart_item', ['user_id', 'product_id'])
+    _create_index(conn, 'ix_order_user_id', 'order', ['user_id'])
+    _create_index(conn, 'ix_order_status', 'order', ['status'])
+    _create_index(conn, 'ix_order_item_order_id', 'order_item', ['order_id'])
+    _create_index(conn, 'ix_order_item_product_id', 'order_item', ['product_id'])
+    _create_index(conn, 'ix_product_created_at_id', 'product', ['created_at', 'id'])
+
+
+@migration(2, 'Add product.updated_at for HTTP validators')
+def add_product_updated_at(conn):
+    ddl_type = 'DATETIME' if conn.dialect.name == 'sqlite' else 'TIMESTAMP'
+    if _add_column(conn, 'product', 'updated_at', ddl_type):
+        conn.execute(text('UPDATE product SET updated_at = created_at'))
+    _create_index(conn, 'ix_product_updated_at', 'product', ['updated_at'])
+
+
+@migration(3, 'Add inventory ledger and per-product stock counters')
+def add_inventory_ledger(conn):
+    # Bảng inventory_movement do create_all() tạo; ở đây thêm bộ đếm và ghi tồn đầu kỳ vào sổ
+    added = _add_column(conn, 'product', 'units_in', 'INTEGER NOT NULL DEFAULT 0')
+    added = _add_column(conn, 'product', 'units_out', 'INTEGER NOT NULL DEFAULT 0') or added
+    _create_index(conn, 'ix_inventory_movement_product_id_id', 'inventory_movement', ['product_id', 'id'])
+    _create_index(conn, 'ix_inventory_movement_order_id', 'inventory_movement', ['order_id'])
+    if added:
+        backfill_inventory_ledger(conn)
+
+
+def backfill_inventory_ledger(conn):
+    """Dựng sổ kho từ dữ liệu sẵn có: một dòng tồn đầu kỳ cho mỗi sản phẩm và một dòng
+    xuất cho mỗi dòng đơn hàng, rồi đặt units_in / units_out khớp với sổ.
+
+    Dùng cho database có từ trước khi có sổ kho, giả định sổ đang trống.
+    """
+    # Đã bán = tổng các dòng đơn hàng; đã nhập = tồn hiện tại + đã bán
+    conn.execute(text(
+        'UPDATE product SET units_out = COALESCE('
+        '(SELECT SUM(quantity) FROM order_item WHERE order_item.product_id = product.id), 0)'
+    ))
+    conn.execute(text('UPDATE product SET units_in = COALESCE(quantity, 0) + units_out'))
+    conn.execute(text(
+        "INSERT INTO inventory_movement (product_id, delta, reason, created_at)"
+        " SELECT id, units_in, 'opening', COALESCE(created_at, CURRENT_TIMESTAMP) FROM product WHERE units_in <> 0"
+    ))
+    conn.execute(text(
+        "INSERT INTO inventory_movement (product_id, delta, reason, order_id, user_id, created_at)"
+        " SELECT order_item.product_id, -order_item.quantity, 'sale', order_item.order_id, \"order\".user_id,"
+        " \"order\".created_at FROM order_item JOIN \"order\" ON \"order\".id = order_item.order_id"
+        " WHERE order_item.quantity <> 0 ORDER BY order_item.id"
+    ))
+
+
+@migration(4, 'Add keyset indexes for order history')
+def add_order_keyset_indexes(conn):
+    _create_index(conn, 'ix_order_user_id_id', 'order', ['user_id', 'id'])
+    _create_index(conn, 'ix_order_status_id', 'order', ['status', 'id'])
+    # Cột đầu của hai chỉ mục trên đã phục vụ mọi truy vấn chỉ lọc theo user_id / status
+    conn.execute(text('DROP INDEX IF EXISTS ix_order_user_id'))
+    conn.execute(text('DROP INDEX IF EXISTS ix_order_status'))
+
+
+@migration(5, 'Add daily sales rollups')
+def add_sales_rollups(conn):
+    # Bảng sales_rollup do create_all() tạo; tính từ đơn hàng sẵn có nếu bảng còn trống
+    if conn.execute(text('SELECT 1 FROM sales_rollup LIMIT 1')).first() is None:
+        backfill_sales_rollups(conn)
+
+
+def backfill_sales_rollups(conn):
+    """Gom mọi dòng đơn hàng vào sales_rollup theo (ngày, sản phẩm, trạng thái), giả định bảng đang trống"""
+    conn.execute(text(
+        'INSERT INTO sales_rollup (day, product_id, status, order_lines, units, revenue)'
+        ' SELECT date("order".created_at), order_item.product_id, "order".status,'
+        ' COUNT(*), SUM(order_item.quantity), SUM(order_item.quantity * order_item.price)'
+        ' FROM order_item JOIN "order" ON "order".id = order_item.order_id'
+        ' WHERE "order".created_at IS NOT NULL'
+        ' GROUP BY date("order".created_at), order_item.product_id, "order".status'
+    ))
+
+
+@migration(6, 'Add background job queue')
+def add_job_queue(conn):
+    # Bảng job (kèm ràng buộc duy nhất của idempotency_key) do create_all() tạo
+    _create_index(conn, 'ix_job_status_run_at', 'job', ['status', 'run_at'])
+
+
+@migration(7, 'Make cart lines unique per user and product')
+def add_cart_unique_index(conn):
+    # Gộp các dòng trùng (cùng người dùng, cùng sản phẩm) vào dòng cũ nhất trước khi thêm ràng buộc
+    conn.execute(text(
+        'UPDATE cart_item SET quantity = (SELECT SUM(other.quantity) FROM cart_item other'
+        ' WHERE other.user_id = cart_item.user_id AND other.product_id = cart_item.product_id)'
+        ' WHERE user_id IS NOT NULL AND id IN (SELECT MIN(id) FROM cart_item GROUP BY user_id, product_id HAVING COUNT(*) > 1)'
+    ))
+    conn.execute(text(
+        'DELETE FROM cart_item WHERE user_id IS NOT NULL AND id NOT IN'
+        ' (SELECT MIN(id) FROM cart_item GROUP BY user_id, product_id)'
+    ))
+    _create_index(conn, 'uq_cart_item_user_id_product_id', 'cart_item', ['user_id', 'product_id'], unique=True)
+    conn.execute(text('DROP INDEX IF EXISTS ix_cart_item_user_id_product_id'))
+
+
+@migration(8, 'Add uploaded product images')
+def add_product_images(conn):
+    _add_column(conn, 'product', 'image_key', 'VARCHAR(40)')
+    _add_column(conn, 'product', 'image_widths', 'VARCHAR(64)')
+
+
+@migration(9, 'Keep inventory ledger rows of deleted products')
+def make_movement_product_nullable(conn):
+    # Xóa sản phẩm đặt product_id của các dòng sổ kho về NULL thay vì xóa các dòng đó
+    if conn.dialect.name != 'sqlite':
+        conn.execute(text('ALTER TABLE inventory_movement ALTER COLUMN product_id DROP NOT NULL'))
+        return
+    columns = {column['name']: column for column in inspect(conn).get_columns('inventory_movement')}
+    if columns['product_id']['nullable']:
+        return
+    # SQLite không sửa được ràng buộc của cột: dựng lại bảng với cùng dữ liệu và chỉ mục
+    indexes = inspect(conn).get_indexes('inventory_movement')
+    create_sql = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'inventory_movement'"
+    )).scalar()
+    create_sql = re.sub(r'(product_id\s+INTEGER)\s+NOT NULL', r'\1', create_sql, count=1)
+    conn.execute(text('ALTER TABLE inventory_movement RENAME TO inventory_movement_old'))
+    conn.execute(text(create_sql))
+    conn.execute(text('INSERT INTO inventory_movement SELECT * FROM inventory_movement_old'))
+    conn.execute(text('DROP TABLE inventory_movement_old'))
+    for index in indexes:
+        _create_index(conn, index['name'], 'inventory_movement', index['column_names'], unique=index['unique'])
@@ -0,0 +1,146 @@
+"""Băm mật khẩu trong một pool giới hạn và chặn sớm các lượt đăng nhập dồn dập.
+
+Mỗi lần băm PBKDF2 / scrypt tốn hàng trăm ms CPU. Nếu chạy thẳng trong thread
+gthread, một loạt đăng nhập (hay một đợt credential stuffing) chiếm hết các
+slot và mọi request xem hàng phải xếp hàng chờ. Module này gồm:
+
+- ``Hasher``: chạy việc băm trong một ThreadPoolExecutor nhỏ và giới hạn số
+  việc đang chờ; khi đầy thì ném ``HasherBusy`` ngay để route trả 503 thay vì
+  giữ thread. Tham số băm cấu hình bằng ``PASSWORD_HASH_METHOD`` và
+  ``needs_rehash()`` cho biết hash cũ cần được băm lại khi đăng nhập.
+- ``RateLimiter``: token bucket trong bộ nhớ theo khóa (IP, username), được
+  kiểm tra trước khi chạm tới database hay hàm băm; hết token thì route trả 429.
+
+Cả hai nằm trong bộ nhớ của từng worker gunicorn, nên giới hạn thực tế của cả
+dịch vụ là giá trị cấu hình nhân với ``WEB_CONCURRENCY``.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import cached_property
+import os
+import threading
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Pool băm mật khẩu đã đầy (hoặc quá thời gian chờ)"""
+
+
+class Hasher:
+    """Băm / kiểm tra mật khẩu trong tối đa ``workers`` thread, nhận thêm tối đa ``queue`` việc chờ.
+
+    ``workers=0`` băm ngay trong thread của request (không giới hạn), như trước đây.
+    """
+
+    def __init__(self, method='pbkdf2', salt_length=16, workers=1, queue=2, timeout=10):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self.queue = queue
+        self.timeout = timeout
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._reset()
+        # Thread của pool không tồn tại sau fork (gunicorn preload_app): tạo lại khi cần trong tiến trình con
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(max(1, self.workers + self.queue))
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            return self._pool
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HasherBusy()
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self.rejected += 1
+            raise HasherBusy() from None
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def check(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    @cached_property
+    def method_id(self):
+        """Tiền tố ``<method>:<tham số>`` mà werkzeug ghi vào hash với cấu hình hiện tại"""
+        return generate_password_hash('', self.method, self.salt_length).split('$', 1)[0]
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method_id
+
+    def warmup(self):
+        """Tính trước ``method_id`` (một lần băm) để lần đăng nhập đầu tiên không phải trả"""
+        return self.method_id
+
+
+# ==================== RATE LIMIT ====================
+
+def parse_rate(value):
+    """``"10/60"`` -> (10, 60.0): 10 lượt mỗi 60 giây. Chuỗi rỗng hoặc ``0`` -> None (tắt)."""
+    value = (value or '').strip()
+    if not value or value == '0':
+        return None
+    count, _, seconds = value.partition('/')
+    return int(count), float(seconds or 60)
+
+
+class RateLimiter:
+    """Token bucket: mỗi khóa có tối đa ``capacity`` token, hồi lại đủ sau ``per_seconds`` giây.
+
+    Số khóa được giới hạn bằng LRU để một đợt tấn công với rất nhiều username
+    khác nhau không làm phình bộ nhớ.
+    """
+
+    def __init__(self, capacity, per_seconds, max_keys=10000):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, value, max_keys=10000):
+        rate = parse_rate(value)
+        return cls(*rate, max_keys=max_keys) if rate else None
+
+    def hit(self, key):
+        """Lấy một token; trả về 0 nếu được phép, ngược lại số giây phải chờ tới token kế tiếp"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                retry_after = 0
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / self.rate
+                self.rejected += 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return retry_after
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
@@ -0,0 +1,152 @@
+"""Chỉ mục tìm kiếm toàn văn cho sản phẩm.
+
+- SQLite: bảng ảo FTS5 ``product_fts`` (rowid = product.id), xếp hạng bằng bm25.
+- PostgreSQL: bảng ``product_search`` chứa cột ``tsvector`` có chỉ mục GIN,
+  xếp hạng bằng ts_rank_cd.
+
+Văn bản được "gấp dấu" (bỏ dấu tiếng Việt, đ -> d) trước khi đưa vào chỉ mục
+và trước khi truy vấn, nên "điện thoại", "dien thoai" và "dien tho" đều khớp.
+Ứng dụng tự đồng bộ chỉ mục trong cùng transaction với thao tác ghi sản phẩm.
+"""
+import re
+import unicodedata
+
+from sqlalchemy import text
+
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+MAX_TERMS = 8
+
+
+def fold(value):
+    """Chuyển về chữ thường và bỏ dấu tiếng Việt"""
+    value = (value or '').lower().replace('đ', 'd')
+    value = unicodedata.normalize('NFD', value)
+    return ''.join(c for c in value if not unicodedata.combining(c))
+
+
+def terms(query):
+    """Tách chuỗi tìm kiếm thành các từ đã gấp dấu"""
+    return re.findall(r'\w+', fold(query))[:MAX_TERMS]
+
+
+def _dialect(session):
+    return session.get_bind().dialect.name
+
+
+def ensure_index(session):
+    """Tạo chỉ mục nếu chưa có. Trả về True nếu vừa tạo mới (cần rebuild)."""
+    if _dialect(session) == 'postgresql':
+        exists = session.execute(text("SELECT to_regclass('product_search')")).scalar()
+        if exists:
+            return False
+        session.execute(text(
+            "CREATE TABLE product_search ("
+            " product_id INTEGER PRIMARY KEY REFERENCES product(id) ON DELETE CASCADE,"
+            " document tsvector NOT NULL)"
+        ))
+        session.execute(text(
+            "CREATE INDEX ix_product_search_document ON product_search USING GIN (document)"
+        ))
+        return True
+
+    exists = session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'"
+    )).scalar()
+    if exists:
+        return False
+    session.execute(text(
+        "CREATE VIRTUAL TABLE product_fts USING fts5(name, description, tokenize='unicode61')"
+    ))
+    return True
+
+
+def index_product(session, product_id, name, description):
+    """Thêm hoặc cập nhật một sản phẩm trong chỉ mục"""
+    params = {'id': product_id, 'name': fold(name), 'description': fold(description)}
+    if _dialect(session) == 'postgresql':
+        session.execute(text(
+            "INSERT INTO product_search (product_id, document) VALUES (:id,"
+            " setweight(to_tsvector('simple', :name), 'A') ||"
+            " setweight(to_tsvector('simple', :description), 'B'))"
+            " ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document"
+        ), params)
+    else:
+        session.execute(text("DELETE FROM product_fts WHERE rowid = :id"), params)
+        session.execute(text(
+            "INSERT INTO product_fts (rowid, name, description) VALUES (:id, :name, :description)"
+        ), params)
+
+
+def remove_product(session, product_id):
+    if _dialect(session) == 'postgresql':
+        session.execute(text("DELETE FROM product_search WHERE product_id = :id"), {'id': product_id})
+    else:
+        session.execute(text("DELETE FROM product_fts WHERE rowid = :id"), {'id': product_id})
+
+
+def rebuild(session, rows, batch_size=1000):
+    """Xây lại toàn bộ chỉ mục từ các dòng (id, name, description)"""
+    if _dialect(session) == 'postgresql':
+        session.execute(text("DELETE FROM product_search"))
+    else:
+        session.execute(text("DELETE FROM product_fts"))
+    return index_products(session, rows, batch_size)
+
+
+def index_products(session, rows, batch_size=1000):
+    """Thêm hàng loạt các sản phẩm mới (chưa có trong chỉ mục) từ các dòng (id, name, description)"""
+    if _dialect(session) == 'postgresql':
+        insert = text(
+            "INSERT INTO product_search (product_id, document) VALUES (:id,"
+            " setweight(to_tsvector('simple', :name), 'A') ||"
+            " setweight(to_tsvector('simple', :description), 'B'))"
+        )
+    else:
+        insert = text("INSERT INTO product_fts (rowid, name, description) VALUES (:id, :name, :description)")
+
+    count = 0
+    batch = []
+    for product_id, name, description in rows:
+        batch.append({'id': product_id, 'name': fold(name), 'description': fold(description)})
+        if len(batch) >= batch_size:
+            session.execute(insert, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        session.execute(insert, batch)
+        count += len(batch)
+    return count
+
+
+def search(session, query, limit=20, offset=0):
+    """Tìm sản phẩm, trả về danh sách (product_id, rank) theo độ liên quan giảm dần.
+
+    Mỗi từ được khớp theo tiền tố và mọi từ đều phải xuất hiện.
+    """
+    words = terms(query)
+    if not words:
+        return []
+
+    if _dialect(session) == 'postgresql':
+        rows = session.execute(text(
+            "SELECT product_id, ts_rank_cd(document, q) AS rank"
+            " FROM product_search, to_tsquery('simple', :q) AS q"
+            " WHERE document @@ q"
+            " ORDER BY rank DESC, product_id LIMIT :limit OFFSET :offset"
+        ), {'q': ' & '.join(f'{word}:*' for word in words), 'limit': limit, 'offset': offset})
+        return [(product_id, float(rank)) for product_id, rank in rows]
+
+    rows = session.execute(text(
+        "SELECT rowid, bm25(product_fts, :name_weight, :description_weight) AS rank"
+        " FROM product_fts WHERE product_fts MATCH :q"
+        " ORDER BY rank, rowid LIMIT :limit OFFSET :offset"
+    ), {
+        'q': ' '.join(f'"{word}"*' for word in words),
+        'name_weight': NAME_WEIGHT,
+        'description_weight': DESCRIPTION_WEIGHT,
+        'limit': limit,
+        'offset': offset
+    })
+    # bm25 trả về số âm, càng nhỏ càng liên quan
+    return [(product_id, -float(rank)) for product_id, rank in rows]
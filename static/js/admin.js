@@ -0,0 +1,443 @@
+// Tab Management
+function switchTab(tabName) {
+    // Hide all tabs
+    document.querySelectorAll('[id$="-tab"]').forEach(tab => {
+        tab.style.display = 'none';
+    });
+    
+    // Deactivate all buttons
+    document.querySelectorAll('.admin-tab-btn').forEach(btn => {
+        btn.classList.remove('active');
+    });
+    
+    // Show selected tab
+    document.getElementById(tabName + '-tab').style.display = 'block';
+    event.target.classList.add('active');
+}
+
+// Inventory Management
+function submitInventoryAdjustment() {
+    const productId = document.getElementById('adjustProduct').value;
+    const quantity = document.getElementById('adjustQuantity').value;
+    
+    if (!productId || !quantity) {
+        showToast('⚠️ Vui lòng chọn sản phẩm và nhập số lượng', 'error');
+        return;
+    }
+    
+    const formData = new FormData();
+    formData.append('product_id', productId);
+    formData.append('type', 'in');
+    formData.append('quantity', quantity);
+    
+    fetch('/admin/adjust-inventory', {
+        method: 'POST',
+        body: formData
+    })
+    .then(res => res.json())
+    .then(data => {
+        if (data.success) {
+            showToast('✓ ' + data.message, 'success');
+            document.getElementById('inventoryAdjustmentForm').reset();
+            setTimeout(() => location.reload(), 1200);
+        } else {
+            showToast('❌ ' + data.message, 'error');
+        }
+    })
+    .catch(err => {
+        showToast('❌ Lỗi: ' + err.message, 'error');
+    });
+}
+
+// Edit Modal Functions
+function openEditModal(productId) {
+    const modal = document.getElementById('editProductModal');
+    const submitBtn = document.getElementById('submitEditBtn');
+    
+    submitBtn.disabled = true;
+    submitBtn.innerHTML = '<span class="spinner"></span>Đang tải...';
+    
+    fetch(`/admin/product/${productId}`)
+        .then(response => response.ok ? response.json() : null)
+        .then(data => {
+            if (data) {
+                document.getElementById('editProductId').value = data.id;
+                document.getElementById('editName').value = data.name;
+                document.getElementById('editPrice').value = data.price;
+                document.getElementById('editQuantity').value = data.quantity;
+                document.getElementById('editDescription').value = data.description || '';
+                document.getElementById('editImageUrl').value = data.image_url || '';
+            } else {
+                loadProductFromTable(productId);
+            }
+            submitBtn.disabled = false;
+            submitBtn.innerHTML = '💾 Lưu Thay Đổi';
+            modal.classList.add('show');
+            clearErrors();
+        })
+        .catch(error => {
+            console.warn('Error:', error);
+            loadProductFromTable(productId);
+            submitBtn.disabled = false;
+            submitBtn.innerHTML = '💾 Lưu Thay Đổi';
+            modal.classList.add('show');
+        });
+}
+
+function loadProductFromTable(productId) {
+    const row = document.querySelector(`button[onclick*="openEditModal(${productId})"]`).closest('tr');
+    const cells = row.querySelectorAll('td');
+    
+    document.getElementById('editProductId').value = productId;
+    document.getElementById('editName').value = cells[1].querySelector('strong').textContent;
+    document.getElementById('editPrice').value = cells[2].textContent.replace(/[^\d.]/g, '');
+    document.getElementById('editQuantity').value = cells[3].textContent.trim();
+}
+
+function closeEditModal() {
+    const modal = document.getElementById('editProductModal');
+    modal.classList.remove('show');
+    document.getElementById('editProductForm').reset();
+    clearErrors();
+}
+
+function clearErrors() {
+    document.querySelectorAll('.form-error').forEach(el => el.textContent = '');
+    document.querySelectorAll('#editProductForm input, #editProductForm textarea').forEach(el => {
+        el.classList.remove('error');
+    });
+}
+
+function validateForm() {
+    clearErrors();
+    let isValid = true;
+    
+    const name = document.getElementById('editName').value.trim();
+    const price = document.getElementById('editPrice').value.trim();
+    const quantity = document.getElementById('editQuantity').value.trim();
+    
+    if (!name) {
+        showError('editName', 'Tên sản phẩm không được để trống');
+        isValid = false;
+    }
+    
+    if (!price || isNaN(price) || parseFloat(price) < 0) {
+        showError('editPrice', 'Giá phải là số dương');
+        isValid = false;
+    }
+    
+    if (!quantity || isNaN(quantity) || parseInt(quantity) < 0) {
+        showError('editQuantity', 'Số lượng phải là số không âm');
+        isValid = false;
+    }
+    
+    return isValid;
+}
+
+function showError(fieldId, message) {
+    const field = document.getElementById(fieldId);
+    field.classList.add('error');
+    const errorSpan = field.parentElement.querySelector('.form-error');
+    if (errorSpan) errorSpan.textContent = message;
+}
+
+function submitEditProduct() {
+    if (!validateForm()) return;
+    
+    const productId = document.getElementById('editProductId').value;
+    const submitBtn = document.getElementById('submitEditBtn');
+    
+    submitBtn.disabled = true;
+    submitBtn.innerHTML = '<span class="spinner"></span>Đang lưu...';
+    
+    const formData = new FormData();
+    formData.append('name', document.getElementById('editName').value.trim());
+    formData.append('price', document.getElementById('editPrice').value.trim());
+    formData.append('quantity', document.getElementById('editQuantity').value.trim());
+    formData.append('description', document.getElementById('editDescription').value.trim());
+    formData.append('image_url', document.getElementById('editImageUrl').value.trim());
+    const imageFile = document.getElementById('editImageFile').files[0];
+    if (imageFile) formData.append('image_file', imageFile);
+    
+    fetch(`/admin/update-product/${productId}`, {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showToast('✓ ' + data.message, 'success');
+            closeEditModal();
+            setTimeout(() => location.reload(), 1200);
+        } else {
+            showToast('❌ ' + data.message, 'error');
+            submitBtn.disabled = false;
+            submitBtn.innerHTML = '💾 Lưu Thay Đổi';
+        }
+    })
+    .catch(error => {
+        showToast('❌ Lỗi: ' + error.message, 'error');
+        submitBtn.disabled = false;
+        submitBtn.innerHTML = '💾 Lưu Thay Đổi';
+    });
+}
+
+// Delete Product
+function deleteProduct(productId) {
+    showConfirmDialog(
+        '⚠️ Xóa Sản Phẩm',
+        'Bạn chắc chắn muốn xóa sản phẩm này không?\nHành động này không thể hoàn tác!',
+        () => performDelete(productId)
+    );
+}
+
+function performDelete(productId) {
+    const btn = document.querySelector(`button[onclick="deleteProduct(${productId})"]`);
+    btn.disabled = true;
+    btn.innerHTML = '<span class="spinner"></span>Xóa...';
+    
+    fetch(`/admin/delete-product/${productId}`, { method: 'POST' })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                showToast('✓ ' + data.message, 'success');
+                setTimeout(() => location.reload(), 1200);
+            } else {
+                showToast('❌ ' + data.message, 'error');
+                btn.disabled = false;
+                btn.innerHTML = '🗑️ Xóa';
+            }
+        })
+        .catch(error => {
+            showToast('❌ Lỗi: ' + error.message, 'error');
+            btn.disabled = false;
+            btn.innerHTML = '🗑️ Xóa';
+        });
+}
+
+// Order Management
+function updateOrderStatus(orderId, status) {
+    const select = event.target;
+    select.disabled = true;
+    
+    const formData = new FormData();
+    formData.append('status', status);
+    
+    fetch(`/admin/update-order-status/${orderId}`, {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showToast('✓ ' + data.message, 'success');
+        } else {
+            showToast('❌ ' + data.message, 'error');
+            location.reload();
+        }
+    })
+    .catch(error => {
+        showToast('❌ Lỗi', 'error');
+        location.reload();
+    })
+    .finally(() => select.disabled = false);
+}
+
+function viewOrder(orderId) {
+    fetch(`/admin/order/${orderId}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                let msg = `📦 ĐƠN HÀNG #${orderId}\n`;
+                msg += '━━━━━━━━━━━━━━━━━━━━━━\n';
+                data.items.forEach((item, i) => {
+                    msg += `${i+1}. ${item.product_name}\n`;
+                    msg += `   📊 ${item.quantity}x |💰 ${item.price}₫\n`;
+                });
+                msg += '━━━━━━━━━━━━━━━━━━━━━━\n';
+                msg += `💵 TỔNG: ${data.total}₫`;
+                alert(msg);
+            } else {
+                showToast('❌ Không tìm thấy đơn hàng', 'error');
+            }
+        })
+        .catch(error => showToast('❌ Lỗi', 'error'));
+}
+
+// Paginated Tables: tải trang tiếp theo khi cuộn tới cuối bảng
+function loadMoreRows(container, replace = false) {
+    if (container.dataset.loading || (!replace && !container.dataset.next)) return;
+    container.dataset.loading = '1';
+    
+    const params = new URLSearchParams();
+    if (!replace) params.set('before', container.dataset.next);
+    if (container.dataset.status) params.set('status', container.dataset.status);
+    
+    fetch(`${container.dataset.url}?${params}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                showToast('❌ ' + data.message, 'error');
+                return;
+            }
+            const body = document.getElementById(container.dataset.target);
+            if (replace) body.innerHTML = '';
+            body.insertAdjacentHTML('beforeend', data.html);
+            container.dataset.next = data.next_before || '';
+            container.style.display = data.next_before ? '' : 'none';
+        })
+        .catch(error => showToast('❌ Lỗi: ' + error.message, 'error'))
+        .finally(() => delete container.dataset.loading);
+}
+
+function filterOrders(status) {
+    const container = document.getElementById('ordersLoadMore');
+    container.dataset.status = status;
+    const link = document.getElementById('exportOrdersLink');
+    link.href = link.href.split('?')[0] + (status ? `?status=${status}` : '');
+    loadMoreRows(container, true);
+}
+
+// Sales Report
+function loadSalesReport() {
+    const params = new URLSearchParams({ granularity: document.getElementById('salesGranularity').value });
+    const from = document.getElementById('salesFrom').value;
+    const to = document.getElementById('salesTo').value;
+    if (from) params.set('from', from);
+    if (to) params.set('to', to);
+    
+    fetch(`/admin/reports/sales?${params}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                showToast('❌ ' + data.message, 'error');
+                return;
+            }
+            const format = value => Math.round(value).toLocaleString('vi-VN');
+            const rows = data.report.series.map(row =>
+                `<tr><td>${row.period}</td><td>${format(row.units)}</td><td>${format(row.revenue)}₫</td></tr>`);
+            const totals = data.report.totals;
+            rows.push(`<tr><td><strong>Tổng</strong></td><td><strong>${format(totals.units)}</strong></td>` +
+                      `<td><strong>${format(totals.revenue)}₫</strong></td></tr>`);
+            document.getElementById('salesReportBody').innerHTML = rows.join('');
+        })
+        .catch(error => showToast('❌ Lỗi: ' + error.message, 'error'));
+}
+
+// Toast Notifications
+function showToast(message, type = 'success') {
+    let container = document.getElementById('toastContainer');
+    if (!container) {
+        container = document.createElement('div');
+        container.id = 'toastContainer';
+        container.className = 'toast-container';
+        document.body.appendChild(container);
+    }
+    
+    const toast = document.createElement('div');
+    toast.className = `toast ${type}`;
+    toast.innerHTML = `<span>${message}</span>`;
+    container.appendChild(toast);
+    
+    setTimeout(() => {
+        toast.classList.add('removing');
+        setTimeout(() => toast.remove(), 300);
+    }, 3500);
+}
+
+// Bulk Import
+function importProducts() {
+    const input = document.getElementById('importFile');
+    if (!input.files.length) {
+        showToast('⚠️ Vui lòng chọn file CSV hoặc JSON Lines', 'error');
+        return;
+    }
+    
+    const btn = document.getElementById('importProductsBtn');
+    btn.disabled = true;
+    btn.textContent = '⏳ Đang nhập...';
+    
+    const formData = new FormData();
+    formData.append('file', input.files[0]);
+    
+    fetch('/admin/import-products', {
+        method: 'POST',
+        body: formData
+    })
+    .then(res => res.json())
+    .then(data => {
+        const lines = (data.errors || []).slice(0, 5).map(e => `Dòng ${e.line}: ${e.errors.join(', ')}`);
+        showToast(`${data.success ? '✅' : '⚠️'} ${data.message}${lines.length ? '<br>' + lines.join('<br>') : ''}`,
+                  data.success ? 'success' : 'error');
+        if (data.imported) {
+            setTimeout(() => location.reload(), 1500);
+        }
+    })
+    .catch(err => {
+        console.error('Error:', err);
+        showToast('❌ Có lỗi xảy ra khi nhập sản phẩm', 'error');
+    })
+    .finally(() => {
+        btn.disabled = false;
+        btn.textContent = '📥 Nhập Sản Phẩm';
+    });
+}
+
+// Confirm Dialog
+function showConfirmDialog(title, message, onConfirm) {
+    let modal = document.getElementById('customConfirmModal');
+    if (!modal) {
+        modal = document.createElement('div');
+        modal.id = 'customConfirmModal';
+        modal.className = 'confirm-modal';
+        modal.innerHTML = `
+            <div class="confirm-content">
+                <div class="confirm-icon"></div>
+                <h3 id="confirmTitle"></h3>
+                <p id="confirmMessage"></p>
+                <div class="confirm-actions">
+                    <button class="btn-cancel" id="confirmCancel">Hủy</button>
+                    <button class="btn-confirm" id="confirmConfirm">Xác Nhận</button>
+                </div>
+            </div>
+        `;
+        document.body.appendChild(modal);
+    }
+    
+    document.querySelector('#customConfirmModal .confirm-icon').textContent = title.split(' ')[0];
+    document.getElementById('confirmTitle').textContent = title;
+    document.getElementById('confirmMessage').textContent = message;
+    
+    document.getElementById('confirmConfirm').onclick = () => {
+        modal.classList.remove('show');
+        setTimeout(onConfirm, 300);
+    };
+    
+    document.getElementById('confirmCancel').onclick = () => modal.classList.remove('show');
+    
+    modal.onclick = (e) => e.target === modal && modal.classList.remove('show');
+    modal.classList.add('show');
+}
+
+// Event Listeners
+document.addEventListener('DOMContentLoaded', function() {
+    if ('IntersectionObserver' in window) {
+        const observer = new IntersectionObserver(entries => {
+            entries.forEach(entry => entry.isIntersecting && loadMoreRows(entry.target));
+        }, { rootMargin: '200px' });
+        document.querySelectorAll('.load-more').forEach(el => observer.observe(el));
+    }
+    
+    const editModal = document.getElementById('editProductModal');
+    if (editModal) {
+        editModal.addEventListener('click', function(e) {
+            if (e.target === this) closeEditModal();
+        });
+    }
+    
+    document.addEventListener('keydown', function(e) {
+        if (e.key === 'Escape' && editModal.classList.contains('show')) {
+            closeEditModal();
+        }
+    });
+});
@@ -0,0 +1,68 @@
+"""Tăng tốc render Jinja: bytecode cache dùng chung và cache từng đoạn template.
+
+- Bytecode cache: template đã biên dịch được ghi ra ``TEMPLATE_CACHE_DIR``
+  (mặc định thư mục tạm của Jinja), nên mọi worker gunicorn và lần khởi động
+  sau chỉ cần nạp bytecode thay vì biên dịch lại ``layout.html`` hay
+  ``admin.html``. Khóa gồm checksum của source, sửa template là tự biên dịch lại.
+- Thẻ ``{% cache %}``: cache HTML của một đoạn template trong cache của ứng
+  dụng, khóa là các giá trị sau tên thẻ. Đưa phiên bản dữ liệu vào khóa (ví
+  dụ ``product.updated_at``) để đoạn cache tự hết hiệu lực khi dữ liệu đổi::
+
+      {% cache 'product-card', product.id, product.updated_at %}
+          ...
+      {% endcache %}
+"""
+import logging
+import os
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+logger = logging.getLogger(__name__)
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None, fragment_cache_ttl=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_render_cached', [nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = 'fragment:' + ':'.join(str(part) for part in parts)
+        html = cache.get(key)
+        if html is None:
+            html = str(caller())
+            cache.set(key, html, ttl=self.environment.fragment_cache_ttl)
+        # Nội dung đã được escape khi render lần đầu
+        return Markup(html)
+
+
+def init_app(app, fragment_cache=None, fragment_ttl=None, bytecode_dir=''):
+    """Gắn thẻ ``{% cache %}`` và bytecode cache vào ``app.jinja_env``.
+
+    ``fragment_cache=None`` vẫn nhận thẻ nhưng luôn render lại; ``bytecode_dir=None``
+    tắt bytecode cache, chuỗi rỗng dùng thư mục tạm mặc định của Jinja.
+    """
+    env = app.jinja_env
+    env.add_extension(FragmentCacheExtension)
+    env.fragment_cache = fragment_cache
+    env.fragment_cache_ttl = fragment_ttl
+    if bytecode_dir is not None:
+        if bytecode_dir:
+            os.makedirs(bytecode_dir, exist_ok=True)
+        env.bytecode_cache = FileSystemBytecodeCache(bytecode_dir or None)
+        logger.debug('Jinja bytecode cache in %s', env.bytecode_cache.directory)
@@ -0,0 +1,25 @@
+"""Cấu hình pytest: ứng dụng chạy trên file SQLite và thư mục ảnh tạm, không bao giờ dùng DATABASE_URL có sẵn."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Phải đặt trước khi import app (cấu hình được đọc lúc import và trong create_app)
+_SCRATCH = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_SCRATCH, 'test.db')
+os.environ['UPLOAD_DIR'] = os.path.join(_SCRATCH, 'uploads')
+os.environ.pop('DATABASE_REPLICA_URL', None)
+os.environ['LOG_LEVEL'] = 'WARNING'
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all(bind_key=None)
+    return app
@@ -0,0 +1,24 @@
+"""Thống kê trang quản trị: số bán và giá bán lấy từ SalesRollup, không từ bộ đếm kho hay giá hiện tại."""
+
+
+def test_best_sellers_and_units_shipped_come_from_sales(app):
+    from app import db, Product, User, CartItem, adjust_stock, get_admin_stats, load_cart, place_order
+    with app.app_context():
+        shipped_before = get_admin_stats()['units_shipped']
+        product = Product(name='Bán chạy', price=100.0, quantity=10, units_in=10)
+        user = User(username='stats-buyer', email='stats-buyer@test.local', password='x')
+        db.session.add_all([product, user])
+        db.session.flush()
+        db.session.add(CartItem(user_id=user.id, product_id=product.id, quantity=2))
+        db.session.commit()
+        place_order(user.id, load_cart(user.id))
+
+        # Đổi giá và xuất kho điều chỉnh sau khi bán: không phải doanh số
+        product.price = 500.0
+        adjust_stock(product.id, -3, 'adjust_out')
+        db.session.commit()
+
+        stats = get_admin_stats(top_n=50)
+        assert stats['units_shipped'] == shipped_before + 2
+        best = next(row for row in stats['best_sellers'] if row['id'] == product.id)
+        assert (best['quantity'], best['price'], best['revenue']) == (2, 100.0, 200.0)
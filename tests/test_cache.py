@@ -0,0 +1,78 @@
+"""FileCache: giới hạn số file và dọn khóa hết hạn / bị bỏ rơi; bộ đếm cache cộng dồn giữa các worker."""
+import os
+import time
+
+import metrics
+from cache import Cache, FileCache, NullCache
+
+
+def json_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+
+
+def test_sweep_removes_expired_and_stale_tmp(tmp_path):
+    backend = FileCache(directory=str(tmp_path), max_entries=100, sweep_every=1000)
+    backend.set('short', 1, ttl=1)
+    backend.set('long', 2, ttl=300)
+    stale_tmp = tmp_path / 'abc.tmp'
+    stale_tmp.write_text('{')
+    old = time.time() - 2 * FileCache.TMP_MAX_AGE
+    os.utime(stale_tmp, (old, old))
+    fresh_tmp = tmp_path / 'writing.tmp'
+    fresh_tmp.write_text('{')
+
+    # Hết hạn nhưng không ai đọc lại: chỉ sweep() mới xóa được
+    time.sleep(1.1)
+    assert backend.sweep() == 2
+    assert len(backend) == 1
+    assert backend.get('long') == 2
+    assert not stale_tmp.exists()
+    assert fresh_tmp.exists()
+
+
+def test_cap_evicts_soonest_expiring_and_keeps_namespaces(tmp_path):
+    cache = Cache(FileCache(directory=str(tmp_path), max_entries=5, sweep_every=1000))
+    version = cache.version('catalog')
+    for i in range(8):
+        cache.set(f'page:{i}', i, ttl=100 + i)
+
+    cache.backend.sweep()
+    assert len(cache.backend) == 5
+    assert cache.version('catalog') == version
+    assert [cache.get(f'page:{i}') for i in range(8)] == [None, None, None, None, 4, 5, 6, 7]
+
+
+def test_orphaned_keys_are_swept_after_bump(tmp_path):
+    cache = Cache(FileCache(directory=str(tmp_path), default_ttl=1, max_entries=100, sweep_every=1000))
+    for _ in range(3):
+        cache.set(f"catalog:{cache.version('catalog')}:1", '<html>')
+        cache.bump('catalog')
+    assert len(cache.backend) == 4
+
+    time.sleep(1.1)
+    cache.backend.sweep()
+    assert len(json_files(tmp_path)) == 1
+    assert cache.version('catalog')
+
+
+def test_set_triggers_periodic_sweep(tmp_path):
+    backend = FileCache(directory=str(tmp_path), max_entries=10, sweep_every=5)
+    for i in range(50):
+        backend.set(f'key:{i}', i)
+        assert len(backend) <= 10 + 5
+    assert backend.get('key:49') == 49
+
+
+def test_counters_merge_across_workers():
+    snapshots = []
+    for hits in (3, 4):
+        cache = Cache(NullCache())
+        cache._counters.update(hits=hits, misses=1)
+        registry = metrics.MetricsRegistry()
+        registry.register_counters('cache', cache.counters)
+        snapshots.append(registry.snapshot())
+
+    merged = metrics.merge(snapshots)
+    assert merged['counters'][('cache_hits',)] == 7
+    assert merged['counters'][('cache_misses',)] == 2
+    assert 'cache_hits_total 7\n' in metrics.render(merged)
@@ -0,0 +1,57 @@
+"""Checkout đồng thời: nhiều người mua tranh nhau những đơn vị cuối cùng của một sản phẩm."""
+import threading
+
+STOCK = 3
+BUYERS = 8
+
+
+def test_concurrent_checkout_never_oversells(app):
+    from app import (db, Product, Order, User, CartItem, InventoryMovement, OutOfStockError, load_cart, place_order,
+                     reconcile_inventory)
+    with app.app_context():
+        product = Product(name='Hàng cuối', price=100.0, quantity=STOCK, units_in=STOCK)
+        users = [User(username=f'racer{i}', email=f'racer{i}@test.local', password='x') for i in range(BUYERS)]
+        db.session.add_all([product, *users])
+        db.session.flush()
+        db.session.add(InventoryMovement(product_id=product.id, delta=STOCK, reason='opening'))
+        db.session.add_all([CartItem(user_id=user.id, product_id=product.id, quantity=1) for user in users])
+        db.session.commit()
+        product_id, user_ids = product.id, [user.id for user in users]
+
+    outcomes, lowest = [], [STOCK]
+    start, done = threading.Barrier(BUYERS), threading.Event()
+
+    def buy(user_id):
+        with app.app_context():
+            cart = load_cart(user_id)
+            start.wait()
+            try:
+                place_order(user_id, cart)
+                outcomes.append('ok')
+            except OutOfStockError:
+                outcomes.append('out_of_stock')
+            finally:
+                db.session.remove()
+
+    def watch():
+        with app.app_context():
+            while not done.is_set():
+                lowest[0] = min(lowest[0], db.session.query(Product.quantity).filter_by(id=product_id).scalar())
+                db.session.rollback()
+
+    threads = [threading.Thread(target=buy, args=(user_id,)) for user_id in user_ids]
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    watcher.join()
+
+    assert sorted(outcomes) == ['ok'] * STOCK + ['out_of_stock'] * (BUYERS - STOCK)
+    assert lowest[0] >= 0
+    with app.app_context():
+        assert db.session.get(Product, product_id).quantity == 0
+        assert Order.query.filter(Order.user_id.in_(user_ids)).count() == STOCK
+        assert [row for row in reconcile_inventory() if row['id'] == product_id] == []
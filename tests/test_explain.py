@@ -0,0 +1,40 @@
+"""EXPLAIN QUERY PLAN: các truy vấn nóng dùng chỉ mục thay vì quét toàn bảng (database tạm của conftest)."""
+
+
+def hot_queries():
+    from app import db, Product, Order, OrderItem, CartItem, InventoryMovement, SalesRollup, Job
+    return {
+        'cart()': CartItem.query.filter_by(user_id=1),
+        'add_to_cart()': CartItem.query.filter_by(user_id=1, product_id=1),
+        'orders()': Order.query.filter_by(user_id=1).filter(Order.id < 1000).order_by(Order.id.desc()).limit(20),
+        'orders() by status': Order.query.filter_by(user_id=1, status='paid').order_by(Order.id.desc()).limit(20),
+        'admin orders by status': Order.query.filter_by(status='paid').filter(Order.id < 1000)
+        .order_by(Order.id.desc()).limit(50),
+        'admin_delete_product()': db.session.query(db.func.count(OrderItem.id)).filter_by(product_id=1),
+        'order.items': OrderItem.query.filter_by(order_id=1),
+        'status breakdown': db.session.query(Order.status, db.func.count(Order.id)).filter_by(status='paid'),
+        'catalog keyset': Product.query.filter(
+            db.tuple_(Product.created_at, Product.id) > db.tuple_(db.func.now(), 1)
+        ).order_by(Product.created_at, Product.id).limit(12),
+        'catalog Last-Modified': db.session.query(db.func.max(Product.updated_at)),
+        'inventory movements': InventoryMovement.query.filter_by(product_id=1)
+        .order_by(InventoryMovement.id.desc()).limit(50),
+        'sales report range': db.session.query(SalesRollup.day, db.func.sum(SalesRollup.revenue))
+        .filter(SalesRollup.day >= db.func.date('2026-01-01')).group_by(SalesRollup.day),
+        'job claim': db.session.query(Job.id).filter(Job.status == 'queued', Job.run_at <= db.func.now())
+        .order_by(Job.run_at, Job.id).limit(4),
+    }
+
+
+def test_hot_queries_use_indexes(app):
+    from app import db, init_db
+    with app.app_context():
+        # Schema đầy đủ như ``flask init-db``: bảng, chỉ mục do migration tạo, chỉ mục tìm kiếm
+        init_db()
+        full_scans = {}
+        for name, query in hot_queries().items():
+            sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+            details = [row[-1] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql))]
+            if any(d.startswith('SCAN ') and 'USING' not in d for d in details):
+                full_scans[name] = details
+    assert full_scans == {}
@@ -0,0 +1,63 @@
+"""Ảnh tải lên: file chỉ được ghi sau commit, thumbnail sinh nền và trang dùng bản gốc tới lúc đó."""
+import io
+import os
+
+import pytest
+
+pytest.importorskip('PIL')
+
+from PIL import Image  # noqa: E402
+from werkzeug.datastructures import FileStorage  # noqa: E402
+
+
+def upload(color, size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return FileStorage(io.BytesIO(buffer.getvalue()), 'photo.jpg')
+
+
+def add_product(color):
+    """Sản phẩm mới có ảnh, chưa commit (cần request context để dựng URL ảnh)"""
+    from app import db, Product, attach_uploaded_image
+    product = Product(name='Ảnh', price=1000, quantity=1)
+    db.session.add(product)
+    db.session.flush()
+    return product, attach_uploaded_image(product, upload(color))
+
+
+def test_rollback_leaves_no_file(app):
+    from app import db, image_store
+    with app.test_request_context():
+        _, key = add_product('red')
+        db.session.rollback()
+    assert not os.path.exists(image_store._original_path(key))
+
+
+def test_variants_are_generated_after_commit(app):
+    from app import db, Product, image_store
+    with app.test_request_context():
+        product, key = add_product('blue')
+        # Chưa có thumbnail: trang dùng bản gốc
+        assert product.image_url == image_store.image_src(key)
+        db.session.commit()
+        product_id = product.id
+    assert os.path.exists(image_store._original_path(key))
+
+    image_store.wait(timeout=30)
+    with app.app_context():
+        assert db.session.get(Product, product_id).image_widths == '160,320,640,800'
+
+
+def test_replaced_image_is_not_overwritten(app):
+    from app import db, Product, image_store, generate_product_image_variants
+    with app.test_request_context():
+        product, key = add_product('green')
+        db.session.commit()
+        image_store.wait(timeout=30)
+        product.image_key, product.image_widths = 'other.jpg', None
+        db.session.commit()
+        product_id = product.id
+
+    assert generate_product_image_variants(app, product_id, key) is False
+    with app.app_context():
+        assert db.session.get(Product, product_id).image_widths is None
@@ -0,0 +1,192 @@
+"""Hàng đợi việc nền: chạy Worker ngay trong tiến trình (``run(burst=True)``)."""
+from datetime import datetime, timedelta
+import json
+import time
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture
+def queue(app):
+    from app import db, Job
+    queue = jobs.JobQueue(db, Job, max_attempts=3, backoff_base=60, backoff_max=600, lease=30)
+    with app.app_context():
+        db.session.execute(db.delete(Job))
+        db.session.commit()
+    return queue
+
+
+def run_burst(queue, app):
+    return jobs.Worker(queue, app, concurrency=2, poll_interval=0.01).run(burst=True)
+
+
+def load(queue, app, job_id):
+    with app.app_context():
+        job = queue.db.session.get(queue.model, job_id)
+        queue.db.session.expunge(job)
+        return job
+
+
+def enqueue(queue, app, name, payload=None, **kwargs):
+    with app.app_context():
+        job_id = queue.enqueue(name, payload, **kwargs)
+        queue.db.session.commit()
+        return job_id
+
+
+def test_retry_with_backoff_then_fail(queue, app):
+    calls = []
+
+    @queue.task('test.flaky')
+    def flaky(n):
+        calls.append(n)
+        raise RuntimeError('boom')
+
+    job_id = enqueue(queue, app, 'test.flaky', {'n': 1})
+
+    before = datetime.utcnow()
+    assert run_burst(queue, app) == 1
+    job = load(queue, app, job_id)
+    # Lần lỗi đầu: quay lại hàng đợi sau backoff_base (±20%)
+    assert (job.status, job.attempts, len(calls)) == (jobs.QUEUED, 1, 1)
+    assert 'RuntimeError: boom' in job.last_error
+    assert before + timedelta(seconds=47) < job.run_at < before + timedelta(seconds=73)
+    # Job chưa đến hạn thì không được chạy lại
+    assert run_burst(queue, app) == 0
+
+    for attempt in (2, 3):
+        with app.app_context():
+            queue.db.session.get(queue.model, job_id).run_at = datetime.utcnow() - timedelta(seconds=1)
+            queue.db.session.commit()
+        run_burst(queue, app)
+        job = load(queue, app, job_id)
+        assert job.attempts == attempt
+
+    assert (job.status, len(calls)) == (jobs.FAILED, 3)
+    assert job.finished_at is not None
+
+
+def test_backoff_grows_and_is_capped(queue):
+    queue.backoff_max = 300
+    assert 48 <= queue.backoff(1) <= 72
+    assert 96 <= queue.backoff(2) <= 144
+    assert queue.backoff(10) <= 300 * 1.2
+
+
+def test_idempotency_key_dedupes_enqueue(queue, app):
+    calls = []
+
+    @queue.task('test.once')
+    def once():
+        calls.append(1)
+
+    first = enqueue(queue, app, 'test.once', idempotency_key='once:1')
+    assert first is not None
+    assert enqueue(queue, app, 'test.once', idempotency_key='once:1') is None
+    assert enqueue(queue, app, 'test.once', idempotency_key='once:2') is not None
+
+    assert run_burst(queue, app) == 2
+    assert len(calls) == 2
+    with app.app_context():
+        assert queue.counts() == {jobs.DONE: 2}
+
+
+def test_requeue_stale_reclaims_expired_lease(queue, app):
+    calls = []
+
+    @queue.task('test.stale')
+    def stale():
+        calls.append(1)
+
+    job_id = enqueue(queue, app, 'test.stale')
+    # Một worker nhận job rồi chết giữa chừng
+    with app.app_context():
+        assert queue.claim('dead-worker', 1) == [job_id]
+        queue.db.session.get(queue.model, job_id).locked_at = datetime.utcnow() - timedelta(seconds=queue.lease + 1)
+        queue.db.session.commit()
+
+    assert run_burst(queue, app) == 1
+    job = load(queue, app, job_id)
+    assert (job.status, job.attempts, len(calls)) == (jobs.DONE, 2, 1)
+    assert job.locked_by != 'dead-worker'
+
+
+def test_requeue_stale_leaves_live_leases(queue, app):
+    @queue.task('test.live')
+    def live():
+        pass
+
+    job_id = enqueue(queue, app, 'test.live')
+    with app.app_context():
+        queue.claim('live-worker', 1)
+        assert queue.requeue_stale() == 0
+    assert load(queue, app, job_id).status == jobs.RUNNING
+
+
+def test_heartbeat_keeps_long_job_leased(queue, app):
+    calls = []
+
+    @queue.task('test.slow')
+    def slow():
+        calls.append(1)
+        time.sleep(2.5)
+
+    queue.lease = 1
+    job_id = enqueue(queue, app, 'test.slow')
+    assert run_burst(queue, app) == 1
+    job = load(queue, app, job_id)
+    # Chạy lâu hơn lease nhưng không bị trả lại hàng đợi và chạy lần hai
+    assert (job.status, job.attempts, len(calls)) == (jobs.DONE, 1, 1)
+
+
+def steal(queue, app, job_id):
+    """Giả lập lease hết hạn: job bị trả lại hàng đợi và một worker khác nhận nó"""
+    with app.app_context():
+        queue.db.session.execute(
+            queue.db.update(queue.model).where(queue.model.id == job_id)
+            .values(status=jobs.RUNNING, locked_by='other-worker', attempts=queue.model.attempts + 1)
+        )
+        queue.db.session.commit()
+        queue.db.session.remove()
+
+
+@pytest.mark.parametrize('fails', [False, True])
+def test_lost_lease_does_not_overwrite_new_owner(queue, app, fails):
+    from app import db, Product
+
+    @queue.task('test.stolen')
+    def stolen(job_id):
+        steal(queue, app, job_id)
+        db.session.add(Product(name='stolen-job', price=1, quantity=1))
+        if fails:
+            raise RuntimeError('boom')
+
+    job_id = enqueue(queue, app, 'test.stolen')
+    with app.app_context():
+        queue.db.session.get(queue.model, job_id).payload = json.dumps({'job_id': job_id})
+        queue.db.session.commit()
+
+    assert run_burst(queue, app) == 1
+    job = load(queue, app, job_id)
+    assert (job.status, job.locked_by, job.attempts, job.finished_at) == (jobs.RUNNING, 'other-worker', 2, None)
+    with app.app_context():
+        # Thay đổi database của lần chạy mất lease bị rollback
+        assert Product.query.filter_by(name='stolen-job').count() == 0
+
+
+def test_heartbeat_only_renews_own_jobs(queue, app):
+    @queue.task('test.leased')
+    def leased():
+        pass
+
+    job_id = enqueue(queue, app, 'test.leased')
+    old = datetime.utcnow() - timedelta(seconds=queue.lease - 1)
+    with app.app_context():
+        queue.claim('worker-a', 1)
+        queue.db.session.get(queue.model, job_id).locked_at = old
+        queue.db.session.commit()
+        assert queue.heartbeat('worker-b', [job_id]) == 0
+        assert queue.heartbeat('worker-a', [job_id]) == 1
+    assert load(queue, app, job_id).locked_at > old
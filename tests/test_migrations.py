@@ -0,0 +1,63 @@
+"""``flask migrate`` trên database có từ trước khi có migration (schema ban đầu của dự án)."""
+import os
+import sqlite3
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASELINE_SCHEMA = '''
+CREATE TABLE user (
+    id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, email VARCHAR(120) NOT NULL,
+    password VARCHAR(120) NOT NULL, is_admin BOOLEAN, created_at DATETIME,
+    PRIMARY KEY (id), UNIQUE (username), UNIQUE (email)
+);
+CREATE TABLE product (
+    id INTEGER NOT NULL, name VARCHAR(120) NOT NULL, description TEXT, price FLOAT NOT NULL,
+    quantity INTEGER, image_url VARCHAR(200), created_at DATETIME, PRIMARY KEY (id)
+);
+CREATE TABLE "order" (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, total_price FLOAT NOT NULL, status VARCHAR(20),
+    created_at DATETIME, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE cart_item (
+    id INTEGER NOT NULL, user_id INTEGER, product_id INTEGER NOT NULL, quantity INTEGER,
+    PRIMARY KEY (id), FOREIGN KEY(product_id) REFERENCES product (id)
+);
+CREATE TABLE order_item (
+    id INTEGER NOT NULL, order_id INTEGER NOT NULL, product_id INTEGER NOT NULL, quantity INTEGER NOT NULL,
+    price FLOAT NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(order_id) REFERENCES "order" (id), FOREIGN KEY(product_id) REFERENCES product (id)
+);
+INSERT INTO user (id, username, email, password, is_admin) VALUES (1, 'u', 'u@shop.local', 'x', 0);
+INSERT INTO product (id, name, price, quantity, created_at) VALUES (1, 'A', 10, 5, '2026-01-01 00:00:00');
+INSERT INTO "order" (id, user_id, total_price, status, created_at) VALUES (1, 1, 20, 'pending', '2026-01-02 00:00:00');
+INSERT INTO order_item (order_id, product_id, quantity, price) VALUES (1, 1, 2, 10);
+'''
+
+
+def flask(path, *args):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}', FLASK_APP='app.py', LOG_LEVEL='WARNING')
+    env.pop('DATABASE_REPLICA_URL', None)
+    return subprocess.run([sys.executable, '-m', 'flask', *args], cwd=ROOT, env=env,
+                          capture_output=True, text=True, timeout=120)
+
+
+def test_migrate_upgrades_baseline_database(tmp_path):
+    path = tmp_path / 'baseline.db'
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+
+    result = flask(path, 'migrate')
+    assert result.returncode == 0, result.stderr
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT product_id, delta, reason FROM inventory_movement ORDER BY id').fetchall() == [
+            (1, 7, 'opening'), (1, -2, 'sale')
+        ]
+        assert conn.execute('SELECT units_in, units_out, quantity FROM product').fetchone() == (7, 2, 5)
+        assert conn.execute('SELECT units, revenue FROM sales_rollup').fetchall() == [(2, 20.0)]
+        assert conn.execute('SELECT COUNT(*) FROM job').fetchone() == (0,)
+
+    # Chạy lại không làm gì
+    assert 'Đã áp dụng 0 migration' in flask(path, 'migrate').stdout
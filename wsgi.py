@@ -0,0 +1,7 @@
+"""Điểm vào WSGI cho gunicorn: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+Lệnh ``flask`` không cần file này, nó tự gọi ``app.create_app()``.
+"""
+from app import create_app
+
+app = create_app()